@@ -0,0 +1,343 @@
+"""
+Admission control of the prediction endpoints.
+
+The inference is CPU-bound: the requests accepted beyond what the cores can score only
+wait in the executor, and make every request behind them late. Instead, the rows
+admitted and not answered yet are bounded, and a request is rejected before any work
+is done on it when
+
+- 429: its rows do not fit in the queue (admission_max_queue_rows). A request bigger
+  than the whole queue is only admitted when the queue is empty.
+- 503: it can not be answered before its deadline, given the work already admitted.
+  The deadline is the X-Request-Deadline-Ms header, in milliseconds from the moment
+  the request is received (not a date, the clocks of the client and the server do
+  not have to agree), or admission_default_deadline_ms.
+
+Both carry a Retry-After header, the seconds the work already admitted should take.
+A request whose deadline passes while it waits or is scored is answered with 504,
+like a prediction which did not finish within the inference timeout.
+
+The time a request takes is estimated from the requests answered so far: the seconds
+of a request are fit as a + b * rows by exponentially weighted least squares, so that
+the estimate follows the load of the machine, and a request is answered once the
+requests admitted before it are.
+"""
+
+import asyncio
+import math
+import sys
+import time
+import typing as t
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import metrics  # noqa: E402
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class Rejected(Exception):
+    """The request is not admitted, status_code and reason say why."""
+
+    def __init__(
+        self, status_code: int, reason: str, detail: str, retry_after: float
+    ) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> t.Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class ServiceTimeModel:
+    """
+    The seconds of a request of n rows, a + b * rows, fit on the requests timed so far.
+    Every new request weighs 1 and the previous ones decay by decay.
+    """
+
+    def __init__(self, decay: float = 0.99) -> None:
+        self.decay = decay
+        self.observations = 0
+        # The decayed sums of the weights, rows, seconds, rows² and rows * seconds.
+        self._w = self._x = self._y = self._xx = self._xy = 0.0
+
+    def observe(self, rows: int, seconds: float) -> None:
+        d = self.decay
+        self._w = d * self._w + 1.0
+        self._x = d * self._x + rows
+        self._y = d * self._y + seconds
+        self._xx = d * self._xx + rows * rows
+        self._xy = d * self._xy + rows * seconds
+        self.observations += 1
+
+    def coefficients(self) -> t.Tuple[float, float]:
+        """The seconds per request a and per row b, never negative."""
+
+        if not self._w:
+            return 0.0, 0.0
+        denominator = self._w * self._xx - self._x * self._x
+        if denominator <= 1e-9 * self._w * self._xx:
+            # The requests had (almost) all the same size, only their time per row is known.
+            return 0.0, self._y / self._x if self._x else 0.0
+        b = (self._w * self._xy - self._x * self._y) / denominator
+        a = (self._y - b * self._x) / self._w
+        if b < 0:
+            return self._y / self._w, 0.0
+        if a < 0:
+            return 0.0, self._xy / self._xx
+        return a, b
+
+    def estimate(self, rows: int) -> float:
+        a, b = self.coefficients()
+        return a + b * rows
+
+
+class Ticket:
+    """The rows of an admitted request and the seconds they were estimated to take."""
+
+    def __init__(self, rows: int, seconds: float) -> None:
+        self.rows = rows
+        self.seconds = seconds
+
+
+class AdmissionController:
+    """
+    Bounds the rows admitted and not answered yet, and rejects the requests which can
+    not meet their deadline. It is only used from the event loop, no lock is needed.
+
+    The seconds a request takes are the seconds the process was busy (some request was
+    admitted) between its answer and the previous one: they include everything the
+    process does besides the pipeline call (parsing, the event loop, the requests scored
+    at the same time...), and add up to the time it takes to answer the queue.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_queue_rows: int,
+        min_observations: int = 8,
+        model: t.Optional[ServiceTimeModel] = None,
+    ) -> None:
+        self.max_queue_rows = max_queue_rows
+        self.min_observations = min_observations
+        self.model = model or ServiceTimeModel()
+        self.queued_rows = 0
+        self.queued_requests = 0
+        # The estimated seconds of the requests admitted.
+        self.queued_seconds = 0.0
+        # The last answer, or the moment the queue stopped being empty.
+        self._mark = time.perf_counter()
+
+    def _reject(self, status_code: int, reason: str, detail: str) -> Rejected:
+        metrics.ADMISSION_REJECTIONS.labels(reason).inc()
+        return Rejected(status_code, reason, detail, self.queued_seconds)
+
+    def check(self, rows: int, deadline: t.Optional[float] = None) -> None:
+        """
+        Raises Rejected if a request of rows rows to be answered before deadline
+        (time.perf_counter()) can not be admitted now. Until min_observations requests
+        were answered their time is not known, and at most min_observations requests
+        with a deadline are admitted at once.
+        """
+
+        if self.queued_requests and self.queued_rows + rows > self.max_queue_rows:
+            raise self._reject(
+                429,
+                "queue_full",
+                f"Too many rows waiting to be scored ({self.queued_rows})",
+            )
+
+        if deadline is None:
+            return
+        remaining = deadline - time.perf_counter()
+        if self.model.observations < self.min_observations:
+            late = self.queued_requests >= self.min_observations
+        else:
+            late = self.queued_seconds + self.model.estimate(rows) > remaining
+        if remaining <= 0 or late:
+            raise self._reject(
+                503,
+                "deadline",
+                "The request can not be answered before its deadline",
+            )
+
+    def admit(self, rows: int, deadline: t.Optional[float] = None) -> Ticket:
+        """
+        Admit a request of rows rows to be answered before deadline (time.perf_counter()),
+        raises Rejected otherwise. The ticket is given back to release once it is answered.
+        """
+
+        self.check(rows, deadline)
+        if not self.queued_requests:
+            # The time the queue was empty is not the time of any request.
+            self._mark = time.perf_counter()
+        seconds = self.model.estimate(rows)
+        self.queued_rows += rows
+        self.queued_requests += 1
+        self.queued_seconds += seconds
+        self._update_gauges()
+        return Ticket(rows, seconds)
+
+    def release(self, ticket: Ticket) -> None:
+        self.queued_rows -= ticket.rows
+        self.queued_requests -= 1
+        self.queued_seconds = max(0.0, self.queued_seconds - ticket.seconds)
+        self._update_gauges()
+
+    def observe(self, rows: int) -> None:
+        """A request (or a chunk of a stream) of rows rows was answered, time it in the model."""
+
+        now = time.perf_counter()
+        self.model.observe(rows, now - self._mark)
+        self._mark = now
+
+    def _update_gauges(self) -> None:
+        metrics.ADMISSION_QUEUE_ROWS.labels().set(self.queued_rows)
+        metrics.ADMISSION_QUEUE_REQUESTS.labels().set(self.queued_requests)
+
+    async def run(
+        self,
+        rows: int,
+        deadline: t.Optional[float],
+        predict: t.Callable[[], t.Awaitable[dict]],
+    ) -> dict:
+        """
+        Admit a request, then await predict() until its deadline. Raises Rejected if
+        it is not admitted and TimeoutError once its deadline has passed. The rows stay
+        in the queue until the prediction is really done, like the slots of the executor.
+        """
+
+        ticket = self.admit(rows, deadline)
+        try:
+            task = asyncio.ensure_future(predict())
+        except BaseException:
+            self.release(ticket)
+            raise
+
+        def done(future: "asyncio.Future[dict]") -> None:
+            self.observe(rows)
+            self.release(ticket)
+            # A task abandoned at its deadline must not log that its exception was never retrieved.
+            if not future.cancelled():
+                future.exception()
+
+        task.add_done_callback(done)
+
+        if deadline is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(task), timeout=deadline - time.perf_counter()
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError("The deadline of the request has passed") from None
+
+
+_controller: t.Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> t.Optional[AdmissionController]:
+    """The admission controller of this process, None if admission_enabled is off."""
+
+    global _controller
+
+    from model.config.core import config
+
+    inference_config = config.inference_config
+    if not inference_config.admission_enabled:
+        return None
+    if _controller is None:
+        _controller = AdmissionController(
+            max_queue_rows=inference_config.admission_max_queue_rows,
+            min_observations=inference_config.admission_min_observations,
+        )
+    return _controller
+
+
+def _deadline(
+    deadline_ms: t.Optional[float], received: t.Optional[float]
+) -> t.Optional[float]:
+    from model.config.core import config
+
+    if deadline_ms is None:
+        deadline_ms = config.inference_config.admission_default_deadline_ms or None
+    if deadline_ms is None:
+        return None
+    start = received if received is not None else time.perf_counter()
+    return start + deadline_ms / 1000
+
+
+def request_deadline(
+    request: Request, deadline_ms: t.Optional[float]
+) -> t.Optional[float]:
+    """
+    The deadline of a request, in time.perf_counter(), from its X-Request-Deadline-Ms
+    header and the moment it was received by the metrics middleware, or
+    admission_default_deadline_ms without the header. None for no deadline.
+    """
+
+    return _deadline(deadline_ms, getattr(request.state, "received", None))
+
+
+async def run_admitted(
+    rows: int,
+    deadline: t.Optional[float],
+    predict: t.Callable[[], t.Awaitable[dict]],
+) -> dict:
+    """predict() through the admission controller, or directly if admission is disabled."""
+
+    controller = get_admission_controller()
+    if controller is None:
+        return await predict()
+    return await controller.run(rows, deadline, predict)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware rejecting the requests to paths before their body is read, when
+    not even a request of one row would be admitted. The endpoints only count the rows
+    once the body is parsed, and parsing the bodies of the requests to be rejected
+    would take the time of those admitted.
+    """
+
+    def __init__(self, app: ASGIApp, paths: t.Sequence[str]) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        controller = get_admission_controller()
+        if controller is not None:
+            # A missing header is the default deadline, an invalid one is answered by the endpoint.
+            header = Headers(scope=scope).get(DEADLINE_HEADER)
+            try:
+                deadline_ms = float(header) if header is not None else None
+            except ValueError:
+                deadline_ms = None
+            received = scope.get("state", {}).get("received")
+            try:
+                controller.check(1, _deadline(deadline_ms, received))
+            except Rejected as error:
+                response = JSONResponse(
+                    {"detail": error.detail},
+                    status_code=error.status_code,
+                    headers=error.headers,
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
@@ -1,22 +1,31 @@
+import secrets
 import sys
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, List, Optional
 
-import numpy as np
-import pandas as pd
-from fastapi import APIRouter, HTTPException
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from loguru import logger
+from starlette.background import BackgroundTask
 
 # Add the root of your project to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app import __version__  # noqa: E402
+from app import admission, metrics, model_loader, request_logging  # noqa: E402
 from app.config import settings  # noqa: E402
-from app.schemas.health import Health  # noqa: E402
-from app.schemas.predict import MultipleDataInputs, PredictionResults  # noqa: E402
+from app.schemas.cache import PredictionCacheStats  # noqa: E402
+from app.schemas.drift import DriftReport  # noqa: E402
+from app.schemas.health import Health, Readiness  # noqa: E402
+from app.schemas.predict import (  # noqa: E402
+    ColumnarDataInputs,
+    ColumnarPredictionResults,
+    MultipleDataRecords,
+    PredictionResults,
+)
+from app.schemas.registry import ModelVersions  # noqa: E402
 from model import __version__ as model_version  # noqa: E402
-from model.predict import make_prediction  # noqa: E402
 
 #  Create an instance of APIRouter. This will be used to define the API endpoints.
 api_router = APIRouter()
@@ -48,31 +57,362 @@ def health() -> dict:
     return health_info
 
 
+@api_router.get("/ready", response_model=Readiness, status_code=200)
+def ready(response: Response) -> dict:
+    """
+    Readiness endpoint. It returns 200 once the model is loaded and warmed up,
+    503 before that. /health only tells that the process is alive.
+    """
+
+    if not model_loader.is_ready():
+        response.status_code = 503
+
+    return Readiness(
+        ready=model_loader.is_ready(), error=model_loader.loading_error()
+    ).dict()
+
+
+@api_router.get(
+    "/prediction_cache", response_model=PredictionCacheStats, status_code=200
+)
+def prediction_cache() -> dict:
+    """
+    Counters of the prediction cache of this server process: hits, misses, hit rate,
+    evictions (memory budget) and expirations (time to live).
+    """
+
+    from model.prediction_cache import get_prediction_cache
+
+    cache = get_prediction_cache()
+    if cache is None:
+        return PredictionCacheStats(enabled=False).dict()
+    return PredictionCacheStats(enabled=True, **cache.stats()).dict()
+
+
+@api_router.get("/drift", response_model=DriftReport, status_code=200)
+def drift() -> dict:
+    """
+    The drift of the inputs this server process scored from the training rows of the
+    model it serves: the population stability index of every feature (stable below 0.1,
+    moderate up to 0.25, significant beyond), and the features which drifted
+    significantly. See model/drift.py.
+    """
+
+    from model.config.core import config
+
+    if not config.inference_config.drift_enabled:
+        return DriftReport(enabled=False).dict()
+
+    from model.predict import drift_report
+
+    report = drift_report()
+    if report is None:  # no model loaded yet, or one saved without a drift reference
+        return DriftReport(enabled=True).dict()
+    drifted = [
+        feature["name"]
+        for feature in report["features"]
+        if feature["status"] == "significant"
+    ]
+    return DriftReport(enabled=True, drifted=drifted, **report).dict()
+
+
+def _record_parse(request: Request) -> None:
+    """Record the parse stage: reading and decoding the body, since the request was received."""
+
+    received = getattr(request.state, "received", None)
+    if received is not None:
+        metrics.STAGE_LATENCY.labels("parse").observe(time.perf_counter() - received)
+
+
+def _row_errors(results: dict) -> Optional[List[dict]]:
+    """The validation errors of the results of make_prediction, as RowErrors."""
+
+    from model.preprocessing.validation import errors_by_row
+
+    by_row = errors_by_row(results["errors"])
+    return [{"row": row, "errors": errors} for row, errors in by_row.items()] or None
+
+
+def _rejected(error: admission.Rejected) -> HTTPException:
+    """The response of a request the admission control did not admit: 429 or 503, with Retry-After."""
+
+    return HTTPException(
+        status_code=error.status_code, detail=error.detail, headers=error.headers
+    )
+
+
 @api_router.post("/predict", response_model=PredictionResults, status_code=200)
-async def predict(input_data: MultipleDataInputs) -> Any:
+async def predict(
+    input_data: MultipleDataRecords,
+    request: Request,
+    x_request_deadline_ms: Optional[float] = Header(None),
+) -> Any:
     """
-    It defines a POST endpoint at /predict. It takes an instance of MultipleDataInputs as input.
+    It defines a POST endpoint at /predict. It takes an instance of MultipleDataRecords as input,
+    whose rows have the fields of MultipleDataInputs but are validated by make_prediction.
     Inside the endpoint, the input data is converted to a DataFrame and passed to
-    the make_prediction function. If there are any errors in the prediction, an HTTP exception
-    is raised. Otherwise, the prediction results are returned.
+    the make_prediction function. If the prediction fails, an HTTP exception is raised.
+    Otherwise, the prediction results are returned: a prediction for every valid row,
+    and the validation errors of the invalid rows with their index.
+    The request goes through the admission control first (see app/admission.py): it is
+    rejected with 429 when too many rows are waiting, and with 503 when it can not be
+    answered within the milliseconds of its X-Request-Deadline-Ms header.
     """
 
+    # pandas and the model are imported on first use, not when the application starts.
+    import numpy as np
+    import pandas as pd
+
+    from model.config.core import config
+    from model.predict import make_prediction
+
+    # Reading and validating the body, since the request was received by the metrics middleware.
+    _record_parse(request)
+
     try:
-        # Convert input data to DataFrame and replace NaN values with None
-        input_df = pd.DataFrame(jsonable_encoder(input_data.inputs)).replace(
-            {np.nan: None}
+        # Convert input data to DataFrame, with a column per feature even if no row has it,
+        # and replace NaN values with None
+        with metrics.Stage("to_dataframe"):
+            input_df = (
+                pd.DataFrame.from_records(input_data.inputs)
+                .reindex(columns=config.model_config.features)
+                .replace({np.nan: None})
+            )
+
+        # Make predictions using the trained model, only the classes are returned
+        results = await admission.run_admitted(
+            len(input_df),
+            admission.request_deadline(request, x_request_deadline_ms),
+            lambda: make_prediction(input_data=input_df, probabilities=False),
+        )
+        metrics.record_prediction(results, len(input_df))
+
+        # The predictions by row, null for the rows which were not scored
+        predictions = np.full(len(input_df), None, dtype=object)
+        if results["predictions"] is not None:
+            predictions[results["rows"]] = results["predictions"].tolist()
+
+        # Log the prediction, with its inputs and results for a sample of the requests only
+        request_logging.log_prediction(
+            results,
+            len(input_df),
+            endpoint="predict",
+            inputs=lambda: input_data.inputs,
+            predictions=predictions.tolist,
         )
+        # The response is validated and encoded after this, see MetricsMiddleware.
+        request.state.serialize_start = time.perf_counter()
+        return {
+            "errors": _row_errors(results),
+            "version": results["version"],
+            "predictions": predictions.tolist(),
+        }
+
+    except admission.Rejected as e:  # Too many rows waiting, or the deadline can not be met
+        raise _rejected(e)
+
+    except TimeoutError as e:  # The prediction did not finish within the inference timeout
+        metrics.PREDICTION_ERRORS.labels("timeout").inc()
+        logger.error(f"Prediction timed out: {e}")
+        raise HTTPException(status_code=504, detail="Prediction timed out")
+
+    except Exception as e:  # Handle any exceptions during prediction
+        metrics.PREDICTION_ERRORS.labels("failure").inc()
+        logger.error(f"Prediction failed: {e}")
+        raise HTTPException(status_code=500, detail="Prediction failed")
+
+
+@api_router.post(
+    "/predict/columnar",
+    response_class=ORJSONResponse,
+    responses={200: {"model": ColumnarPredictionResults}},
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": ColumnarDataInputs.schema()}},
+            "required": True,
+        }
+    },
+    status_code=200,
+)
+async def predict_columnar(
+    request: Request, x_request_deadline_ms: Optional[float] = Header(None)
+) -> Any:
+    """
+    Columnar variant of /predict for bulk callers: the body holds one array per feature
+    (see ColumnarDataInputs) and the response one array of predictions, and one array
+    of probabilities per class, for the valid rows whose positions are in rows. The
+    invalid rows are reported in errors. The body is decoded by orjson straight into NumPy
+    arrays and the response is encoded by orjson from the arrays, no object is built
+    per row. The admission control and the deadline header are those of /predict.
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    from app.columnar import ColumnarDecodeError, decode_columnar
+    from model.predict import make_prediction
+
+    try:
+        columns = decode_columnar(await request.body())
+    except ColumnarDecodeError as e:
+        metrics.PREDICTION_ERRORS.labels("validation").inc()
+        raise HTTPException(status_code=422, detail=str(e))
+    _record_parse(request)
+
+    try:
+        with metrics.Stage("to_dataframe"):
+            input_df = pd.DataFrame(columns, copy=False)
 
-        # Log the input data
-        logger.info(f"Received input data: {input_data.inputs}")
+        results = await admission.run_admitted(
+            len(input_df),
+            admission.request_deadline(request, x_request_deadline_ms),
+            lambda: make_prediction(input_data=input_df),
+        )
+        metrics.record_prediction(results, len(input_df))
+        request_logging.log_prediction(
+            results,
+            len(input_df),
+            endpoint="predict/columnar",
+        )
 
-        # Make predictions using the trained model
-        predictions = await make_prediction(input_data=input_df)
+    except admission.Rejected as e:  # Too many rows waiting, or the deadline can not be met
+        raise _rejected(e)
 
-        # Log and return the prediction results
-        logger.info(f"Prediction results: {predictions.get('predictions')}")
-        return predictions
+    except TimeoutError as e:  # The prediction did not finish within the inference timeout
+        metrics.PREDICTION_ERRORS.labels("timeout").inc()
+        logger.error(f"Prediction timed out: {e}")
+        raise HTTPException(status_code=504, detail="Prediction timed out")
 
     except Exception as e:  # Handle any exceptions during prediction
+        metrics.PREDICTION_ERRORS.labels("failure").inc()
         logger.error(f"Prediction failed: {e}")
         raise HTTPException(status_code=500, detail="Prediction failed")
+
+    probabilities = None
+    if results["probabilities"] is not None:
+        # One contiguous array per class, orjson only serializes contiguous arrays.
+        by_class = np.ascontiguousarray(results["probabilities"].T)
+        probabilities = {
+            str(label): by_class[position]
+            for position, label in enumerate(results["classes"])
+        }
+    request.state.serialize_start = time.perf_counter()
+    return ORJSONResponse(
+        {
+            "errors": _row_errors(results),
+            "version": results["version"],
+            "rows": results["rows"],
+            "predictions": results["predictions"],
+            "probabilities": probabilities,
+        }
+    )
+
+
+@api_router.post(
+    "/predict/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+            "required": True,
+        }
+    },
+    status_code=200,
+)
+async def predict_stream(request: Request) -> Any:
+    """
+    Bulk predictions of a body of any length, NDJSON (one object of features per line)
+    or CSV with a header line (Content-Type text/csv). The rows are scored in chunks as
+    the body is read, and the results are streamed back as NDJSON, one line per row:
+    its prediction and churn probability, or its errors. See app/streaming.py.
+    A stream holds one chunk of rows in the queue of the admission control until it
+    ends, it is rejected with 429 before it starts if they do not fit. Streams have
+    no deadline.
+    """
+
+    from app import streaming
+    from model.config.core import config
+
+    chunk_rows = config.inference_config.stream_chunk_rows
+    controller = admission.get_admission_controller()
+    background = None
+    if controller is not None:
+        try:
+            ticket = controller.admit(chunk_rows)
+        except admission.Rejected as e:
+            raise _rejected(e)
+        background = BackgroundTask(controller.release, ticket)
+
+    lines = streaming.iter_lines(request.stream())
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        chunks = streaming.csv_chunks(lines, chunk_rows)
+    else:
+        chunks = streaming.ndjson_chunks(lines, chunk_rows)
+
+    return streaming.BodyStreamingResponse(
+        streaming.stream_predictions(chunks),
+        media_type="application/x-ndjson",
+        background=background,
+    )
+
+
+def check_admin_token(token: Optional[str]) -> None:
+    """The admin endpoints need the X-Admin-Token header to match the ADMIN_TOKEN setting."""
+
+    if settings.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="The admin endpoints are disabled")
+    if token is None or not secrets.compare_digest(token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@api_router.get("/models", response_model=ModelVersions, status_code=200)
+def models(x_admin_token: Optional[str] = Header(None)) -> dict:
+    """
+    List the versions of the model registry, the active one (the one to serve)
+    and the one this server process is serving.
+    """
+
+    check_admin_token(x_admin_token)
+
+    from model.predict import serving_version
+    from model.registry import get_registry
+
+    registry = get_registry()
+    return ModelVersions(
+        active=registry.active_version(),
+        serving=serving_version(),
+        versions=registry.versions(),
+    ).dict()
+
+
+@api_router.post(
+    "/models/{version_id}/activate", response_model=ModelVersions, status_code=200
+)
+async def activate_model_version(
+    version_id: str, x_admin_token: Optional[str] = Header(None)
+) -> dict:
+    """
+    Activate a version of the model registry. It is loaded and warmed up, then
+    swapped in place of the served version without failing the requests in flight.
+    The other server processes swap it in when they see it is active.
+    """
+
+    check_admin_token(x_admin_token)
+
+    try:
+        await model_loader.activate(version_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown model version {version_id}"
+        )
+    except Exception as e:
+        logger.error(f"Activating model version {version_id} failed: {e}")
+        raise HTTPException(
+            status_code=500, detail="Activating the model version failed"
+        )
+
+    return models(x_admin_token)
@@ -0,0 +1,81 @@
+"""
+Decoding of the columnar prediction requests.
+
+The body is {"inputs": {feature: [value, ...], ...}}, one array per feature. It is
+decoded by orjson and every array is converted to a NumPy array in one call: the
+numerical features to float64 (null becomes NaN) if all their values are numbers,
+the categorical ones, and the other numerical ones, to object arrays. No object is
+built per row, the arrays become the columns of the DataFrame given to
+make_prediction, which validates them column by column.
+"""
+
+import sys
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.core import config  # noqa: E402
+
+
+class ColumnarDecodeError(ValueError):
+    """The body is not a valid columnar request, the message says why."""
+
+
+# The types orjson decodes the numbers and null to.
+_NUMBER_TYPES = {int, float, type(None)}
+
+
+def _numerical(values: list) -> np.ndarray:
+    if not set(map(type, values)) <= _NUMBER_TYPES:
+        # Strings, booleans, arrays or other values which are not numbers: kept as they
+        # are, NumPy would convert "1.5" or true to a float. The validation checks them
+        # as for /predict, and reports the rows pydantic does not accept.
+        return _categorical(values)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _categorical(values: list) -> np.ndarray:
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def decode_columnar(body: bytes) -> t.Dict[str, np.ndarray]:
+    """The arrays of the features of a columnar request, in the order of the features."""
+
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as error:
+        raise ColumnarDecodeError(f"The body is not valid JSON: {error}") from None
+
+    inputs = payload.get("inputs") if isinstance(payload, dict) else None
+    if not isinstance(inputs, dict):
+        raise ColumnarDecodeError('The body must be an object with an "inputs" object')
+
+    model_config = config.model_config
+    missing = [name for name in model_config.features if name not in inputs]
+    if missing:
+        raise ColumnarDecodeError(f"Missing features: {', '.join(missing)}")
+    not_arrays = [
+        name for name in model_config.features if not isinstance(inputs[name], list)
+    ]
+    if not_arrays:
+        raise ColumnarDecodeError(f"Not arrays: {', '.join(not_arrays)}")
+    lengths = {len(inputs[name]) for name in model_config.features}
+    if len(lengths) > 1:
+        raise ColumnarDecodeError("The arrays of the features differ in length")
+    if lengths == {0}:
+        raise ColumnarDecodeError("The arrays of the features are empty")
+
+    numerical = set(model_config.numerical_vars)
+    return {
+        name: _numerical(inputs[name])
+        if name in numerical
+        else _categorical(inputs[name])
+        for name in model_config.features
+    }
@@ -1,11 +1,16 @@
 import logging
 import sys
+import traceback
 from types import FrameType
-from typing import List, cast
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, cast
 
+import orjson
 from loguru import logger
 from pydantic import AnyHttpUrl, BaseSettings
 
+if TYPE_CHECKING:
+    from loguru import BasicHandlerConfig, Record
+
 
 # Set the logging level for the application. The logging level is an integer value that represents
 # the severity level at which the logger should start reporting log messages.
@@ -14,6 +19,17 @@ from pydantic import AnyHttpUrl, BaseSettings
 class LoggingSettings(BaseSettings):
     LOGGING_LEVEL: int = logging.INFO
 
+    # Write the log records as JSON lines, with the fields bound to them (request id, rows, timings...).
+    LOGGING_JSON: bool = True
+
+    # Hand the log records to a background thread which writes them, so that logging never waits on stderr.
+    LOGGING_ENQUEUE: bool = True
+
+    # Share of the prediction requests whose inputs and predictions are logged, the others only log their
+    # sizes and timings. At most LOGGING_PAYLOAD_MAX_ROWS rows of a payload are logged.
+    LOGGING_PAYLOAD_SAMPLE_RATE: float = 0.0
+    LOGGING_PAYLOAD_MAX_ROWS: int = 10
+
 
 # Settings has several fields for various application settings, including the API
 # version string, CORS origins, and project name. Settings also includes an instance of LoggingSettings.
@@ -34,6 +50,15 @@ class Settings(BaseSettings):
 
     PROJECT_NAME: str = "Predicting customer churn API"
 
+    # When True the server starts serving before the model is loaded, the model is loaded and
+    # warmed up by a background task and the readiness endpoint reports when it is done.
+    # When False the startup waits for the model.
+    LOAD_MODEL_IN_BACKGROUND: bool = True
+
+    # Token expected in the X-Admin-Token header of the admin endpoints (model versions),
+    # the admin endpoints are disabled when it is not set.
+    ADMIN_TOKEN: Optional[str] = None
+
     # The nested Config class with a single attribute case_sensitive set to True. This means that the
     # environment variables used to set these settings must match the case of the field names.
     class Config:
@@ -79,6 +104,35 @@ class InterceptHandler(logging.Handler):
         )
 
 
+def _json_record(record: "Record") -> None:
+
+    """
+    Loguru patcher storing the record as a JSON line in its extra "json" field, that the format
+    of the JSON handler writes. The fields bound to the record (logger.bind or logger.contextualize)
+    are fields of the line.
+    """
+
+    line: Dict[str, Any] = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+    }
+    line.update((key, value) for key, value in record["extra"].items() if key != "json")
+    if record["exception"] is not None:
+        exception = record["exception"]
+        line["exception"] = "".join(
+            traceback.format_exception(
+                exception.type, exception.value, exception.traceback
+            )
+        )
+    record["extra"]["json"] = orjson.dumps(
+        line, default=str, option=orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+
 def setup_app_logging(config: Settings) -> None:
 
     """
@@ -108,8 +162,19 @@ def setup_app_logging(config: Settings) -> None:
     # the log messages will be outputted, and in this case, it’s sys.stderr, meaning log messages
     # will be outputted to the standard error stream. The level is the minimum level of log
     # messages that the handler will handle, and it’s set to the logging level from the application settings.
+    # With enqueue the messages are written by a background thread, and with LOGGING_JSON every message is
+    # a JSON line built by _json_record.
+    handler: "BasicHandlerConfig" = {
+        "sink": sys.stderr,
+        "level": config.logging.LOGGING_LEVEL,
+        "enqueue": config.logging.LOGGING_ENQUEUE,
+    }
+    if config.logging.LOGGING_JSON:
+        # A function, loguru would append the traceback to a format string: it is in the JSON line.
+        handler["format"] = lambda _: "{extra[json]}\n"
     logger.configure(
-        handlers=[{"sink": sys.stderr, "level": config.logging.LOGGING_LEVEL}]
+        handlers=[handler],
+        patcher=_json_record if config.logging.LOGGING_JSON else None,
     )
 
 settings = Settings()
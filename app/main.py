@@ -1,28 +1,60 @@
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator
 
 from fastapi import APIRouter, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from loguru import logger
 
 # The root of the project is added to the Python path. This allows the script to import
 # modules from the root directory.
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from app.admission import AdmissionMiddleware  # noqa: E402
 from app.api import api_router  # noqa: E402
 from app.config import settings, setup_app_logging  # noqa: E402
+from app.metrics import REGISTRY, MetricsMiddleware  # noqa: E402
+from app.model_loader import start_loading, start_watching, stop_watching  # noqa: E402
+from app.request_logging import RequestContextMiddleware  # noqa: E402
 
 # setup logging as early as possible
 setup_app_logging(config=settings)
 
+
+# Load the model when the application starts. In the background by default, so that the server
+# accepts connections (and answers /health) right away. When it shuts down, stop the inference
+# executor (the running predictions are allowed to finish) and write the log records still queued.
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # config.yml is parsed here, once the server is up, not when the module is imported.
+    from model.config.core import config
+    from model.executor import shutdown_executor
+
+    task = start_loading()
+    # Follow the active version of the model registry, see model_loader.watch_active_version.
+    if config.inference_config.model_watch_interval > 0:
+        start_watching(config.inference_config.model_watch_interval)
+    if not settings.LOAD_MODEL_IN_BACKGROUND:
+        await task
+
+    yield
+
+    stop_watching()
+    shutdown_executor(wait=True)
+    await logger.complete()
+
+
 # Create an instance of FastAPI. The title of the application and the URL for the OpenAPI schema
 # are set using the application's settings.
 app = FastAPI(
-    title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    title=settings.PROJECT_NAME,
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
+
 # Create an instance of APIRouter. This will be used to define the API endpoints.
 root_router = APIRouter()
 
@@ -43,6 +75,15 @@ def index(request: Request) -> Any:
 
     return HTMLResponse(content=body)
 
+
+# Define a GET endpoint at /metrics. It returns the metrics of this process in the Prometheus text format.
+@root_router.get("/metrics")
+def metrics() -> Any:
+    """Prometheus metrics."""
+    return PlainTextResponse(
+        content=REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
 # The API router and the root router are included in the FastAPI application.
 app.include_router(api_router, prefix=settings.API_V1_STR)
 app.include_router(root_router)
@@ -59,6 +100,24 @@ if settings.BACKEND_CORS_ORIGINS:
     )
 
 
+# The prediction requests which would not be admitted are rejected before their body is read,
+# see app/admission.py.
+app.add_middleware(
+    AdmissionMiddleware,
+    paths=[
+        f"{settings.API_V1_STR}/predict",
+        f"{settings.API_V1_STR}/predict/columnar",
+        f"{settings.API_V1_STR}/predict/stream",
+    ],
+)
+
+# Every request gets an id, bound to the log records written while it is handled.
+app.add_middleware(RequestContextMiddleware)
+
+# The metrics middleware is the outermost one, so that it times the whole request.
+app.add_middleware(MetricsMiddleware)
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,382 @@
+"""
+Metrics of the API, exposed in the Prometheus text format at /metrics.
+
+Counters, gauges and histograms are kept in memory by this process. Recording a
+value is a dict lookup and a few additions under a lock, cheap enough to stay on
+for every request. The time spent in every stage of a prediction is recorded:
+
+    parse           reading the body and parsing it into MultipleDataRecords,
+                    or decoding it into arrays (/predict/columnar)
+    to_dataframe    the DataFrame of the inputs
+    check_inputs    check_inputs, in the inference executor
+    cache_lookup    looking the rows up in the prediction cache
+    preprocess      the preprocessing steps of the pipeline
+    predict         the forest
+    drift           counting the rows in the drift sketch
+    serialize       validating and encoding the response
+
+cache_lookup, preprocess, predict and drift are those of a pipeline call, recorded
+once for all the requests batched into it.
+"""
+
+import bisect
+import sys
+import threading
+import time
+import typing as t
+from abc import ABC, abstractmethod
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Seconds, from 100µs to 10s.
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# Rows, powers of 4.
+ROWS_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+def _format_labels(
+    names: t.Sequence[str], values: t.Sequence[str], extra: str = ""
+) -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: t.Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: t.Dict[t.Tuple[str, ...], t.Any] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self) -> t.Any:
+        """A new child of the metric, for one combination of label values."""
+
+    def labels(self, *values: str) -> t.Any:
+        """The child of the metric with the given label values, created on first use."""
+
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> t.List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(
+        self, name: str, labelnames: t.Sequence[str], values: t.Sequence[str]
+    ) -> t.List[str]:
+        return [f"{name}{_format_labels(labelnames, values)} {self.value}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramValue:
+    def __init__(self, buckets: t.Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # One count per bucket, plus the values above the last bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    def render(
+        self, name: str, labelnames: t.Sequence[str], values: t.Sequence[str]
+    ) -> t.List[str]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(
+                f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}"
+            )
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {total}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process. Collectors are called when the metrics are rendered,
+    they return the lines of values which are read from elsewhere (the prediction cache).
+    """
+
+    def __init__(self) -> None:
+        self.metrics: t.List[_Metric] = []
+        self.collectors: t.List[t.Callable[[], t.List[str]]] = []
+
+    def register(self, metric: t.Any) -> t.Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route and status code.",
+        ("path", "status"),
+    )
+)
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to answer an HTTP request, by route.",
+        ("path",),
+    )
+)
+IN_FLIGHT = REGISTRY.register(
+    Gauge("http_requests_in_flight", "HTTP requests being processed.")
+)
+STAGE_LATENCY = REGISTRY.register(
+    Histogram(
+        "prediction_stage_duration_seconds",
+        "Time spent in each stage of a prediction.",
+        ("stage",),
+    )
+)
+REQUEST_ROWS = REGISTRY.register(
+    Histogram(
+        "prediction_request_rows", "Rows of a prediction request.", buckets=ROWS_BUCKETS
+    )
+)
+BATCH_ROWS = REGISTRY.register(
+    Histogram(
+        "prediction_batch_rows",
+        "Rows of the pipeline call a request was scored in, requests batched together share one call.",
+        buckets=ROWS_BUCKETS,
+    )
+)
+PREDICTION_ERRORS = REGISTRY.register(
+    Counter(
+        "prediction_errors_total",
+        "Failed predictions: validation, timeout or failure.",
+        ("kind",),
+    )
+)
+
+ADMISSION_QUEUE_ROWS = REGISTRY.register(
+    Gauge(
+        "prediction_queue_rows",
+        "Rows of the predictions admitted and not answered yet, see app/admission.py.",
+    )
+)
+ADMISSION_QUEUE_REQUESTS = REGISTRY.register(
+    Gauge(
+        "prediction_queue_requests",
+        "Prediction requests admitted and not answered yet.",
+    )
+)
+ADMISSION_REJECTIONS = REGISTRY.register(
+    Counter(
+        "prediction_rejections_total",
+        "Prediction requests rejected by the admission control: queue_full (429) or deadline (503).",
+        ("reason",),
+    )
+)
+
+
+def _prediction_cache_lines() -> t.List[str]:
+    # Only once the model is in use, a scrape must not import pandas.
+    if "model.prediction_cache" not in sys.modules:
+        return []
+    cache = sys.modules["model.prediction_cache"].get_prediction_cache()
+    if cache is None:
+        return []
+    stats = cache.stats()
+    lines = []
+    for name, kind, documentation in (
+        ("hits", "counter", "Rows found in the prediction cache."),
+        ("misses", "counter", "Rows not found in the prediction cache."),
+        (
+            "evictions",
+            "counter",
+            "Rows evicted from the prediction cache by its memory budget.",
+        ),
+        (
+            "expirations",
+            "counter",
+            "Rows expired from the prediction cache by its time to live.",
+        ),
+        ("entries", "gauge", "Rows in the prediction cache."),
+    ):
+        metric = f"prediction_cache_{name}" + ("_total" if kind == "counter" else "")
+        lines += [
+            f"# HELP {metric} {documentation}",
+            f"# TYPE {metric} {kind}",
+            f"{metric} {stats[name]}",
+        ]
+    return lines
+
+
+REGISTRY.collectors.append(_prediction_cache_lines)
+
+
+class Stage:
+    """Time a block of code as one stage of the prediction."""
+
+    def __init__(self, name: str) -> None:
+        self.histogram = STAGE_LATENCY.labels(name)
+
+    def __enter__(self) -> "Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+def record_prediction(results: dict, n_rows: int) -> None:
+    """
+    Record the stage timings and the sizes reported by make_prediction. The stages of
+    a pipeline call shared by several requests, and its size, are only recorded with
+    the first request of the batch: once per call.
+    """
+
+    for stage, seconds in results.get("timings", {}).items():
+        STAGE_LATENCY.labels(stage).observe(seconds)
+    REQUEST_ROWS.labels().observe(n_rows)
+    if results.get("first_of_batch"):
+        for stage, seconds in results.get("batch_timings", {}).items():
+            STAGE_LATENCY.labels(stage).observe(seconds)
+        BATCH_ROWS.labels().observe(results["batch_rows"])
+    if results.get("errors"):
+        PREDICTION_ERRORS.labels("validation").inc()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting the requests by route and status, timing them and
+    tracking the requests in flight. It also times the serialization of the
+    response: from the moment the endpoint stored serialize_start in the request
+    state to the start of the response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["received"] = start
+        status = 500
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if "serialize_start" in state:
+                    STAGE_LATENCY.labels("serialize").observe(
+                        time.perf_counter() - state["serialize_start"]
+                    )
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels()
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            in_flight.dec()
+            # The route template (e.g. /api/v1/models/{version_id}/activate), not the raw path,
+            # so that the number of label values stays bounded.
+            path = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.labels(path, str(status)).inc()
+            REQUEST_LATENCY.labels(path).observe(time.perf_counter() - start)
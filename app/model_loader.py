@@ -0,0 +1,138 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.schemas.predict import MultipleDataInputs  # noqa: E402
+
+# The model is loaded after the server has started, model.predict (and with it pandas and
+# scikit-learn) is only imported by the loading task. The readiness endpoint reports its state.
+_ready = False
+_error: Optional[str] = None
+_task: Optional[asyncio.Task] = None
+_watch_task: Optional[asyncio.Task] = None
+# Only one version is loaded and swapped in at a time.
+_swap_lock: Optional[asyncio.Lock] = None
+
+
+def _import_and_load_model(version: Optional[str] = None) -> None:
+    from model.predict import load_model
+
+    load_model(version)
+
+
+def _warm_up_inputs() -> list:
+    return MultipleDataInputs.Config.schema_extra["example"]["inputs"]
+
+
+async def load_and_warm_up(version: Optional[str] = None) -> None:
+    """
+    Load the model (the active version of the registry, or version) without blocking
+    the event loop, then run one prediction on the example input of the API so that
+    the first real request is not slower.
+    """
+
+    global _ready, _error
+    start = time.perf_counter()
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, _import_and_load_model, version
+        )
+
+        from model.predict import make_prediction
+
+        await make_prediction(input_data=_warm_up_inputs())
+    except Exception as e:
+        _error = str(e)
+        logger.exception(f"Loading the model failed: {e}")
+        return
+
+    _ready, _error = True, None
+    logger.info(f"Model loaded and warmed up in {time.perf_counter() - start:.2f}s")
+
+
+def start_loading() -> asyncio.Task:
+    """Start loading the model in a background task of the running event loop."""
+
+    global _task
+    _task = asyncio.get_running_loop().create_task(load_and_warm_up())
+    return _task
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def loading_error() -> Optional[str]:
+    return _error
+
+
+async def activate(version: str) -> str:
+    """
+    Load the version of the model registry, warm it up and swap it in place of the served one.
+    The requests keep being served by the previous version until the swap.
+    """
+
+    global _swap_lock
+    from model.predict import activate_model
+
+    if _swap_lock is None:
+        _swap_lock = asyncio.Lock()
+    async with _swap_lock:
+        start = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: activate_model(version, warm_up_inputs=_warm_up_inputs())
+        )
+    logger.info(
+        f"Model version {version} swapped in after {time.perf_counter() - start:.2f}s"
+    )
+    return version
+
+
+async def watch_active_version(interval: float) -> None:
+    """
+    Swap in the active version of the model registry whenever it changes. With several
+    server processes, activating a version in one of them (or training a new one) is
+    how all of them end up serving it. If loading the model at startup failed, the
+    active version is loaded again, and then every version activated after it until
+    one of them loads.
+    """
+
+    from model.predict import serving_version
+    from model.registry import get_registry
+
+    registry = get_registry()
+    failed_version = None
+    while True:
+        await asyncio.sleep(interval)
+        active = registry.active_version()
+        if not _ready:
+            if _task is not None and _task.done() and active != failed_version:
+                await load_and_warm_up(active)
+                if not _ready:
+                    failed_version = active
+            continue
+        if active is None or active in (serving_version(), failed_version):
+            continue
+        try:
+            await activate(active)
+        except Exception as e:
+            # Not retried until another version is activated.
+            failed_version = active
+            logger.exception(f"Swapping in model version {active} failed: {e}")
+
+
+def start_watching(interval: float) -> None:
+    global _watch_task
+    _watch_task = asyncio.get_running_loop().create_task(watch_active_version(interval))
+
+
+def stop_watching() -> None:
+    if _watch_task is not None:
+        _watch_task.cancel()
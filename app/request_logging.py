@@ -0,0 +1,108 @@
+"""
+Structured logging of the prediction requests.
+
+Every request gets an id, the X-Request-ID header of the request or a new one, sent
+back in the X-Request-ID header of the response and bound to every log record written
+while it is handled (logger.contextualize): the JSON lines of app/config.py have a
+request_id field. The records written in the inference executor do not have it, the
+threads of the pool do not see the context of the request.
+
+A prediction is logged as one record with its size, model version and stage timings.
+Its inputs and predictions are only added to a sample of the requests
+(LOGGING_PAYLOAD_SAMPLE_RATE), and only their first LOGGING_PAYLOAD_MAX_ROWS rows: they
+are not formatted at all for the others.
+"""
+
+import random
+import sys
+import typing as t
+import uuid
+from pathlib import Path
+
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# A request id sent by a client is kept only if it is reasonably short.
+MAX_REQUEST_ID_LENGTH = 128
+
+
+class RequestContextMiddleware:
+    """ASGI middleware giving every request an id, bound to the log records written while it is handled."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        request_id: str = (
+            header
+            if header and len(header) <= MAX_REQUEST_ID_LENGTH
+            else uuid.uuid4().hex
+        )
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        with logger.contextualize(request_id=request_id):
+            await self.app(scope, receive, send_with_request_id)
+
+
+def sample_payload() -> bool:
+    """True for the share LOGGING_PAYLOAD_SAMPLE_RATE of the requests whose payload is logged."""
+
+    rate = settings.logging.LOGGING_PAYLOAD_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def truncate(rows: t.Sequence[t.Any]) -> t.Dict[str, t.Any]:
+    """The first LOGGING_PAYLOAD_MAX_ROWS rows of a payload and the number of rows left out."""
+
+    max_rows = settings.logging.LOGGING_PAYLOAD_MAX_ROWS
+    return {"rows": list(rows[:max_rows]), "truncated": max(0, len(rows) - max_rows)}
+
+
+def log_prediction(
+    results: dict,
+    n_rows: int,
+    *,
+    endpoint: str,
+    inputs: t.Optional[t.Callable[[], t.Sequence[t.Any]]] = None,
+    predictions: t.Optional[t.Callable[[], t.Sequence[t.Any]]] = None,
+) -> None:
+    """
+    Log a prediction of make_prediction as one structured record. inputs and predictions
+    return the rows of the payload, they are only called for the sampled requests. The
+    predictions default to those of the valid rows in results.
+    """
+
+    fields: t.Dict[str, t.Any] = {
+        "endpoint": endpoint,
+        "rows": n_rows,
+        "invalid_rows": n_rows - len(results["rows"]),
+        "version": results["version"],
+        "timings": {**results.get("timings", {}), **results.get("batch_timings", {})},
+    }
+    if results.get("batch_rows"):
+        fields["batch_rows"] = results["batch_rows"]
+    if predictions is None and results["predictions"] is not None:
+        predictions = results["predictions"].tolist
+    if sample_payload():
+        if inputs is not None:
+            fields["inputs"] = truncate(inputs())
+        if predictions is not None:
+            fields["predictions"] = truncate(predictions())
+
+    logger.bind(**fields).info(f"Prediction of {n_rows} rows")
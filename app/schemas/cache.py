@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class PredictionCacheStats(BaseModel):
+    enabled: bool
+    entries: int = 0
+    max_entries: int = 0
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0.0
+    evictions: int = 0
+    expirations: int = 0
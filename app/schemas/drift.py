@@ -0,0 +1,21 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class FeatureDrift(BaseModel):
+    name: str
+    kind: str
+    psi: Optional[float]
+    status: Optional[str]
+    missing_share: float
+    unseen_share: Optional[float]
+
+
+class DriftReport(BaseModel):
+    enabled: bool
+    version: Optional[str] = None
+    rows: int = 0
+    reference_rows: int = 0
+    drifted: List[str] = []
+    features: List[FeatureDrift] = []
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,8 @@ class Health(BaseModel):
     name: str
     api_version: str
     model_version: str
+
+
+class Readiness(BaseModel):
+    ready: bool
+    error: Optional[str]
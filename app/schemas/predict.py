@@ -1,6 +1,6 @@
 import sys
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -10,10 +10,22 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 from model.preprocessing.validation_classes import DataInputSchema  # noqa: E402
 
 
+class RowErrors(BaseModel):
+    # The position of the row in the inputs
+    row: int
+    # The validation errors of the row, "loc" is the field
+    errors: List[Dict[str, Any]]
+
+
 class PredictionResults(BaseModel):
-    errors: Optional[Any]
+    """
+    One prediction per input row, in the order of the rows. The invalid rows are not
+    scored, their prediction is null and their errors are in errors.
+    """
+
+    errors: Optional[List[RowErrors]]
     version: str
-    predictions: int
+    predictions: List[Optional[int]]
 
 
 class MultipleDataInputs(BaseModel):
@@ -52,3 +64,46 @@ class MultipleDataInputs(BaseModel):
                 ]
             }
         }
+
+
+class MultipleDataRecords(BaseModel):
+    """
+    The body of /predict: the rows have the fields of DataInputSchema, but they are
+    validated by make_prediction, so that an invalid row does not reject the others.
+    """
+
+    inputs: List[Dict[str, Any]]
+
+    class Config:
+        schema_extra = MultipleDataInputs.Config.schema_extra
+
+
+class ColumnarDataInputs(BaseModel):
+    """
+    The body of /predict/columnar: one array per feature, the rows are the positions
+    in the arrays. It documents the endpoint, the body is decoded with orjson, not this model.
+    """
+
+    inputs: Dict[str, List[Any]]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "inputs": {
+                    name: [value]
+                    for name, value in MultipleDataInputs.Config.schema_extra[
+                        "example"
+                    ]["inputs"][0].items()
+                }
+            }
+        }
+
+
+class ColumnarPredictionResults(BaseModel):
+    errors: Optional[List[RowErrors]]
+    version: str
+    # The positions of the scored rows, the invalid ones are left out of the arrays
+    rows: List[int]
+    predictions: Optional[List[Any]]
+    # The probability of every class, by class
+    probabilities: Optional[Dict[str, List[float]]]
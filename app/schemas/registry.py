@@ -0,0 +1,17 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class ModelVersion(BaseModel):
+    version_id: str
+    model_version: str
+    created: str
+    metrics: Dict[str, Any]
+    training: Dict[str, Any] = {}
+
+
+class ModelVersions(BaseModel):
+    active: Optional[str]
+    serving: Optional[str]
+    versions: List[ModelVersion]
@@ -0,0 +1,236 @@
+"""
+Streaming bulk predictions.
+
+The body of /predict/stream is read as it arrives, cut into chunks of
+stream_chunk_rows rows, and every chunk is scored by make_prediction before the
+next one is read. The results are streamed back as NDJSON, one line per input
+row, in the order of the rows:
+
+    {"row": 0, "prediction": 0, "probability": 0.08}
+    {"row": 1, "errors": [{"loc": ["cons_12m"], "msg": "value is not a valid integer", ...}]}
+
+The body is NDJSON (one object of features per line) or CSV with a header line.
+CSV fields holding line breaks are not supported. Only one chunk is held in
+memory at a time: the body is not read further while the results of a chunk are
+being sent, so a slow reader slows the upload down instead of filling the memory.
+"""
+
+import io
+import sys
+import typing as t
+from pathlib import Path
+
+import orjson
+import pandas as pd
+from loguru import logger
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import admission, metrics  # noqa: E402
+from model.config.core import config  # noqa: E402
+from model.preprocessing.validation import errors_by_row  # noqa: E402
+
+# A line longer than this is not buffered further, it is reported as an error.
+MAX_LINE_BYTES = 1 << 20
+
+
+class StreamError(ValueError):
+    """The body can not be read any further, the message says why."""
+
+
+class Chunk:
+    """
+    Rows of the body read together: the parsed NDJSON records or the CSV lines
+    (under header), with the row number of each of them in rows, and the errors
+    of the rows which could not be parsed by row number.
+    """
+
+    def __init__(self, header: t.Optional[bytes] = None) -> None:
+        self.header = header
+        self.rows: t.List[int] = []
+        self.records: t.List[dict] = []
+        self.lines: t.List[bytes] = []
+        self.errors: t.Dict[int, t.List[dict]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self.errors)
+
+
+async def iter_lines(stream: t.AsyncIterator[bytes]) -> t.AsyncIterator[bytes]:
+    """The non-empty lines of a byte stream, without their line break."""
+
+    pending = b""
+    async for data in stream:
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line = line.rstrip(b"\r")
+            if line.strip():
+                yield line
+        if len(pending) > MAX_LINE_BYTES:
+            raise StreamError(f"A line is longer than {MAX_LINE_BYTES} bytes")
+    if pending.strip():
+        yield pending.rstrip(b"\r")
+
+
+async def ndjson_chunks(
+    lines: t.AsyncIterator[bytes], chunk_rows: int
+) -> t.AsyncIterator[Chunk]:
+    chunk = Chunk()
+    row = 0
+    async for line in lines:
+        try:
+            record = orjson.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("the line is not a JSON object")
+        except ValueError as error:
+            chunk.errors[row] = [{"loc": [], "msg": f"Invalid JSON: {error}"}]
+        else:
+            chunk.rows.append(row)
+            chunk.records.append(record)
+        row += 1
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = Chunk()
+    if len(chunk):
+        yield chunk
+
+
+async def csv_chunks(
+    lines: t.AsyncIterator[bytes], chunk_rows: int
+) -> t.AsyncIterator[Chunk]:
+    header = None
+    async for header in lines:
+        break
+    if header is None:
+        return
+    chunk = Chunk(header)
+    row = 0
+    async for line in lines:
+        chunk.rows.append(row)
+        chunk.lines.append(line)
+        row += 1
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = Chunk(header)
+    if len(chunk):
+        yield chunk
+
+
+def chunk_frame(chunk: Chunk) -> pd.DataFrame:
+    """The parsed rows of a chunk, with the features as columns."""
+
+    if chunk.header is not None:
+        frame = pd.read_csv(io.BytesIO(b"\n".join([chunk.header] + chunk.lines)))
+    else:
+        frame = pd.DataFrame.from_records(chunk.records)
+    # Missing features are missing values, the validation decides if they are allowed.
+    return frame.reindex(columns=config.model_config.features)
+
+
+async def score_chunk(frame: pd.DataFrame) -> t.Tuple[dict, t.Dict[int, list]]:
+    """
+    Score a chunk with make_prediction. The invalid rows, and the rows the pipeline
+    fails on, do not prevent the others from being scored: returns the results of
+    the rows scored, at the positions in "rows", and the errors by position.
+    """
+
+    from model.predict import make_prediction
+
+    results = await make_prediction(input_data=frame)
+    metrics.record_prediction(results, len(frame))
+    controller = admission.get_admission_controller()
+    if controller is not None:
+        controller.observe(len(frame))
+    return results, errors_by_row(results["errors"])
+
+
+async def _chunk_lines(chunk: Chunk) -> bytes:
+    """The NDJSON lines of the results of a chunk, in the order of the rows."""
+
+    lines: t.Dict[int, bytes] = {
+        row: orjson.dumps({"row": row, "errors": errors})
+        for row, errors in chunk.errors.items()
+    }
+
+    if chunk.rows:
+        frame: t.Optional[pd.DataFrame] = None
+        try:
+            frame = chunk_frame(chunk)
+        except ValueError as error:  # e.g. a CSV line with too many fields
+            for row in chunk.rows:
+                lines[row] = orjson.dumps(
+                    {
+                        "row": row,
+                        "errors": [{"loc": [], "msg": f"Invalid rows: {error}"}],
+                    }
+                )
+
+        if frame is not None:
+            results, errors = await score_chunk(frame)
+            for position, row_errors in errors.items():
+                row = chunk.rows[position]
+                lines[row] = orjson.dumps({"row": row, "errors": row_errors})
+            if results["predictions"] is not None:
+                probabilities = results["probabilities"][:, -1]
+                for position, prediction, probability in zip(
+                    results["rows"].tolist(),
+                    results["predictions"].tolist(),
+                    probabilities.tolist(),
+                ):
+                    row = chunk.rows[position]
+                    lines[row] = orjson.dumps(
+                        {
+                            "row": row,
+                            "prediction": prediction,
+                            "probability": probability,
+                        }
+                    )
+
+    return b"\n".join(lines[row] for row in sorted(lines)) + b"\n"
+
+
+async def stream_predictions(chunks: t.AsyncIterator[Chunk]) -> t.AsyncIterator[bytes]:
+    """
+    The results, chunk by chunk. Once the response has started its status can not
+    change anymore: a failure ends the stream with an {"error": ...} line.
+    """
+
+    try:
+        async for chunk in chunks:
+            yield await _chunk_lines(chunk)
+    except ClientDisconnect:
+        return
+    except StreamError as error:
+        metrics.PREDICTION_ERRORS.labels("validation").inc()
+        yield orjson.dumps({"error": str(error)}) + b"\n"
+    except TimeoutError as error:
+        metrics.PREDICTION_ERRORS.labels("timeout").inc()
+        logger.error(f"Streamed prediction timed out: {error}")
+        yield orjson.dumps({"error": "Prediction timed out"}) + b"\n"
+    except Exception as error:
+        metrics.PREDICTION_ERRORS.labels("failure").inc()
+        logger.error(f"Streamed prediction failed: {error}")
+        yield orjson.dumps({"error": "Prediction failed"}) + b"\n"
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose content reads the request body while it is sent.
+    StreamingResponse listens for the disconnection of the client in the meantime,
+    and that listener would take the messages of the body. Here the content sees
+    the disconnection itself: request.stream() raises ClientDisconnect.
+    The background task runs even if the response could not be sent, it gives the
+    rows of the stream back to the admission control.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        finally:
+            if self.background is not None:
+                await self.background()
@@ -11,13 +11,13 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
 from app.main import app  # noqa: E402
 from model.config.core import config  # noqa: E402
-from model.preprocessing.data_manager import load_dataset  # noqa: E402
+from model.preprocessing.feature_cache import cached_load_dataset  # noqa: E402
 
 
 @pytest.fixture(scope="module")
 def test_data() -> pd.DataFrame:
 
-    loaded_test_example = load_dataset(
+    loaded_test_example = cached_load_dataset(
         client_file_name=config.app_config.client_data_file,
         price_file_name=config.app_config.price_data_file,
     ).iloc[0]
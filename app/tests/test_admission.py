@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, Rejected, ServiceTimeModel
+
+
+def test_service_time_model_fits_the_time_per_call_and_per_row() -> None:
+    # Given calls of 2 ms plus 10 µs per row
+    model = ServiceTimeModel()
+
+    # When
+    for rows in (1, 10, 100, 1000) * 3:
+        model.observe(rows, 0.002 + 0.00001 * rows)
+
+    # Then
+    a, b = model.coefficients()
+    assert a == pytest.approx(0.002)
+    assert b == pytest.approx(0.00001)
+    assert model.estimate(10_000) == pytest.approx(0.102)
+
+
+def test_admission_bounds_the_rows_waiting() -> None:
+    # Given
+    controller = AdmissionController(max_queue_rows=100)
+    first = controller.admit(60)
+
+    # When
+    with pytest.raises(Rejected) as rejected:
+        controller.admit(50)
+
+    # Then
+    assert rejected.value.status_code == 429
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.headers == {"Retry-After": "1"}
+    assert controller.queued_rows == 60
+
+    # And a request bigger than the queue is admitted once the queue is empty
+    controller.release(first)
+    controller.admit(500)
+    assert controller.queued_rows == 500
+    assert controller.queued_requests == 1
+
+
+def test_admission_rejects_the_requests_which_can_not_meet_their_deadline() -> None:
+    # Given 10 ms per row, and 50 rows admitted
+    model = ServiceTimeModel()
+    for rows in (1, 100) * 4:
+        model.observe(rows, 0.01 * rows)
+    controller = AdmissionController(max_queue_rows=10_000, model=model)
+    controller.admit(50)
+
+    # When the request would be answered in 0.51 s
+    with pytest.raises(Rejected) as rejected:
+        controller.admit(1, deadline=time.perf_counter() + 0.3)
+
+    # Then
+    assert rejected.value.status_code == 503
+    assert rejected.value.reason == "deadline"
+    assert rejected.value.headers == {"Retry-After": "1"}
+
+    # And the same request is admitted with a longer deadline
+    controller.admit(1, deadline=time.perf_counter() + 5.0)
+
+
+def test_a_request_past_its_deadline_keeps_its_rows_until_it_is_done() -> None:
+    # Given
+    controller = AdmissionController(max_queue_rows=100)
+
+    async def predict() -> dict:
+        await asyncio.sleep(0.2)
+        return {"timings": {"predict": 0.2}}
+
+    async def scenario() -> int:
+        with pytest.raises(TimeoutError):
+            await controller.run(10, time.perf_counter() + 0.05, predict)
+        queued = controller.queued_rows
+        await asyncio.sleep(0.3)
+        return queued
+
+    # When
+    queued = asyncio.run(scenario())
+
+    # Then
+    assert queued == 10
+    assert controller.queued_rows == 0
+    assert controller.queued_requests == 0
+
+
+def test_predict_rejects_an_expired_deadline(client: TestClient) -> None:
+    # When
+    response = client.post(
+        "http://localhost:8001/api/v1/predict",
+        json={"inputs": [{}]},
+        headers={"X-Request-Deadline-Ms": "0"},
+    )
+
+    # Then
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    metrics = client.get("http://localhost:8001/metrics").text
+    assert 'prediction_rejections_total{reason="deadline"}' in metrics
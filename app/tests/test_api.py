@@ -1,7 +1,10 @@
+import time
 from typing import Any, Union
 
 import numpy as np
+import orjson
 import pandas as pd
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -42,7 +45,258 @@ def test_make_prediction(client: TestClient, test_data: pd.DataFrame) -> None:
     assert response.status_code == 200
     # The response data is parsed from JSON.
     prediction_data = response.json()
-    # Check that the predictions field is either 0 or 1.
-    assert prediction_data["predictions"] in [0, 1]
+    # Check that there is one prediction per row, either 0 or 1.
+    assert len(prediction_data["predictions"]) == len(test_data)
+    assert prediction_data["predictions"][0] in [0, 1]
     # Check that the errors field is None.
     assert prediction_data["errors"] is None
+
+
+def test_predict_invalid_rows(client: TestClient, test_data: pd.DataFrame) -> None:
+
+    """An invalid row does not fail the whole request: the valid rows are scored and the
+    invalid one is reported with its index."""
+
+    # Given three rows, the second one is invalid
+    from model.config.core import config
+
+    rows = pd.concat([test_data] * 3, ignore_index=True)[config.model_config.features]
+    records = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+    records[1]["cons_12m"] = "not a number"
+
+    # When
+    response = client.post(
+        "http://localhost:8001/api/v1/predict", json={"inputs": records}
+    )
+
+    # Then
+    assert response.status_code == 200
+    prediction_data = response.json()
+    assert prediction_data["predictions"][0] in [0, 1]
+    assert prediction_data["predictions"][1] is None
+    assert prediction_data["predictions"][2] == prediction_data["predictions"][0]
+    assert [error["row"] for error in prediction_data["errors"]] == [1]
+    assert prediction_data["errors"][0]["errors"][0]["loc"] == ["cons_12m"]
+
+
+def test_ready_once_the_model_is_loaded(client: TestClient) -> None:
+
+    """The readiness endpoint answers 503 while the model is loading and 200 once it is
+    loaded and warmed up, the liveness endpoint answers 200 in both cases."""
+
+    # Given the application started by the client fixture, the model loads in the background
+    assert client.get("http://localhost:8001/api/v1/health").status_code == 200
+
+    # When the readiness endpoint is polled until the loading task has finished
+    deadline = time.monotonic() + 60
+    response = client.get("http://localhost:8001/api/v1/ready")
+    while response.status_code == 503 and time.monotonic() < deadline:
+        assert response.json()["error"] is None
+        time.sleep(0.1)
+        response = client.get("http://localhost:8001/api/v1/ready")
+
+    # Then the application reports it is ready
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "error": None}
+
+
+def test_metrics(client: TestClient) -> None:
+
+    """The requests are counted by route and status, and the metrics are served in the
+    Prometheus text format."""
+
+    # Given
+    client.get("http://localhost:8001/api/v1/health")
+
+    # When
+    response = client.get("http://localhost:8001/metrics")
+
+    # Then
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{path="/api/v1/health",status="200"}' in response.text
+    assert "# TYPE prediction_stage_duration_seconds histogram" in response.text
+
+
+def test_predict_columnar(client: TestClient, test_data: pd.DataFrame) -> None:
+
+    """The columnar endpoint takes one array per feature and returns the predictions and
+    the probabilities of every class as arrays, the same predictions as /predict."""
+
+    # Given three copies of the test example, as arrays
+    from model.config.core import config
+
+    rows = pd.concat([test_data] * 3, ignore_index=True)[config.model_config.features]
+    columns = rows.astype(object).where(rows.notna(), None).to_dict(orient="list")
+
+    # When
+    response = client.post(
+        "http://localhost:8001/api/v1/predict/columnar", json={"inputs": columns}
+    )
+
+    # Then
+    assert response.status_code == 200
+    prediction_data = response.json()
+    assert prediction_data["errors"] is None
+    assert prediction_data["rows"] == [0, 1, 2]
+    assert len(prediction_data["predictions"]) == 3
+    assert prediction_data["predictions"][0] in [0, 1]
+    probabilities = np.array(list(prediction_data["probabilities"].values()))
+    assert np.allclose(probabilities.sum(axis=0), 1.0)
+
+    # And a request missing a feature is rejected
+    del columns["has_gas"]
+    response = client.post(
+        "http://localhost:8001/api/v1/predict/columnar", json={"inputs": columns}
+    )
+    assert response.status_code == 422
+    assert "has_gas" in response.json()["detail"]
+
+
+def test_predict_columnar_validates_as_predict(
+    client: TestClient, test_data: pd.DataFrame
+) -> None:
+
+    """A value which is not a number, in a numerical array, is validated as by /predict:
+    the row whose integer is the string "1.5" is reported with its index."""
+
+    # Given three copies of the test example, the second one with cons_12m "1.5"
+    from model.config.core import config
+
+    rows = pd.concat([test_data] * 3, ignore_index=True)[config.model_config.features]
+    rows = rows.astype(object).where(rows.notna(), None)
+    rows.loc[1, "cons_12m"] = "1.5"
+
+    # When
+    columnar = client.post(
+        "http://localhost:8001/api/v1/predict/columnar",
+        json={"inputs": rows.to_dict(orient="list")},
+    )
+    by_row = client.post(
+        "http://localhost:8001/api/v1/predict",
+        json={"inputs": rows.to_dict(orient="records")},
+    )
+
+    # Then
+    assert columnar.status_code == by_row.status_code == 200
+    assert columnar.json()["rows"] == [0, 2]
+    assert columnar.json()["errors"] == by_row.json()["errors"]
+    assert [error["row"] for error in columnar.json()["errors"]] == [1]
+
+
+def test_drift(client: TestClient, test_data: pd.DataFrame) -> None:
+
+    """The rows scored are counted against the training rows of the model, and their
+    drift is reported feature by feature."""
+
+    # Given
+    from model.config.core import config
+
+    rows = test_data[config.model_config.features]
+    records = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+    scored = client.post("http://localhost:8001/api/v1/predict", json={"inputs": records})
+    assert scored.status_code == 200
+
+    # When
+    response = client.get("http://localhost:8001/api/v1/drift")
+
+    # Then
+    assert response.status_code == 200
+    report = response.json()
+    assert report["enabled"] is True
+    assert report["rows"] >= len(rows)
+    assert report["reference_rows"] > 0
+    names = {feature["name"] for feature in report["features"]}
+    assert names == set(config.model_config.numerical_vars) | set(
+        config.model_config.categorical_vars
+    )
+
+
+def test_drift_below_min_rows(
+    client: TestClient, test_data: pd.DataFrame, monkeypatch: pytest.MonkeyPatch
+) -> None:
+
+    """Until drift_min_rows rows were scored no PSI is reported, and no feature drifted."""
+
+    # Given
+    from model.config.core import config
+
+    monkeypatch.setattr(config.inference_config, "drift_min_rows", 10**9)
+    rows = test_data[config.model_config.features]
+    records = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+    scored = client.post("http://localhost:8001/api/v1/predict", json={"inputs": records})
+    assert scored.status_code == 200
+
+    # When
+    response = client.get("http://localhost:8001/api/v1/drift")
+
+    # Then
+    assert response.status_code == 200
+    report = response.json()
+    assert report["rows"] >= len(rows)
+    assert report["drifted"] == []
+    assert all(feature["psi"] is None for feature in report["features"])
+    assert all(feature["status"] is None for feature in report["features"])
+
+
+def test_predict_stream(client: TestClient, test_data: pd.DataFrame) -> None:
+
+    """The streaming endpoint scores an NDJSON body row by row, an invalid row gets its
+    errors without failing the other rows."""
+
+    # Given three rows, the second one invalid
+    from model.config.core import config
+
+    row = test_data[config.model_config.features].iloc[0]
+    record = row.astype(object).where(row.notna(), None).to_dict()
+    records = [record, dict(record, cons_12m="not a number"), record]
+    body = b"\n".join(
+        orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) for record in records
+    )
+
+    # When
+    response = client.post(
+        "http://localhost:8001/api/v1/predict/stream",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    # Then
+    assert response.status_code == 200
+    lines = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [line["row"] for line in lines] == [0, 1, 2]
+    assert lines[0]["prediction"] in [0, 1] and 0 <= lines[0]["probability"] <= 1
+    assert lines[1]["errors"][0]["loc"] == ["cons_12m"]
+    assert lines[2]["prediction"] == lines[0]["prediction"]
+
+
+def test_predict_stream_reports_the_rows_the_pipeline_fails_on(
+    client: TestClient, test_data: pd.DataFrame
+) -> None:
+
+    """A row the validation accepts but the pipeline cannot score, with a blank
+    categorical value, gets its errors without failing the stream."""
+
+    # Given three CSV rows, the second one with a blank has_gas
+    from model.config.core import config
+
+    frame = test_data[config.model_config.features].iloc[[0, 0, 0]]
+    frame = frame.reset_index(drop=True)
+    frame["has_gas"] = frame["has_gas"].astype(object)
+    frame.loc[1, "has_gas"] = None
+    body = frame.to_csv(index=False).encode()
+
+    # When
+    response = client.post(
+        "http://localhost:8001/api/v1/predict/stream",
+        content=body,
+        headers={"Content-Type": "text/csv"},
+    )
+
+    # Then
+    assert response.status_code == 200
+    lines = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [line["row"] for line in lines] == [0, 1, 2]
+    assert lines[0]["prediction"] in [0, 1]
+    assert lines[1]["errors"][0]["type"] == "value_error.prediction"
+    assert lines[2]["prediction"] == lines[0]["prediction"]
@@ -0,0 +1,87 @@
+from typing import Dict
+
+import numpy as np
+import orjson
+import pytest
+
+from app.columnar import ColumnarDecodeError, decode_columnar
+from model.config.core import config
+
+
+def _body(n_rows: int) -> dict:
+    columns: Dict[str, list] = {
+        name: [1.5] * n_rows for name in config.model_config.numerical_vars
+    }
+    columns.update(
+        {name: ["t"] * n_rows for name in config.model_config.categorical_vars}
+    )
+    return {"inputs": columns}
+
+
+def test_decode_columnar_to_arrays() -> None:
+    # Given
+    body = _body(3)
+    body["inputs"]["cons_12m"] = [1, None, 3]
+    body["inputs"]["has_gas"] = ["t", None, "f"]
+
+    # When
+    columns = decode_columnar(orjson.dumps(body))
+
+    # Then
+    assert list(columns) == list(config.model_config.features)
+    assert columns["cons_12m"].dtype == np.float64
+    assert np.isnan(columns["cons_12m"][1])
+    assert columns["has_gas"].dtype == object
+    assert columns["has_gas"][1] is None
+
+
+def test_decode_columnar_keeps_invalid_numbers_for_the_validation() -> None:
+    # Given
+    body = _body(2)
+    body["inputs"]["net_margin"] = [1.0, "not a number"]
+
+    # When
+    columns = decode_columnar(orjson.dumps(body))
+
+    # Then
+    assert columns["net_margin"].dtype == object
+    assert columns["net_margin"][1] == "not a number"
+
+
+@pytest.mark.parametrize("value", ["1.5", "3", True])
+def test_decode_columnar_does_not_convert_strings_and_booleans(value: object) -> None:
+    # Given
+    body = _body(2)
+    body["inputs"]["cons_12m"] = [1, value]
+
+    # When
+    columns = decode_columnar(orjson.dumps(body))
+
+    # Then
+    assert columns["cons_12m"].dtype == object
+    assert columns["cons_12m"][1] == value and type(columns["cons_12m"][1]) is type(
+        value
+    )
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"not json",
+        b"[]",
+        b'{"inputs": {}}',
+    ],
+)
+def test_decode_columnar_rejects_invalid_bodies(body: bytes) -> None:
+    with pytest.raises(ColumnarDecodeError):
+        decode_columnar(body)
+
+
+def test_decode_columnar_rejects_arrays_of_different_lengths() -> None:
+    # Given
+    body = _body(2)
+    body["inputs"]["pow_max"] = [1.0]
+
+    # When / Then
+    with pytest.raises(ColumnarDecodeError, match="length"):
+        decode_columnar(orjson.dumps(body))
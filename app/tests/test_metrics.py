@@ -0,0 +1,63 @@
+from app.metrics import BATCH_ROWS, STAGE_LATENCY, Counter, Histogram, record_prediction
+
+
+def test_histogram_render() -> None:
+    # Given
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+
+    # When
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.labels("predict").observe(value)
+
+    # Then
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="predict",le="0.1"} 2',
+        'latency_seconds_bucket{stage="predict",le="1.0"} 3',
+        'latency_seconds_bucket{stage="predict",le="+Inf"} 4',
+        'latency_seconds_sum{stage="predict"} 2.65',
+        'latency_seconds_count{stage="predict"} 4',
+    ]
+
+
+def test_counter_labels() -> None:
+    # Given
+    counter = Counter("errors_total", "Errors.", ("kind",))
+
+    # When
+    counter.labels("timeout").inc()
+    counter.labels("timeout").inc()
+    counter.labels("failure").inc()
+
+    # Then
+    assert counter.render()[2:] == [
+        'errors_total{kind="failure"} 1.0',
+        'errors_total{kind="timeout"} 2.0',
+    ]
+
+
+def test_record_prediction_records_a_shared_pipeline_call_once() -> None:
+    # Given two requests scored by the same pipeline call
+    batch_timings = {"predict": 0.01}
+    results = [
+        {
+            "timings": {"check_inputs": 0.001},
+            "batch_timings": batch_timings,
+            "batch_rows": 3,
+            "first_of_batch": first,
+        }
+        for first in (True, False)
+    ]
+    predict = STAGE_LATENCY.labels("predict")
+    check_inputs = STAGE_LATENCY.labels("check_inputs")
+    batch_rows = BATCH_ROWS.labels()
+    before = [sum(predict.counts), sum(check_inputs.counts), sum(batch_rows.counts)]
+
+    # When
+    for result in results:
+        record_prediction(result, 1)
+
+    # Then the stages of every request are recorded, those of the call once
+    after = [sum(predict.counts), sum(check_inputs.counts), sum(batch_rows.counts)]
+    assert [count - start for count, start in zip(after, before)] == [1, 2, 1]
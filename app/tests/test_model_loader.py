@@ -0,0 +1,49 @@
+import asyncio
+import typing as t
+
+import pytest
+
+from app import model_loader
+
+
+class _Registry:
+    def __init__(self, version: str) -> None:
+        self.version = version
+
+    def active_version(self) -> str:
+        return self.version
+
+
+def test_the_watcher_loads_a_version_activated_after_a_failed_startup(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Given a startup load which failed, and a registry whose active version changes
+    registry = _Registry("v1")
+    loaded: t.List[t.Optional[str]] = []
+
+    async def load_and_warm_up(version: t.Optional[str] = None) -> None:
+        loaded.append(version)
+        if version == "v2":
+            monkeypatch.setattr(model_loader, "_ready", True)
+            monkeypatch.setattr("model.predict.serving_version", lambda: version)
+
+    monkeypatch.setattr("model.registry.get_registry", lambda: registry)
+    monkeypatch.setattr(model_loader, "load_and_warm_up", load_and_warm_up)
+    monkeypatch.setattr(model_loader, "_ready", False)
+
+    async def scenario() -> None:
+        monkeypatch.setattr(
+            model_loader, "_task", asyncio.create_task(asyncio.sleep(0))
+        )
+        watcher = asyncio.create_task(model_loader.watch_active_version(0.01))
+        await asyncio.sleep(0.1)
+        registry.version = "v2"
+        await asyncio.sleep(0.1)
+        watcher.cancel()
+
+    # When
+    asyncio.run(scenario())
+
+    # Then v1 is loaded again once, and v2 once it is activated
+    assert loaded == ["v1", "v2"]
+    assert model_loader.is_ready()
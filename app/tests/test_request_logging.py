@@ -0,0 +1,63 @@
+import numpy as np
+import orjson
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app import request_logging
+from app.config import settings
+
+
+def test_log_prediction_samples_and_truncates_the_payload(monkeypatch) -> None:
+    # Given every payload logged, 2 rows at most
+    monkeypatch.setattr(settings.logging, "LOGGING_PAYLOAD_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings.logging, "LOGGING_PAYLOAD_MAX_ROWS", 2)
+    results = {
+        "rows": np.array([0, 2, 3]),
+        "predictions": np.array([0, 1, 0]),
+        "version": "v1",
+        "timings": {"predict": 0.01},
+        "batch_rows": 8,
+    }
+    lines = []
+    handler_id = logger.add(lines.append, format="{extra[json]}")
+
+    # When
+    try:
+        with logger.contextualize(request_id="abc"):
+            request_logging.log_prediction(
+                results, 4, endpoint="predict", inputs=lambda: [{"a": 1}] * 4
+            )
+    finally:
+        logger.remove(handler_id)
+
+    # Then
+    (line,) = [orjson.loads(str(line)) for line in lines]
+    assert line["message"] == "Prediction of 4 rows"
+    assert line["request_id"] == "abc"
+    assert line["rows"] == 4 and line["invalid_rows"] == 1 and line["batch_rows"] == 8
+    assert line["timings"] == {"predict": 0.01}
+    assert line["inputs"] == {"rows": [{"a": 1}, {"a": 1}], "truncated": 2}
+    assert line["predictions"] == {"rows": [0, 1], "truncated": 1}
+
+    # And nothing of the payload is logged out of the sample
+    monkeypatch.setattr(settings.logging, "LOGGING_PAYLOAD_SAMPLE_RATE", 0.0)
+    handler_id = logger.add(lines.append, format="{extra[json]}")
+    try:
+        request_logging.log_prediction(
+            results, 4, endpoint="predict", inputs=lambda: 1 / 0
+        )
+    finally:
+        logger.remove(handler_id)
+    assert "inputs" not in orjson.loads(str(lines[-1]))
+
+
+def test_requests_get_an_id(client: TestClient) -> None:
+    # When
+    given = client.get(
+        "http://localhost:8001/api/v1/health", headers={"X-Request-ID": "my-id"}
+    )
+    generated = client.get("http://localhost:8001/api/v1/health")
+
+    # Then
+    assert given.headers["X-Request-ID"] == "my-id"
+    assert len(generated.headers["X-Request-ID"]) == 32
@@ -0,0 +1,67 @@
+import asyncio
+import typing as t
+
+import orjson
+import pytest
+
+from app.streaming import (
+    MAX_LINE_BYTES,
+    StreamError,
+    chunk_frame,
+    csv_chunks,
+    iter_lines,
+    ndjson_chunks,
+)
+
+
+async def _stream(parts: t.List[bytes]) -> t.AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+async def _collect(iterator: t.AsyncIterator[t.Any]) -> t.List[t.Any]:
+    return [item async for item in iterator]
+
+
+def test_iter_lines_across_parts() -> None:
+    # Given a body cut in the middle of its lines
+    parts = [b'{"a": 1}\r\n{"a"', b": 2}\n\n", b'{"a": 3}']
+
+    # When
+    lines = asyncio.run(_collect(iter_lines(_stream(parts))))
+
+    # Then
+    assert lines == [b'{"a": 1}', b'{"a": 2}', b'{"a": 3}']
+
+
+def test_iter_lines_bounds_the_line_length() -> None:
+    with pytest.raises(StreamError):
+        asyncio.run(_collect(iter_lines(_stream([b"x" * (MAX_LINE_BYTES + 1)]))))
+
+
+def test_ndjson_chunks_keep_the_row_numbers() -> None:
+    # Given five rows, the third one is not JSON
+    lines = [orjson.dumps({"cons_12m": row}) for row in range(5)]
+    lines[2] = b"not json"
+
+    # When
+    chunks = asyncio.run(_collect(ndjson_chunks(_stream(lines), chunk_rows=2)))
+
+    # Then
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[1].rows == [3] and list(chunks[1].errors) == [2]
+    assert chunk_frame(chunks[2])["cons_12m"].tolist() == [4]
+
+
+def test_csv_chunks_repeat_the_header() -> None:
+    # Given
+    lines = [b"cons_12m,has_gas", b"1,t", b"2,f", b"3,t"]
+
+    # When
+    chunks = asyncio.run(_collect(csv_chunks(_stream(lines), chunk_rows=2)))
+
+    # Then
+    frames = [chunk_frame(chunk) for chunk in chunks]
+    assert [frame["cons_12m"].tolist() for frame in frames] == [[1, 2], [3]]
+    assert frames[1]["has_gas"].tolist() == ["t"]
+    assert chunks[1].rows == [2]
@@ -0,0 +1,110 @@
+"""
+Compare the load time and peak memory of the joblib pickle and of the pickle-free artifact.
+A pipeline of the production size (180 trees, depth 14) is fitted on random inputs and
+saved in both formats. Each format is then loaded in fresh interpreters, so that
+neither import caches nor already loaded objects favour one of them.
+
+    python benchmarks/bench_artifact_load.py --repeat 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+# Add the root of your project to the Python path
+ROOT = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, ROOT)
+
+from model.artifact import save_artifact  # noqa: E402
+from model.config.core import config  # noqa: E402
+from model.pipeline import pipe  # noqa: E402
+
+# Run in a fresh interpreter: the imports are done first and not timed, then the model is loaded.
+_LOADER = """
+import json, resource, sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+import joblib
+from model.artifact import load_artifact
+tracemalloc.start()
+start = time.perf_counter()
+if {kind!r} == "joblib":
+    joblib.load({path!r})
+else:
+    load_artifact({path!r}, verify={verify!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "peak_traced_bytes": tracemalloc.get_traced_memory()[1],
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+
+def _random_inputs(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        rng.normal(scale=100, size=(n_rows, len(config.model_config.numerical_vars))),
+        columns=config.model_config.numerical_vars,
+    )
+    data["has_gas"] = rng.choice(["t", "f"], size=n_rows)
+    data["origin_up"] = rng.choice(["a", "b", "c", "d"], size=n_rows)
+    data["price_change_energy"] = rng.choice(
+        ["increase", "decrease", "stable"], size=n_rows
+    )
+    return data[config.model_config.features]
+
+
+def _load_in_subprocess(kind: str, path: str, verify: bool) -> dict:
+    code = _LOADER.format(root=ROOT, kind=kind, path=path, verify=verify)
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int, n_rows: int = 20_000) -> Dict[str, List[dict]]:
+    X = _random_inputs(n_rows)
+    y = (X["cons_12m"] + X["net_margin"] > 0).astype(int)
+    fitted = (
+        clone(pipe).set_params(model__n_estimators=180, model__max_depth=14).fit(X, y)
+    )
+
+    results: Dict[str, List[dict]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "pipeline.pkl")
+        artifact_path = os.path.join(directory, "pipeline.artifact")
+        joblib.dump(fitted, pickle_path)
+        save_artifact(fitted, artifact_path)
+
+        for name, kind, path, verify in (
+            ("joblib", "joblib", pickle_path, False),
+            ("artifact", "artifact", artifact_path, False),
+            ("artifact+checksums", "artifact", artifact_path, True),
+        ):
+            results[name] = [
+                _load_in_subprocess(kind, path, verify) for _ in range(repeat)
+            ]
+            best = min(result["seconds"] for result in results[name])
+            peak = max(result["peak_traced_bytes"] for result in results[name])
+            print(
+                f"{name:<20} load {best * 1000:8.1f} ms  peak traced memory {peak / 1024 / 1024:8.1f} MB"
+            )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
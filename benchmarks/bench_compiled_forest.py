@@ -0,0 +1,72 @@
+"""
+Compare the sklearn forest with the compiled forest engine.
+A forest with the size of the production one (180 trees, depth 14, 24 features) is
+fitted on random data, then both engines predict batches from 1 to 1M rows.
+The results of both engines are checked to be identical.
+
+    python benchmarks/bench_compiled_forest.py --sizes 1 10 100 1000 10000 100000 1000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.compiled_forest import CompiledForest  # noqa: E402
+
+DEFAULT_SIZES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes: List[int], n_features: int = 24, n_train: int = 20_000) -> List[dict]:
+    rng = np.random.default_rng(0)
+    X_train = rng.random((n_train, n_features))
+    y_train = (X_train[:, 0] + 0.3 * rng.normal(size=n_train) > 0.5).astype(int)
+    forest = RandomForestClassifier(n_estimators=180, max_depth=14, random_state=0)
+    forest.fit(X_train, y_train)
+    compiled = CompiledForest.from_estimator(forest)
+
+    results = []
+    for size in sizes:
+        X = rng.random((size, n_features))
+        assert np.array_equal(forest.predict_proba(X), compiled.predict_proba(X))
+
+        repeat = 20 if size <= 1_000 else 3
+        sklearn_time = _best_time(lambda: forest.predict(X), repeat)
+        compiled_time = _best_time(lambda: compiled.predict(X), repeat)
+        results.append(
+            {
+                "batch_size": size,
+                "sklearn_seconds": sklearn_time,
+                "compiled_seconds": compiled_time,
+                "speedup": sklearn_time / compiled_time,
+            }
+        )
+        print(
+            f"{size:>9} rows  sklearn {sklearn_time * 1000:10.2f} ms  "
+            f"compiled {compiled_time * 1000:10.2f} ms  x{sklearn_time / compiled_time:.1f}"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,144 @@
+"""
+Early exit of the compiled forest on churn data.
+The production pipeline (model/pipeline.py) is trained on a synthetic churn dataset of
+model/synthetic_data.py, or on the datasets of config.yml with --real, and its forest
+predicts the classes of the test rows, evaluating every tree then with the early exit
+for every confidence. The mean number of trees evaluated per row, the latency and the
+share of the classes identical to those of the whole forest are reported.
+
+    python benchmarks/bench_early_exit.py --clients 50000 --confidences 1.0 0.99 0.95
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.compiled_forest import CompiledForest  # noqa: E402
+from model.config.core import config  # noqa: E402
+from model.preprocessing.data_manager import load_dataset  # noqa: E402
+from model.synthetic_data import write_synthetic_dataset  # noqa: E402
+from model.train_pipeline import run_training  # noqa: E402
+
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _test_rows(
+    client_file_name: str, price_file_name: str
+) -> Tuple[CompiledForest, np.ndarray]:
+    """The compiled forest of the trained pipeline and its preprocessed test rows."""
+
+    pipeline = run_training(
+        client_file_name=client_file_name,
+        price_file_name=price_file_name,
+        mode="fit",
+        persist=False,
+    )
+    data = load_dataset(
+        client_file_name=client_file_name, price_file_name=price_file_name
+    )
+    # The test rows of run_training.
+    _, X_test = train_test_split(
+        data[config.model_config.features],
+        test_size=config.model_config.test_size,
+        random_state=config.model_config.random_state,
+    )
+    forest = CompiledForest.from_estimator(pipeline[-1])
+    return forest, pipeline[:-1].transform(X_test)
+
+
+def run(
+    *,
+    n_clients: int,
+    confidences: Sequence[float],
+    batch_trees: int,
+    repeat: int,
+    real: bool = False,
+) -> List[dict]:
+    if real:
+        forest, X = _test_rows(
+            config.app_config.client_data_file, config.app_config.price_data_file
+        )
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            client_path, price_path = write_synthetic_dataset(
+                n_clients=n_clients, output_dir=directory
+            )
+            forest, X = _test_rows(client_path, price_path)
+
+    expected = forest.predict(X)
+    full_time = _best_time(lambda: forest.predict(X), repeat)
+    print(
+        f"{len(X)} rows, {forest.n_trees} trees: whole forest {full_time * 1000:.1f} ms"
+    )
+
+    results = []
+    for confidence in confidences:
+        predictions, trees = forest.predict_early_exit(
+            X, batch_trees=batch_trees, confidence=confidence
+        )
+        seconds = _best_time(
+            lambda: forest.predict_early_exit(
+                X, batch_trees=batch_trees, confidence=confidence
+            ),
+            repeat,
+        )
+        results.append(
+            {
+                "confidence": confidence,
+                "rows": len(X),
+                "n_trees": forest.n_trees,
+                "mean_trees_evaluated": float(trees.mean()),
+                "whole_forest_seconds": full_time,
+                "early_exit_seconds": seconds,
+                "saved_seconds": full_time - seconds,
+                "agreement": float((predictions == expected).mean()),
+            }
+        )
+        print(
+            f"confidence {confidence:<6} trees {trees.mean():6.1f}/{forest.n_trees}  "
+            f"{seconds * 1000:8.1f} ms  saved {(full_time - seconds) * 1000:8.1f} ms  "
+            f"agreement {(predictions == expected).mean():.4f}"
+        )
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=50_000)
+    parser.add_argument(
+        "--confidences", type=float, nargs="+", default=[1.0, 0.99, 0.95]
+    )
+    parser.add_argument("--batch-trees", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--real", action="store_true", help="Use the datasets of config.yml"
+    )
+    args = parser.parse_args(argv)
+    run(
+        n_clients=args.clients,
+        confidences=args.confidences,
+        batch_trees=args.batch_trees,
+        repeat=args.repeat,
+        real=args.real,
+    )
+
+
+if __name__ == "__main__":
+    main()
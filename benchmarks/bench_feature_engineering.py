@@ -0,0 +1,108 @@
+"""
+Compare the vectorized price feature engineering with the implementation it replaced
+(row-wise Series.apply(price_change) and the groupby first/last/merge price_data_trans)
+on a synthetic price table, 10M rows by default. Both results are checked to be identical.
+
+    python benchmarks/bench_feature_engineering.py --rows 10000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.preprocessing.data_manager import (  # noqa: E402
+    price_change,
+    price_change_series,
+    price_data_trans,
+)
+
+
+def price_data_trans_reference(df: pd.DataFrame) -> pd.DataFrame:
+    monthly_price_by_id = (
+        df.groupby(["id", "price_date"])
+        .agg({"price_off_peak_var": "mean", "price_off_peak_fix": "mean"})
+        .reset_index()
+    )
+    jan_prices = monthly_price_by_id.groupby("id").first().reset_index()
+    dec_prices = monthly_price_by_id.groupby("id").last().reset_index()
+    diff = pd.merge(
+        dec_prices.rename(
+            columns={"price_off_peak_var": "dec_1", "price_off_peak_fix": "dec_2"}
+        ),
+        jan_prices.drop(columns="price_date"),
+        on="id",
+    )
+    diff["offpeak_diff_dec_january_energy"] = diff["dec_1"] - diff["price_off_peak_var"]
+    diff["offpeak_diff_dec_january_power"] = diff["dec_2"] - diff["price_off_peak_fix"]
+    return diff[
+        ["id", "offpeak_diff_dec_january_energy", "offpeak_diff_dec_january_power"]
+    ]
+
+
+def synthetic_prices(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Twelve monthly prices per id, shuffled, with a few missing values."""
+
+    rng = np.random.default_rng(seed)
+    n_ids = max(1, -(-rows // 12))
+    months = pd.date_range("2015-01-01", periods=12, freq="MS")
+    data = pd.DataFrame(
+        {
+            "id": np.repeat(np.arange(n_ids), 12)[:rows].astype(str),
+            "price_date": np.tile(months, n_ids)[:rows],
+            "price_off_peak_var": rng.random(rows),
+            "price_off_peak_fix": rng.random(rows) * 40,
+        }
+    )
+    data.loc[rng.random(rows) < 0.01, "price_off_peak_var"] = np.nan
+    return data.sample(frac=1, random_state=seed, ignore_index=True)
+
+
+def _timed(func: Callable[..., Any], *args: Any) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(rows: int) -> dict:
+    data = synthetic_prices(rows)
+
+    expected, reference_time = _timed(price_data_trans_reference, data)
+    diff, vectorized_time = _timed(price_data_trans, data)
+    pd.testing.assert_frame_equal(diff, expected)
+    print(
+        f"price_data_trans  {rows} rows  reference {reference_time:.2f}s  "
+        f"vectorized {vectorized_time:.2f}s  x{reference_time / vectorized_time:.1f}"
+    )
+
+    values = pd.Series(np.random.default_rng(1).normal(size=rows))
+    values[values.abs() < 0.01] = 0.0
+    expected_labels, apply_time = _timed(values.apply, price_change)
+    labels, select_time = _timed(price_change_series, values)
+    pd.testing.assert_series_equal(labels, expected_labels)
+    print(
+        f"price_change      {rows} rows  apply {apply_time:.2f}s  "
+        f"np.select {select_time:.2f}s  x{apply_time / select_time:.1f}"
+    )
+
+    return {
+        "rows": rows,
+        "price_data_trans_reference_seconds": reference_time,
+        "price_data_trans_seconds": vectorized_time,
+        "price_change_apply_seconds": apply_time,
+        "price_change_select_seconds": select_time,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+    run(args.rows)
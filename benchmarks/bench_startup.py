@@ -0,0 +1,83 @@
+"""
+Measure the cold start of the API in fresh interpreters: the time to import app.main
+(what the server waits for before accepting connections) and the time until the first
+prediction can be served, with the model loaded in the background by the startup task.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = str(Path(__file__).resolve().parent.parent)
+
+_STARTUP = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+from app.schemas.predict import MultipleDataInputs
+with TestClient(app) as client:
+    started = time.perf_counter() - start
+    while client.get("/api/v1/ready").status_code != 200:
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+    payload = {{"inputs": MultipleDataInputs.Config.schema_extra["example"]["inputs"]}}
+    assert client.post("/api/v1/predict", json=payload).status_code == 200
+    first_prediction = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": imported,
+    "started_seconds": started,
+    "ready_seconds": ready,
+    "first_prediction_seconds": first_prediction,
+}}))
+"""
+
+# Whether importing app.main imports pandas and scikit-learn, it should not.
+_IMPORTS = """
+import json, sys
+sys.path.insert(0, {root!r})
+import app.main
+print(json.dumps({{name: name in sys.modules for name in ("pandas", "sklearn", "model.predict")}}))
+"""
+
+
+def _run_in_subprocess(code: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int) -> Dict[str, List[dict]]:
+    imports = _run_in_subprocess(_IMPORTS.format(root=ROOT))
+    print(f"modules imported by app.main: {imports}")
+
+    results = [_run_in_subprocess(_STARTUP.format(root=ROOT)) for _ in range(repeat)]
+    for name in (
+        "import_seconds",
+        "started_seconds",
+        "ready_seconds",
+        "first_prediction_seconds",
+    ):
+        best = min(result[name] for result in results)
+        print(f"{name:<26} {best * 1000:8.1f} ms")
+
+    return {"imports": [imports], "startup": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
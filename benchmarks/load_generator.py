@@ -0,0 +1,215 @@
+"""
+In-process load generator of the prediction API, to see the admission control at work.
+The API is served in this process (httpx over ASGI, no socket) with a pipeline trained on
+a synthetic churn dataset, in a temporary model registry. Requests of --rows rows (picked
+at random among the sizes given) are sent to POST /api/v1/predict at Poisson arrival
+times, --rate requests per second whatever the answers take (an open loop, as real
+clients do), with an X-Request-Deadline-Ms header of --deadline-ms.
+
+The answers are counted by status (200, 429 queue full, 503 deadline, 504 deadline
+passed), with the latencies of the 200, the share and the rate of them within their
+deadline, and the largest queue depth seen by the admission control. The generator
+shares the cores of the server, the bodies are encoded beforehand to take little of them.
+
+    python benchmarks/load_generator.py --rate 200 --duration 10 --rows 1 10 100 --deadline-ms 250
+    python benchmarks/load_generator.py --rate 200 --duration 10 --no-admission
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.suite import _isolated  # noqa: E402
+from model.config.core import config  # noqa: E402
+from model.preprocessing.data_manager import (  # noqa: E402
+    load_dataset,
+    save_pipeline_files,
+)
+from model.registry import get_registry  # noqa: E402
+from model.synthetic_data import write_synthetic_dataset  # noqa: E402
+from model.train_pipeline import run_training  # noqa: E402
+
+# Bodies encoded for every size of request, the requests pick one of them at random.
+BODIES_PER_SIZE = 20
+
+
+def _serve_synthetic_model(directory: str, n_clients: int) -> pd.DataFrame:
+    """Register a pipeline trained on a synthetic dataset, returns its rows as JSON values."""
+
+    client_path, price_path = write_synthetic_dataset(
+        n_clients=n_clients, output_dir=directory
+    )
+    files = {"client_file_name": client_path, "price_file_name": price_path}
+    pipeline = run_training(**files, persist=False)
+    get_registry().register(
+        lambda version_dir, file_name: save_pipeline_files(
+            pipeline=pipeline, directory=version_dir, file_name=file_name
+        )
+    )
+    data = load_dataset(**files)[config.model_config.features]
+    return data.astype(object).where(data.notna(), None)
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    return float(np.percentile(values, q)) if len(values) else float("nan")
+
+
+async def generate_load(
+    rows: pd.DataFrame,
+    *,
+    rate: float,
+    duration: float,
+    sizes: Sequence[int],
+    deadline_ms: Optional[float],
+    seed: int = 0,
+) -> dict:
+    """Send the requests at their arrival times and wait for every answer."""
+
+    import httpx
+
+    from app import admission
+    from app.main import app
+
+    rng = np.random.default_rng(seed)
+    # The bodies are encoded beforehand, the generator must not take the time of the server.
+    bodies = {
+        n_rows: [
+            json.dumps({"inputs": rows.iloc[window].to_dict(orient="records")})
+            for start in rng.integers(0, len(rows) - n_rows + 1, size=BODIES_PER_SIZE)
+            for window in [slice(start, start + n_rows)]
+        ]
+        for n_rows in sizes
+    }
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Content-Type": "application/json"}
+    if deadline_ms is not None:
+        headers[admission.DEADLINE_HEADER] = str(deadline_ms)
+    answers: List[tuple] = []
+    max_queue_rows = 0
+
+    # The lifespan of the application loads the model, as uvicorn would run it.
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://load", timeout=None
+    ) as client:
+        while (await client.get("/api/v1/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+
+        async def send(body: str) -> None:
+            sent = time.perf_counter()
+            response = await client.post(
+                "/api/v1/predict", content=body, headers=headers
+            )
+            answers.append((response.status_code, time.perf_counter() - sent))
+
+        tasks = []
+        begin = time.perf_counter()
+        arrival = 0.0
+        while arrival < duration:
+            delay = begin + arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body = bodies[int(rng.choice(sizes))][rng.integers(BODIES_PER_SIZE)]
+            tasks.append(asyncio.create_task(send(body)))
+            controller = admission.get_admission_controller()
+            if controller is not None:
+                max_queue_rows = max(max_queue_rows, controller.queued_rows)
+            arrival += rng.exponential(1 / rate)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - begin
+
+    statuses = Counter(status for status, _ in answers)
+    latencies = [seconds for status, seconds in answers if status == 200]
+    within = [
+        seconds
+        for seconds in latencies
+        if deadline_ms is None or seconds * 1000 <= deadline_ms
+    ]
+    return {
+        "requests": len(answers),
+        "seconds": elapsed,
+        "statuses": dict(sorted(statuses.items())),
+        "answered_per_second": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "within_deadline": len(within) / len(latencies) if latencies else 0.0,
+        "goodput_per_second": len(within) / elapsed,
+        "max_queue_rows": max_queue_rows,
+    }
+
+
+def run(
+    *,
+    rate: float,
+    duration: float,
+    sizes: Sequence[int],
+    deadline_ms: Optional[float],
+    clients: int,
+    admission: bool = True,
+) -> Dict[str, object]:
+    inference_config = config.inference_config
+    saved = inference_config.admission_enabled
+    inference_config.admission_enabled = admission
+    try:
+        with tempfile.TemporaryDirectory() as directory, _isolated(directory):
+            rows = _serve_synthetic_model(os.path.join(directory, "data"), clients)
+            report = asyncio.run(
+                generate_load(
+                    rows,
+                    rate=rate,
+                    duration=duration,
+                    sizes=sizes,
+                    deadline_ms=deadline_ms,
+                )
+            )
+    finally:
+        inference_config.admission_enabled = saved
+
+    print(
+        f"{report['requests']} requests in {report['seconds']:.1f} s, "
+        f"statuses {report['statuses']}\n"
+        f"200: {report['answered_per_second']:.1f}/s, p50 {report['p50_ms']:.1f} ms, "
+        f"p99 {report['p99_ms']:.1f} ms, {report['within_deadline']:.1%} within the "
+        f"deadline ({report['goodput_per_second']:.1f}/s); "
+        f"queue up to {report['max_queue_rows']} rows"
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rate", type=float, default=200.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--deadline-ms", type=float, default=250.0)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument(
+        "--no-admission", action="store_true", help="Disable the admission control"
+    )
+    args = parser.parse_args(argv)
+    run(
+        rate=args.rate,
+        duration=args.duration,
+        sizes=args.rows,
+        deadline_ms=args.deadline_ms,
+        clients=args.clients,
+        admission=not args.no_admission,
+    )
+
+
+if __name__ == "__main__":
+    main()
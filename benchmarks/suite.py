@@ -0,0 +1,256 @@
+"""
+Benchmark suite of the data loading, the training and the serving, on the synthetic
+datasets of model/synthetic_data.py, so that it runs without the real datasets.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --output new.json --baseline results.json --tolerance 0.2
+
+load_dataset and run_training are timed for every number of clients, then check_inputs,
+make_prediction, POST /api/v1/predict and POST /api/v1/predict/columnar for every batch
+size, with the pipeline trained on the largest dataset. Every case keeps the best of
+--repeat runs. The suite does not
+touch the models and datasets of the project: the CSV files and the model registry are
+in a temporary directory, and the feature and prediction caches are disabled so that
+every run does the whole work.
+
+The results are saved as JSON, with the versions of the libraries and the number of
+cores. With --baseline, the cases slower than in the baseline by more than the tolerance
+are reported and the exit status is 1.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model import __version__ as model_version  # noqa: E402
+from model.config.core import config  # noqa: E402
+from model.preprocessing.data_manager import (  # noqa: E402
+    load_dataset,
+    save_pipeline_files,
+)
+from model.preprocessing.validation import check_inputs  # noqa: E402
+from model.registry import get_registry  # noqa: E402
+from model.synthetic_data import write_synthetic_dataset  # noqa: E402
+from model.train_pipeline import run_training  # noqa: E402
+
+CLIENTS = (1_000, 10_000, 100_000)
+BATCH_SIZES = (1, 10, 100, 1_000, 10_000)
+
+
+def _best_of(repeat: int, func: Callable[[], Any]) -> dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"seconds": min(runs), "runs": runs}
+
+
+@contextlib.contextmanager
+def _isolated(directory: str) -> Iterator[None]:
+    """Point the model registry to directory and disable the caches, for the duration of the suite."""
+
+    app_config, inference_config = config.app_config, config.inference_config
+    saved = (
+        app_config.registry_dir,
+        app_config.feature_cache_enabled,
+        inference_config.prediction_cache_enabled,
+    )
+    # An absolute registry_dir replaces the trained models directory in get_registry.
+    app_config.registry_dir = os.path.join(directory, "registry")
+    app_config.feature_cache_enabled = False
+    inference_config.prediction_cache_enabled = False
+    try:
+        yield
+    finally:
+        (
+            app_config.registry_dir,
+            app_config.feature_cache_enabled,
+            inference_config.prediction_cache_enabled,
+        ) = saved
+
+
+def bench_data(directory: str, clients: Sequence[int], repeat: int) -> Dict[str, dict]:
+    """Time load_dataset and run_training for every number of clients."""
+
+    results = {}
+    for n_clients in clients:
+        client_path, price_path = write_synthetic_dataset(
+            n_clients=n_clients,
+            output_dir=directory,
+            client_file_name=f"clients_{n_clients}.csv",
+            price_file_name=f"prices_{n_clients}.csv",
+        )
+        files = {"client_file_name": client_path, "price_file_name": price_path}
+
+        for name, func in (
+            ("load_dataset", lambda: load_dataset(**files)),
+            ("run_training", lambda: run_training(**files, persist=False)),
+        ):
+            case = f"{name}[clients={n_clients}]"
+            results[case] = _best_of(repeat, func)
+            print(f"{case:<40} {results[case]['seconds'] * 1000:10.1f} ms")
+    return results
+
+
+def bench_serving(
+    inputs: pd.DataFrame, batch_sizes: Sequence[int], repeat: int
+) -> Dict[str, dict]:
+    """Time check_inputs, make_prediction and the /predict endpoint for every batch size."""
+
+    # The API is imported here, after the registry was pointed to the suite's directory.
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from model.predict import load_model, make_prediction
+
+    load_model()
+    results = {}
+    for batch_size in batch_sizes:
+        batch = inputs.iloc[:batch_size].reset_index(drop=True)
+
+        case = f"check_inputs[rows={batch_size}]"
+        results[case] = _best_of(repeat, lambda: check_inputs(data=batch))
+        print(f"{case:<40} {results[case]['seconds'] * 1000:10.1f} ms")
+
+        case = f"make_prediction[rows={batch_size}]"
+        results[case] = _best_of(
+            repeat, lambda: asyncio.run(make_prediction(input_data=batch))
+        )
+        print(f"{case:<40} {results[case]['seconds'] * 1000:10.1f} ms")
+
+    # The rows as JSON values, one object per row for /predict, one array per feature for /predict/columnar.
+    rows = inputs.astype(object).where(inputs.notna(), None)
+    endpoints = (
+        ("predict_endpoint", "/api/v1/predict", "records"),
+        ("predict_columnar_endpoint", "/api/v1/predict/columnar", "list"),
+    )
+    with TestClient(app, raise_server_exceptions=False) as client:
+        while client.get("/api/v1/ready").status_code != 200:
+            time.sleep(0.01)
+        for name, path, orient in endpoints:
+            for batch_size in batch_sizes:
+                payload = {"inputs": rows.iloc[:batch_size].to_dict(orient=orient)}
+                case = f"{name}[rows={batch_size}]"
+                statuses = set()
+                results[case] = _best_of(
+                    repeat,
+                    lambda: statuses.add(client.post(path, json=payload).status_code),
+                )
+                results[case]["status_codes"] = sorted(statuses)
+                print(
+                    f"{case:<40} {results[case]['seconds'] * 1000:10.1f} ms"
+                    f"  status {sorted(statuses)}"
+                )
+    return results
+
+
+def metadata() -> dict:
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "model_version": model_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+        "inference": config.inference_config.dict(),
+    }
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float
+) -> List[str]:
+    """The cases slower than in the baseline by more than tolerance (0.2 is 20%)."""
+
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[case]["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{case}: {baseline[case]['seconds'] * 1000:.1f} ms -> "
+                f"{result['seconds'] * 1000:.1f} ms (x{ratio:.2f})"
+            )
+    return regressions
+
+
+def run(
+    *,
+    clients: Sequence[int] = CLIENTS,
+    batch_sizes: Sequence[int] = BATCH_SIZES,
+    repeat: int = 3,
+) -> dict:
+    results: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as directory, _isolated(directory):
+        results.update(bench_data(directory, clients, repeat))
+
+        # Serve a pipeline trained on the largest dataset, with inputs taken from it.
+        largest = max(clients)
+        files = {
+            "client_file_name": os.path.join(directory, f"clients_{largest}.csv"),
+            "price_file_name": os.path.join(directory, f"prices_{largest}.csv"),
+        }
+        pipeline = run_training(**files, persist=False)
+        get_registry().register(
+            lambda version_dir, file_name: save_pipeline_files(
+                pipeline=pipeline, directory=version_dir, file_name=file_name
+            )
+        )
+        data = load_dataset(**files)[config.model_config.features]
+        inputs = data.sample(
+            n=max(batch_sizes), replace=len(data) < max(batch_sizes), random_state=0
+        )
+        results.update(bench_serving(inputs, batch_sizes, repeat))
+
+    return {"metadata": metadata(), "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--clients", type=int, nargs="+", default=list(CLIENTS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report = run(clients=args.clients, batch_sizes=args.batch_sizes, repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(report["results"], baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
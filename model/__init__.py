@@ -1,12 +1,11 @@
-import logging
 import os
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from model.config.core import PACKAGE_ROOT, config  # noqa: E402
-
-logging.getLogger(config.app_config.package_name).addHandler(logging.NullHandler())
-
-with open(os.path.join(PACKAGE_ROOT, "VERSION")) as version_file:
+# config.yml is parsed by the first import of model.config.core, not by importing the package:
+# the server imports model modules to start, and only needs the config once the model loads.
+with open(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "VERSION")
+) as version_file:
     __version__ = version_file.read().strip()
@@ -0,0 +1,127 @@
+"""
+Pickle-free model artifact.
+
+An artifact is a directory holding a small JSON manifest and flat .npy arrays:
+
+    manifest.json   format and model version, feature order, sha256 of every file
+    plan/           the TransformPlan: encoder maps and scaler parameters
+    forest/         the CompiledForest: tree structures and leaf values
+
+Loading it runs no pickle and needs none of the fitted sklearn objects, the
+predictor is rebuilt from the arrays as a CompiledPipeline.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import typing as t
+from pathlib import Path
+
+from sklearn.pipeline import Pipeline
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model import __version__ as _version  # noqa: E402
+from model.compiled_forest import (  # noqa: E402
+    CompiledForest,
+    CompiledPipeline,
+    MmapMode,
+)
+from model.config.core import config  # noqa: E402
+from model.transform_plan import TransformPlan  # noqa: E402
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+PLAN_DIR = "plan"
+FOREST_DIR = "forest"
+
+
+def _checksums(directory: str) -> t.Dict[str, str]:
+    checksums = {}
+    for sub_directory in (PLAN_DIR, FOREST_DIR):
+        for file_name in sorted(os.listdir(os.path.join(directory, sub_directory))):
+            relative_path = f"{sub_directory}/{file_name}"
+            with open(os.path.join(directory, relative_path), "rb") as file:
+                checksums[relative_path] = hashlib.sha256(file.read()).hexdigest()
+    return checksums
+
+
+def save_artifact(pipeline: Pipeline, directory: str) -> None:
+    """Save a fitted pipeline (preprocessor and forest) as an artifact, replacing any previous one."""
+
+    shutil.rmtree(directory, ignore_errors=True)
+    TransformPlan.from_preprocessor(pipeline[:-1]).save(
+        os.path.join(directory, PLAN_DIR)
+    )
+    CompiledForest.from_estimator(pipeline[-1]).save(
+        os.path.join(directory, FOREST_DIR)
+    )
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_version": _version,
+        "features": list(config.model_config.features),
+        "files": _checksums(directory),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+        return json.load(manifest_file)
+
+
+def load_artifact(
+    directory: str,
+    *,
+    verify: bool = True,
+    mmap_mode: t.Optional[MmapMode] = "r",
+    model_version: t.Optional[str] = _version,
+) -> CompiledPipeline:
+    """
+    Rebuild the predictor saved by save_artifact.
+    The features of the artifact must be those of config.yml, in the same order, and
+    its model version model_version (the version of the package by default, None not
+    to check it): the arrays are only meaningful for the columns they were fit on.
+    With verify the files are checked against the checksums of the manifest first.
+    With mmap_mode "r" the forest arrays are memory-mapped, see CompiledForest.load.
+    """
+
+    manifest = read_manifest(directory)
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported artifact format {manifest['format_version']}, expected {FORMAT_VERSION}"
+        )
+
+    features = list(config.model_config.features)
+    if manifest["features"] != features:
+        raise ValueError(
+            f"The artifact features {manifest['features']} are not those of the config {features}"
+        )
+    if model_version is not None and manifest["model_version"] != model_version:
+        raise ValueError(
+            f"The artifact is model version {manifest['model_version']}, expected {model_version}"
+        )
+
+    if verify:
+        checksums = _checksums(directory)
+        if checksums != manifest["files"]:
+            corrupted = sorted(
+                name
+                for name in set(checksums) | set(manifest["files"])
+                if checksums.get(name) != manifest["files"].get(name)
+            )
+            raise ValueError(
+                f"The artifact files do not match the manifest: {corrupted}"
+            )
+
+    return CompiledPipeline(
+        preprocessor=TransformPlan.load(os.path.join(directory, PLAN_DIR)),
+        forest=CompiledForest.load(
+            os.path.join(directory, FOREST_DIR), mmap_mode=mmap_mode
+        ),
+    )
@@ -0,0 +1,128 @@
+import asyncio
+import sys
+import typing as t
+import weakref
+from pathlib import Path
+
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.config_classes import InferenceConfig  # noqa: E402
+from model.config.core import config  # noqa: E402
+
+# A function which scores several requests with one pipeline call. It gets the input frames and returns,
+# for every frame in the same order, either its results or the exception raised while scoring it.
+BatchFunction = t.Callable[
+    [t.List[pd.DataFrame]], t.Awaitable[t.List[t.Union[dict, BaseException]]]
+]
+
+
+class _Batch:
+    """The requests collected on one event loop while the batcher waits."""
+
+    def __init__(self) -> None:
+        self.frames: t.List[pd.DataFrame] = []
+        self.futures: t.List[asyncio.Future] = []
+        self.rows = 0
+        self.timer: t.Optional[asyncio.TimerHandle] = None
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent prediction requests.
+    The first request of a batch waits at most max_wait_ms for others to join,
+    the batch is sent earlier if it reaches max_batch_size rows. The whole batch
+    is scored with a single call of run_batch and every request gets its own
+    slice of the results back, or its own exception.
+    """
+
+    def __init__(
+        self,
+        *,
+        run_batch: BatchFunction,
+        max_wait_ms: float = 2.0,
+        max_batch_size: int = 256,
+    ) -> None:
+        self.run_batch = run_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        # asyncio objects belong to one event loop, keep one pending batch per loop.
+        self._pending: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    async def submit(self, data: pd.DataFrame) -> dict:
+        """Add a request to the pending batch and wait for its results."""
+
+        if len(data) >= self.max_batch_size:
+            # Large requests are a batch of their own.
+            return await self._score([data])
+
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(loop)
+        if batch is None:
+            batch = _Batch()
+            batch.timer = loop.call_later(self.max_wait, self._flush, loop)
+            self._pending[loop] = batch
+
+        future = loop.create_future()
+        batch.frames.append(data)
+        batch.futures.append(future)
+        batch.rows += len(data)
+
+        if batch.rows >= self.max_batch_size:
+            self._flush(loop)
+
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        batch = self._pending.pop(loop, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        loop.create_task(self._run(batch))
+
+    async def _score(self, frames: t.List[pd.DataFrame]) -> dict:
+        (result,) = await self.run_batch(frames)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    async def _run(self, batch: _Batch) -> None:
+        try:
+            results = await self.run_batch(batch.frames)
+        except BaseException as error:  # the batch as a whole failed, e.g. a timeout
+            results = [error] * len(batch.futures)
+
+        for future, result in zip(batch.futures, results):
+            if future.done():  # the request was cancelled while waiting
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def build_batcher(
+    inference_config: InferenceConfig, run_batch: BatchFunction
+) -> PredictionBatcher:
+    """Create a batcher from the inference section of the configuration."""
+
+    return PredictionBatcher(
+        run_batch=run_batch,
+        max_wait_ms=inference_config.batching_max_wait_ms,
+        max_batch_size=inference_config.batching_max_batch_size,
+    )
+
+
+_batcher: t.Optional[PredictionBatcher] = None
+
+
+def get_batcher(run_batch: BatchFunction) -> PredictionBatcher:
+    """Return the batcher of this process, creating it on first use."""
+
+    global _batcher
+    if _batcher is None:
+        _batcher = build_batcher(config.inference_config, run_batch)
+    return _batcher
@@ -0,0 +1,379 @@
+import json
+import os
+import sys
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.transform_plan import TransformPlan  # noqa: E402
+
+# The modes np.load accepts to memory-map the arrays.
+MmapMode = t.Literal["r", "r+", "w+", "c"]
+
+# Number of (row, tree) pairs traversed at once, bounds the memory used by a prediction.
+_CHUNK_CELLS = 1 << 21
+
+# The arrays of a CompiledForest, each one is saved to its own .npy file.
+_ARRAYS = (
+    "feature",
+    "threshold",
+    "children_left",
+    "children_right",
+    "missing_go_to_left",
+    "is_leaf",
+    "values",
+    "roots",
+    "classes_",
+)
+_META_FILE = "forest.json"
+
+
+class CompiledForest:
+    """
+    A fitted RandomForestClassifier flattened into contiguous NumPy arrays.
+    The nodes of all trees are stored one after the other, so that a batch of
+    rows can be pushed down every tree at once with vectorized operations.
+    Leaves point to themselves, which lets every row take the same number of
+    steps. The results are identical to the ones of the sklearn forest.
+    """
+
+    def __init__(
+        self,
+        *,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children_left: np.ndarray,
+        children_right: np.ndarray,
+        missing_go_to_left: np.ndarray,
+        is_leaf: np.ndarray,
+        values: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        classes: np.ndarray,
+        n_features: int,
+        allow_nan: bool,
+    ) -> None:
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.missing_go_to_left = missing_go_to_left
+        self.is_leaf = is_leaf
+        self.values = values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.allow_nan = allow_nan
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_estimator(cls, forest: RandomForestClassifier) -> "CompiledForest":
+        """Compile a fitted forest."""
+
+        if forest.n_outputs_ != 1:
+            raise ValueError("Only single output forests can be compiled")
+
+        n_classes = len(forest.classes_)
+        features, thresholds, lefts, rights, missing, leaves, values, roots = (
+            [] for _ in range(8)
+        )
+        offset = 0
+
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.int64)
+            is_leaf = tree.children_left == -1
+
+            # Leaves loop on themselves and compare an arbitrary feature.
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            missing.append(
+                np.asarray(
+                    getattr(tree, "missing_go_to_left", np.zeros(n_nodes)), dtype=bool
+                )
+            )
+            leaves.append(is_leaf)
+
+            # The same normalisation DecisionTreeClassifier.predict_proba applies to the leaf values.
+            proba = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            children_left=np.ascontiguousarray(np.concatenate(lefts)),
+            children_right=np.ascontiguousarray(np.concatenate(rights)),
+            missing_go_to_left=np.ascontiguousarray(np.concatenate(missing)),
+            is_leaf=np.ascontiguousarray(np.concatenate(leaves)),
+            values=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int64),
+            max_depth=max(
+                estimator.tree_.max_depth for estimator in forest.estimators_
+            ),
+            classes=forest.classes_,
+            n_features=forest.n_features_in_,
+            # Trees only know where missing values go from sklearn 1.3 on.
+            allow_nan=hasattr(forest.estimators_[0].tree_, "missing_go_to_left"),
+        )
+
+    def save(self, directory: str) -> None:
+        """Save the arrays of the forest as .npy files, which can be memory-mapped by load."""
+
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(
+                os.path.join(directory, f"{name}.npy"),
+                getattr(self, name),
+                allow_pickle=False,
+            )
+        with open(os.path.join(directory, _META_FILE), "w") as meta_file:
+            json.dump(
+                {
+                    "max_depth": self.max_depth,
+                    "n_features": self.n_features_in_,
+                    "allow_nan": self.allow_nan,
+                },
+                meta_file,
+            )
+
+    @classmethod
+    def load(
+        cls, directory: str, mmap_mode: t.Optional[MmapMode] = "r"
+    ) -> "CompiledForest":
+        """
+        Load a forest saved by save. With mmap_mode "r" the arrays are memory-mapped
+        read-only: every process loading the same files shares their pages through
+        the page cache instead of holding a private copy.
+        """
+
+        with open(os.path.join(directory, _META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        arrays = {
+            name: np.load(
+                os.path.join(directory, f"{name}.npy"),
+                mmap_mode=mmap_mode,
+                allow_pickle=False,
+            )
+            for name in _ARRAYS
+        }
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            children_left=arrays["children_left"],
+            children_right=arrays["children_right"],
+            missing_go_to_left=arrays["missing_go_to_left"],
+            is_leaf=arrays["is_leaf"],
+            values=arrays["values"],
+            roots=np.asarray(arrays["roots"]),
+            classes=np.asarray(arrays["classes_"]),
+            max_depth=meta["max_depth"],
+            n_features=meta["n_features"],
+            allow_nan=meta["allow_nan"],
+        )
+
+    def _check_X(self, X: t.Any) -> np.ndarray:
+        # sklearn evaluates the trees on float32 inputs, so do we.
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but the forest expects {self.n_features_in_}"
+            )
+        if not self.allow_nan and np.isnan(X).any():
+            raise ValueError("Input X contains NaN.")
+        return X
+
+    def apply(self, X: t.Any) -> np.ndarray:
+        """Return the index of the leaf reached in every tree, shape (n_rows, n_trees)."""
+
+        X = self._check_X(X)
+        return self._apply(X)
+
+    def _apply(self, X: np.ndarray, roots: t.Optional[np.ndarray] = None) -> np.ndarray:
+        """The leaves reached in the trees starting at roots, all the trees by default."""
+
+        roots = self.roots if roots is None else roots
+        node = np.repeat(roots[np.newaxis, :], len(X), axis=0)
+        rows = np.arange(len(X))[:, np.newaxis]
+        check_nan = self.allow_nan and np.isnan(X).any()
+
+        for _ in range(self.max_depth):
+            if self.is_leaf[node].all():
+                break
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if check_nan:
+                go_left |= np.isnan(x) & self.missing_go_to_left[node]
+            node = np.where(
+                go_left, self.children_left[node], self.children_right[node]
+            )
+
+        return node
+
+    def sum_tree_proba(self, X: t.Any, trees: slice = slice(None)) -> np.ndarray:
+        """
+        Sum of the class probabilities of the trees in the trees slice, all of them by
+        default: a part of the forest can be evaluated on its own and the sums added up.
+        """
+
+        X = self._check_X(X)
+        roots = self.roots[trees]
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        chunk_size = max(1, _CHUNK_CELLS // max(1, len(roots)))
+
+        for start in range(0, len(X), chunk_size):
+            rows = slice(start, start + chunk_size)
+            leaves = self._apply(X[rows], roots)
+            chunk = proba[rows]
+            # Accumulate tree by tree, in the same order as sklearn, to get the same rounding.
+            for tree in range(len(roots)):
+                chunk += self.values[leaves[:, tree]]
+
+        return proba
+
+    def predict_proba(self, X: t.Any) -> np.ndarray:
+        """Mean of the class probabilities of the trees, as RandomForestClassifier.predict_proba."""
+
+        proba = self.sum_tree_proba(X)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X: t.Any) -> np.ndarray:
+        """Predict the classes, as RandomForestClassifier.predict."""
+
+        proba = self.predict_proba(X)
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0)
+
+    def predict_early_exit(
+        self, X: t.Any, *, batch_trees: int = 20, confidence: float = 1.0
+    ) -> t.Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the classes, evaluating the trees batch_trees at a time and leaving
+        out the rows whose vote is settled. A tree adds at most 1 to the sum of the
+        probabilities of a class, so once the lead of the best class over the second
+        one exceeds the number of trees left, the remaining trees can not change the
+        class: with the default confidence of 1.0 the predictions are exactly those
+        of predict. Below 1.0, a row also stops once the mean lead per tree exceeds
+        the Hoeffding-Serfling bound of the trees left, i.e. the class of all the
+        trees is the same with probability confidence. Returns the predictions and
+        the number of trees evaluated for every row.
+        """
+
+        X = self._check_X(X)
+        n_trees = self.n_trees
+        if len(self.classes_) < 2:
+            return self.predict(X), np.full(len(X), n_trees, dtype=np.int64)
+        predictions = np.empty(len(X), dtype=np.int64)
+        trees_evaluated = np.full(len(X), n_trees, dtype=np.int64)
+        log_delta = np.log(1.0 / (1.0 - confidence)) if confidence < 1.0 else None
+        # Rounding of the sums, far below the lead needed to stop.
+        tolerance = 1e-9 * n_trees
+        chunk_size = max(1, _CHUNK_CELLS // n_trees)
+
+        for start in range(0, len(X), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            X_chunk = X[chunk]
+            sums = np.zeros((len(X_chunk), len(self.classes_)), dtype=np.float64)
+            # The rows of the chunk still voting.
+            active = np.arange(len(X_chunk))
+
+            for first in range(0, n_trees, batch_trees):
+                trees = self.roots[slice(first, first + batch_trees)]
+                leaves = self._apply(X_chunk[active], trees)
+                active_sums = sums[active]
+                # Tree by tree, in the same order as predict_proba, to get the same rounding.
+                for tree in range(len(trees)):
+                    active_sums += self.values[leaves[:, tree]]
+                sums[active] = active_sums
+
+                done = first + len(trees)
+                left = n_trees - done
+                if left == 0:
+                    break
+                top = np.partition(active_sums, -2, axis=1)[:, -2:]
+                lead = top[:, 1] - top[:, 0]
+                settled = lead > left + tolerance
+                if log_delta is not None:
+                    bound = 2.0 * np.sqrt(
+                        (1.0 - (done - 1) / n_trees) * log_delta / (2.0 * done)
+                    )
+                    settled |= lead / done > bound
+                trees_evaluated[start + active[settled]] = done
+                active = active[~settled]
+                if not len(active):
+                    break
+
+            predictions[chunk] = np.argmax(sums / n_trees, axis=1)
+
+        return self.classes_.take(predictions, axis=0), trees_evaluated
+
+
+class CompiledPipeline:
+    """
+    The persisted pipeline with its steps replaced by their compiled versions:
+    the forest evaluated by a CompiledForest and/or the preprocessing run as a
+    TransformPlan. It exposes the same predict and predict_proba as the sklearn
+    pipeline, the original pipeline, when there is one, is kept in the pipeline attribute.
+    """
+
+    def __init__(
+        self,
+        *,
+        preprocessor: t.Union[Pipeline, TransformPlan],
+        forest: t.Union[CompiledForest, RandomForestClassifier],
+        pipeline: t.Optional[Pipeline] = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.preprocessor = preprocessor
+        self.forest = forest
+        self.classes_ = forest.classes_
+
+    @classmethod
+    def from_pipeline(
+        cls,
+        pipeline: Pipeline,
+        *,
+        compile_forest: bool = True,
+        plan_preprocessing: bool = False,
+    ) -> "CompiledPipeline":
+        """
+        With compile_forest the forest is compiled into a CompiledForest, with
+        plan_preprocessing the preprocessing steps are exported into a TransformPlan.
+        """
+
+        preprocessor: t.Union[Pipeline, TransformPlan] = pipeline[:-1]
+        if plan_preprocessing:
+            preprocessor = TransformPlan.from_preprocessor(pipeline[:-1])
+        forest: t.Union[CompiledForest, RandomForestClassifier] = pipeline[-1]
+        if compile_forest:
+            forest = CompiledForest.from_estimator(pipeline[-1])
+        return cls(preprocessor=preprocessor, forest=forest, pipeline=pipeline)
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        """Run the preprocessing steps of the pipeline."""
+
+        return self.preprocessor.transform(X)
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.forest.predict(self.transform(X))
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        return self.forest.predict_proba(self.transform(X))
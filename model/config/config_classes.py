@@ -16,6 +16,14 @@ class AppConfig(BaseModel):
     pipeline_save_file: str
     client_data_file: str
     price_data_file: str
+    # The feature cache keeps the output of load_dataset on disk, in feature_cache_dir under the datasets directory.
+    feature_cache_enabled: bool = True
+    feature_cache_dir: str = ".feature_cache"
+    feature_cache_max_mb: int = 1024
+    # The model registry keeps the trained versions in registry_dir under the trained models directory,
+    # the registry_max_versions most recent ones are kept (the active version is always kept).
+    registry_dir: str = "registry"
+    registry_max_versions: int = 5
 
 
 # This class is used to define and validate the configuration related to the model. It includes fields like target,
@@ -30,11 +38,115 @@ class ModelConfig(BaseModel):
     test_size: float
 
 
-# The Config class is a wrapper for these two configuration classes. It has two fields, app_config and model_config,
-# which are instances of AppConfig and ModelConfig respectively. This allows us to keep all of our configuration
-# in one place.
+# This class is used to define and validate the configuration of the serving path, i.e. how make_prediction
+# runs the pipeline. Every field has a default so that the config file only needs to list what it changes.
+class InferenceConfig(BaseModel):
+
+    # "thread" or "process", the kind of pool the blocking inference is dispatched to.
+    inference_executor: str = "thread"
+    # Number of workers in the pool, 0 lets the executor pick based on the number of cores.
+    inference_max_workers: int = 0
+    # Maximum number of predictions running or waiting in the pool at the same time.
+    inference_max_in_flight: int = 64
+    # Seconds a single prediction may take before the request is failed.
+    inference_timeout: float = 30.0
+    # "sklearn" runs the persisted pipeline as it is, "compiled" evaluates the forest with the compiled engine.
+    inference_engine: str = "sklearn"
+    # "sklearn" runs the fitted ColumnTransformer, "plan" runs it as a precomputed TransformPlan.
+    inference_preprocessing: str = "sklearn"
+    # "joblib" unpickles the whole pipeline, "mmap" memory-maps the compiled forest shared by all the workers,
+    # "artifact" loads the pickle-free artifact (plan and memory-mapped forest).
+    model_storage: str = "joblib"
+    # Coalesce concurrent small requests into a single pipeline call.
+    batching_enabled: bool = False
+    # How long the first request of a batch waits for others to join it.
+    batching_max_wait_ms: float = 2.0
+    # Rows at which a batch is run without waiting, bigger requests bypass the batcher.
+    batching_max_batch_size: int = 256
+    # Cache the predictions of the rows already scored, keyed on the normalized row and the model version.
+    prediction_cache_enabled: bool = False
+    # Memory budget of the cache, the least recently used rows are evicted beyond it.
+    prediction_cache_max_mb: float = 64.0
+    # Seconds a cached prediction is served for.
+    prediction_cache_ttl_seconds: float = 300.0
+    # Seconds between two checks of the active version of the model registry by the server, a newly
+    # activated version is loaded, warmed up and swapped in. 0 disables the check.
+    model_watch_interval: float = 0.0
+    # Rows of the body of /predict/stream read and scored together, it bounds the memory used by a stream.
+    stream_chunk_rows: int = 1000
+    # Predict the classes of /predict with the early exit of the compiled forest: the trees are evaluated
+    # forest_early_exit_batch_trees at a time and a row stops once the trees left can not change its class.
+    # Only the compiled forest stops early, and not for the requests coalesced by the batcher (fewer than
+    # batching_max_batch_size rows); the rows are then not looked up in the prediction cache, which holds
+    # probabilities.
+    forest_early_exit: bool = False
+    forest_early_exit_batch_trees: int = 20
+    # 1.0 keeps the classes exactly those of the whole forest. Below it, a row also stops once its class
+    # is the one of the whole forest with this probability (Hoeffding-Serfling bound), fewer trees are evaluated.
+    forest_early_exit_confidence: float = 1.0
+    # Split the forest predictions over threads by rows or by trees, as the autotune saved with the model
+    # found fastest for the batch size (see model/scheduler.py). Without an autotune every prediction is serial.
+    inference_parallelism: bool = True
+    # Cores the forest predictions of a server process may use, 0 divides the cores available by the number
+    # of server workers (WEB_CONCURRENCY) and of process executor workers, so that they never oversubscribe.
+    # The concurrent predictions of the thread executor share them: a prediction is only split over idle cores.
+    inference_cores: int = 0
+    # Admission control of the prediction endpoints (see app/admission.py): the rows admitted and not answered
+    # yet are bounded by admission_max_queue_rows, beyond them requests are rejected with 429, and requests
+    # which can not be answered before their deadline (the X-Request-Deadline-Ms header, or
+    # admission_default_deadline_ms, 0 for none) with 503. Until admission_min_observations requests were
+    # answered their time is not known, at most that many requests with a deadline are admitted at once.
+    admission_enabled: bool = False
+    admission_max_queue_rows: int = 100_000
+    admission_default_deadline_ms: float = 0.0
+    admission_min_observations: int = 8
+    # Count the valid rows of every batch scored in the bins of the drift reference saved with the model, at most
+    # drift_max_rows_per_batch of them, see model/drift.py. The counts are those of the process: with a process
+    # executor the rows are counted by its workers, and the server process counts none. Until drift_min_rows rows
+    # were counted the PSI of a few rows would be noise: none is reported.
+    drift_enabled: bool = False
+    drift_max_rows_per_batch: int = 1000
+    drift_min_rows: int = 500
+
+
+# This class is used to define and validate the configuration of run_training. Every field has a default, the
+# config file only needs to list what it changes.
+class TrainingConfig(BaseModel):
+
+    # "fit" fits the pipeline with the params of model/pipeline.py, "search" searches the forest parameters
+    # of the search_space of model/pipeline.py first and fits the pipeline with the best of them.
+    training_mode: str = "fit"
+    # "grid" tries every combination of the search space, "random" samples search_candidates of them.
+    search_method: str = "random"
+    search_candidates: int = 24
+    # Successive halving: every round scores the candidates by cross-validation on search_cv_folds folds,
+    # the best 1/search_halving_factor of them go on to the next round, which has search_halving_factor
+    # times more rows. The last round uses all the training rows, the first one at least search_min_rows.
+    search_cv_folds: int = 3
+    search_halving_factor: int = 3
+    search_min_rows: int = 1000
+    # A scikit-learn scorer name.
+    search_scoring: str = "roc_auc"
+    # Processes fitting the candidates, and threads fitting the final forest. -1 uses every core.
+    training_n_jobs: int = -1
+    # Wall-clock seconds the search may take, 0 for no limit. No round is started which would not
+    # finish in time, the best candidate of the last round run is kept.
+    training_budget_seconds: float = 0.0
+    # Autotune the parallelism of the predictions of the trained model on these batch sizes of the test rows,
+    # saved with the model. python -m model.scheduler tunes a registry version again on the serving machine.
+    autotune_inference: bool = True
+    autotune_batch_sizes: Sequence[int] = (1, 10, 100, 1000, 10000)
+    # Bins of the numerical vars in the drift reference saved with the model, at the quantiles of the training rows.
+    drift_reference_bins: int = 10
+
+
+# The Config class is a wrapper for these configuration classes. It has the fields app_config, model_config,
+# inference_config and training_config, which are instances of AppConfig, ModelConfig, InferenceConfig and
+# TrainingConfig respectively. This allows us to keep all of our configuration in one place.
 class Config(BaseModel):
     """Master config object."""
 
     app_config: AppConfig
     model_config: ModelConfig
+    inference_config: InferenceConfig
+    training_config: TrainingConfig
@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 from pathlib import Path
@@ -9,7 +10,13 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 from strictyaml import YAML, load  # noqa: E402
 
 import model  # noqa: E402
-from model.config.config_classes import AppConfig, Config, ModelConfig  # noqa: E402
+from model.config.config_classes import (  # noqa: E402
+    AppConfig,
+    Config,
+    InferenceConfig,
+    ModelConfig,
+    TrainingConfig,
+)
 
 PACKAGE_ROOT = os.path.dirname(os.path.abspath(model.__file__))
 ROOT = os.path.dirname(PACKAGE_ROOT)
@@ -49,15 +56,26 @@ def validate_config(parsed_config: YAML = None) -> Config:
     """Validate values of our configuration."""
     parsed_config = parsed_config or fetching_yaml_file()
 
-    # Validate the app_config and model_config separately.
+    # Validate the app_config, model_config, inference_config and training_config separately.
     app_config = AppConfig(**parsed_config.data)
 
     model_config = ModelConfig(**parsed_config.data)
 
-    # Combine the validated app_config and model_config into a single Config object.
-    conf = Config(app_config=app_config, model_config=model_config)
+    inference_config = InferenceConfig(**parsed_config.data)
+
+    training_config = TrainingConfig(**parsed_config.data)
+
+    # Combine the validated configurations into a single Config object.
+    conf = Config(
+        app_config=app_config,
+        model_config=model_config,
+        inference_config=inference_config,
+        training_config=training_config,
+    )
 
     return conf
 
 
 config = validate_config()
+
+logging.getLogger(config.app_config.package_name).addHandler(logging.NullHandler())
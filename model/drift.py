@@ -0,0 +1,218 @@
+"""
+Drift of the inputs scored by the server from the training data.
+
+A DriftSketch counts the values of every feature in bins: fixed bins for the numerical
+vars, whose edges are quantiles of the training rows, and the categories of the
+training rows for the categorical vars. The sketch of the training rows is saved with
+the pipeline (the reference), and make_prediction adds the valid rows of every batch it
+scores to a sketch of the same bins. Adding a batch is a few vectorized operations per
+feature (np.searchsorted and np.bincount), on at most drift_max_rows_per_batch rows of
+the batch, evenly spaced, so that the overhead of a batch is bounded whatever its size.
+
+The two sketches are compared feature by feature with the population stability index:
+
+    PSI = sum over the bins of (live share - reference share) * ln(live share / reference share)
+
+Below 0.1 the distribution is stable, up to 0.25 it moved, beyond it drifted.
+"""
+
+import sys
+import threading
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.core import config  # noqa: E402
+
+# The PSI beyond which a feature moved, and drifted.
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# The share given to the empty bins, ln(0) is not defined.
+EPSILON = 1e-4
+
+
+def _numbers(values: pd.Series) -> np.ndarray:
+    """The values as floats, NaN for the missing ones (and those which are not numbers)."""
+
+    if values.dtype.kind in "biuf":
+        return values.to_numpy(dtype=np.float64)
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+
+
+class DriftSketch:
+    """
+    The counts of the bins of every feature. For a numerical var, the bins are the
+    intervals between its edges (and below the first and beyond the last), then the
+    missing values. For a categorical var, the bins are its categories, then the values
+    which are not one of them, then the missing values.
+    """
+
+    def __init__(
+        self, edges: t.Dict[str, np.ndarray], categories: t.Dict[str, t.List[str]]
+    ) -> None:
+        self.edges = edges
+        self.categories = categories
+        self.counts = {
+            name: np.zeros(len(e) + 2, dtype=np.int64) for name, e in edges.items()
+        }
+        self.counts.update(
+            {
+                name: np.zeros(len(c) + 2, dtype=np.int64)
+                for name, c in categories.items()
+            }
+        )
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_reference(
+        cls,
+        data: pd.DataFrame,
+        *,
+        numerical: t.Sequence[str],
+        categorical: t.Sequence[str],
+        bins: int = 10,
+    ) -> "DriftSketch":
+        """The sketch of the training rows, with bins edges at their quantiles."""
+
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        edges = {}
+        for name in numerical:
+            values = _numbers(data[name])
+            values = values[~np.isnan(values)]
+            # A value repeated a lot (e.g. 0) is a bin on its own, not several empty ones.
+            edges[name] = (
+                np.unique(np.quantile(values, quantiles))
+                if len(values)
+                else np.array([])
+            )
+        categories = {
+            name: sorted(data[name].dropna().astype(str).unique().tolist())
+            for name in categorical
+        }
+        sketch = cls(edges, categories)
+        sketch.update(data)
+        return sketch
+
+    def empty(self) -> "DriftSketch":
+        """A sketch of the same bins, with nothing counted."""
+
+        return DriftSketch(self.edges, self.categories)
+
+    def _bin_counts(self, data: pd.DataFrame) -> t.Dict[str, np.ndarray]:
+        counts = {}
+        for name, edges in self.edges.items():
+            values = _numbers(data[name])
+            missing = np.isnan(values)
+            positions = np.searchsorted(edges, values, side="right")
+            positions[missing] = len(edges) + 1
+            counts[name] = np.bincount(positions, minlength=len(edges) + 2)
+        for name, categories in self.categories.items():
+            column = data[name]
+            missing = column.isna().to_numpy()
+            codes = pd.Categorical(
+                column.astype(str).where(~missing), categories=categories
+            ).codes.astype(np.int64)
+            # The values which are not a category of the training rows, then the missing ones.
+            codes[codes < 0] = len(categories)
+            codes[missing] = len(categories) + 1
+            counts[name] = np.bincount(codes, minlength=len(categories) + 2)
+        return counts
+
+    def update(self, data: pd.DataFrame, max_rows: int = 0) -> None:
+        """Count the rows of data, at most max_rows of them (evenly spaced) if max_rows."""
+
+        if max_rows and len(data) > max_rows:
+            data = data.iloc[np.linspace(0, len(data) - 1, max_rows).astype(np.int64)]
+        counts = self._bin_counts(data)
+        with self._lock:
+            for name, bin_counts in counts.items():
+                self.counts[name] += bin_counts
+            self.rows += len(data)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "edges": {name: e.tolist() for name, e in self.edges.items()},
+                "categories": self.categories,
+                "counts": {name: c.tolist() for name, c in self.counts.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, saved: dict) -> "DriftSketch":
+        sketch = cls(
+            {
+                name: np.asarray(e, dtype=np.float64)
+                for name, e in saved["edges"].items()
+            },
+            saved["categories"],
+        )
+        for name, counts in saved["counts"].items():
+            sketch.counts[name] = np.asarray(counts, dtype=np.int64)
+        sketch.rows = saved["rows"]
+        return sketch
+
+
+def psi(reference: np.ndarray, live: np.ndarray) -> float:
+    """The population stability index of the counts of live against those of reference."""
+
+    expected = np.maximum(reference / max(reference.sum(), 1), EPSILON)
+    actual = np.maximum(live / max(live.sum(), 1), EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _status(value: float) -> str:
+    if value < PSI_MODERATE:
+        return "stable"
+    if value < PSI_SIGNIFICANT:
+        return "moderate"
+    return "significant"
+
+
+def compare(reference: DriftSketch, live: DriftSketch, min_rows: int = 1) -> dict:
+    """
+    The PSI of every feature of live against reference, with the share of its missing
+    values and, for the categorical vars, of the categories unseen in training.
+    No PSI is computed before live counted min_rows rows.
+    """
+
+    saved = live.to_dict()
+    enough_rows = saved["rows"] >= max(min_rows, 1)
+    features = []
+    for name, reference_counts in reference.counts.items():
+        counts = np.asarray(saved["counts"][name])
+        total = max(int(counts.sum()), 1)
+        value = psi(reference_counts, counts) if enough_rows else None
+        feature = {
+            "name": name,
+            "kind": "categorical" if name in reference.categories else "numerical",
+            "psi": value,
+            "status": _status(value) if value is not None else None,
+            "missing_share": counts[-1] / total,
+            "unseen_share": (
+                counts[-2] / total if name in reference.categories else None
+            ),
+        }
+        features.append(feature)
+    return {
+        "rows": saved["rows"],
+        "reference_rows": reference.rows,
+        "features": features,
+    }
+
+
+def reference_sketch(data: pd.DataFrame) -> DriftSketch:
+    """The reference of the training rows, with the vars and bins of config.yml."""
+
+    return DriftSketch.from_reference(
+        data,
+        numerical=config.model_config.numerical_vars,
+        categorical=config.model_config.categorical_vars,
+        bins=config.training_config.drift_reference_bins,
+    )
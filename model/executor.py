@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+import typing as t
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.config_classes import InferenceConfig  # noqa: E402
+from model.config.core import config  # noqa: E402
+
+
+class InferenceExecutor:
+    """
+    Runs the blocking part of a prediction (validation and the pipeline) in a pool
+    so that the event loop stays free to serve other requests.
+    The number of predictions submitted to the pool is bounded by max_in_flight,
+    and every prediction has to finish within timeout seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        kind: str = "thread",
+        max_workers: int = 0,
+        max_in_flight: int = 64,
+        timeout: float = 30.0,
+    ) -> None:
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor {kind!r}")
+
+        workers = max_workers or None
+        if kind == "process":
+            self._pool: Executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="inference"
+            )
+
+        self.kind = kind
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        # asyncio primitives belong to one event loop, keep one semaphore per loop.
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def run(self, func: t.Callable[..., t.Any], *args: t.Any) -> t.Any:
+        """
+        Run func(*args) in the pool and wait for the result.
+        Raises TimeoutError if the result is not available within the timeout.
+        """
+
+        semaphore = self._semaphore()
+        await semaphore.acquire()
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        # The slot is only given back once the work is really done, a request that timed out
+        # still occupies the pool until the pipeline returns.
+        future.add_done_callback(lambda _: semaphore.release())
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"Prediction did not finish within {self.timeout} seconds"
+            ) from None
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool, waiting for the running predictions if wait is True."""
+
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_executor: t.Optional[InferenceExecutor] = None
+
+
+def build_executor(inference_config: InferenceConfig) -> InferenceExecutor:
+    """Create an executor from the inference section of the configuration."""
+
+    max_workers = inference_config.inference_max_workers
+    if inference_config.inference_executor == "process" and not max_workers:
+        max_workers = os.cpu_count() or 1
+
+    return InferenceExecutor(
+        kind=inference_config.inference_executor,
+        max_workers=max_workers,
+        max_in_flight=inference_config.inference_max_in_flight,
+        timeout=inference_config.inference_timeout,
+    )
+
+
+def get_executor() -> InferenceExecutor:
+    """Return the executor of this process, creating it on first use."""
+
+    global _executor
+    if _executor is None:
+        _executor = build_executor(config.inference_config)
+    return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shut the executor of this process down. A later get_executor() creates a new one."""
+
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -1,4 +1,5 @@
 import sys
+import typing as t
 from pathlib import Path
 
 from feature_engine.encoding import CountFrequencyEncoder
@@ -16,7 +17,15 @@ from model.config.core import config  # noqa: E402
 scaler = MinMaxScaler()
 encoder = CountFrequencyEncoder()
 params = {"n_estimators": 180, "max_depth": 14}
-classifier = RandomForestClassifier()
+classifier = RandomForestClassifier(**params)
+
+# The forest parameters searched by run_training when training_mode is "search"
+search_space: t.Dict[str, list] = {
+    "n_estimators": [60, 120, 180, 240],
+    "max_depth": [8, 10, 12, 14, 16, None],
+    "min_samples_leaf": [1, 2, 5, 10],
+    "max_features": ["sqrt", 0.5],
+}
 
 # Preprocessing steps for the numerical variables
 num_preproc = Pipeline(steps=[("scaler", scaler)])
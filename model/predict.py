@@ -1,38 +1,433 @@
 import sys
+import threading
+import time
 import typing as t
+import weakref
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 # Add the root of your project to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from model import __version__ as _version  # noqa: E402
+from model.batching import get_batcher  # noqa: E402
 from model.config.core import config  # noqa: E402
-from model.preprocessing.data_manager import load_pipeline  # noqa: E402
-from model.preprocessing.validation import check_inputs  # noqa: E402
+from model.drift import DriftSketch, compare  # noqa: E402
+from model.executor import get_executor  # noqa: E402
+from model.prediction_cache import get_prediction_cache, row_keys  # noqa: E402
+from model.preprocessing.validation import check_inputs, errors_by_row  # noqa: E402
+from model.scheduler import get_scheduler, pipeline_steps, tuning_for  # noqa: E402
 
 pipeline_file_name = f"{config.app_config.pipeline_save_file}{_version}.pkl"
-_pipe = load_pipeline(file_name=pipeline_file_name)
 
+# The pipeline is loaded on first use (or by load_model), not when the module is imported.
+# _pipe_version is the registry version of _pipe, None for a pipeline saved before the registry.
+# Both are replaced together, under the lock, when another version is swapped in. A prediction
+# keeps the pipeline it started with, so the requests in flight during a swap are not affected.
+_pipe: t.Any = None
+_pipe_version: t.Optional[str] = None
+_pipe_lock = threading.Lock()
+# The autotune of the parallelism of every loaded pipeline, see model/scheduler.py.
+_tunings: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+# The drift reference of every loaded pipeline which has one, and the sketch of the rows it scored,
+# see model/drift.py.
+_drift: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
-async def make_prediction(
+
+def _load_version(version: t.Optional[str]) -> t.Tuple[t.Any, t.Optional[str]]:
+    # scikit-learn is only imported when the model is loaded.
+    from model.preprocessing.data_manager import (
+        load_drift_reference,
+        load_pipeline,
+        load_tuning,
+    )
+    from model.registry import get_registry
+
+    registry = get_registry()
+    version = version or registry.active_version()
+    file_name = (
+        pipeline_file_name if version is None else registry.pipeline_file(version)
+    )
+    pipe = load_pipeline(file_name=file_name)
+    _tunings[pipe] = tuning_for(pipe, load_tuning(file_name=file_name))
+    reference = load_drift_reference(file_name=file_name)
+    if reference is not None:
+        sketch = DriftSketch.from_dict(reference)
+        _drift[pipe] = (sketch, sketch.empty())
+    return pipe, version
+
+
+def load_model(version: t.Optional[str] = None) -> t.Any:
+    """
+    Load the pipeline of this process if it is not loaded yet, and return it.
+    With a version, the pipeline of that registry version is loaded if it is not
+    the one of this process already: this is how the workers of a process pool
+    follow the version swapped in by the server.
+    """
+
+    global _pipe, _pipe_version
+    if _pipe is None or (version is not None and version != _pipe_version):
+        with _pipe_lock:
+            if _pipe is None or (version is not None and version != _pipe_version):
+                _pipe, _pipe_version = _load_version(version)
+    return _pipe
+
+
+def _current_model(version: t.Optional[str]) -> t.Tuple[t.Any, str]:
+    """The pipeline to score with and its version, read together so that a swap can not split them."""
+
+    load_model(version)
+    with _pipe_lock:
+        return _pipe, _pipe_version or _version
+
+
+def _can_exit_early(pipe: t.Any) -> bool:
+    """Whether the classes of pipe can be predicted with the early exit of the compiled forest."""
+
+    _, estimator = pipeline_steps(pipe)
+    return config.inference_config.forest_early_exit and hasattr(
+        estimator, "predict_early_exit"
+    )
+
+
+def _run_pipeline(
+    pipe: t.Any,
+    X: pd.DataFrame,
+    timings: t.Dict[str, float],
     *,
-    input_data: t.Union[pd.DataFrame, dict],
-) -> dict:
-    """Make a prediction using a saved model pipeline."""
+    early_exit: bool = False,
+) -> np.ndarray:
+    """
+    pipe.predict_proba, with the time spent in the preprocessing and in the forest added to timings.
+    With early_exit, the classes predicted by the early exit of the compiled forest instead.
+    """
+
+    preprocessor, estimator = pipeline_steps(pipe)
+    # The forest runs on as many threads as the autotune of the model found best for the batch size.
+    scheduler, tuning = get_scheduler(), _tunings.get(pipe)
+
+    start = time.perf_counter()
+    transformed = preprocessor.transform(X)
+    preprocessed = time.perf_counter()
+    if early_exit:
+        inference_config = config.inference_config
+        scored, _ = scheduler.predict_early_exit(
+            estimator,
+            transformed,
+            tuning,
+            batch_trees=inference_config.forest_early_exit_batch_trees,
+            confidence=inference_config.forest_early_exit_confidence,
+        )
+    else:
+        scored = scheduler.predict_proba(estimator, transformed, tuning)
+    timings["preprocess"] = timings.get("preprocess", 0.0) + preprocessed - start
+    timings["predict"] = (
+        timings.get("predict", 0.0) + time.perf_counter() - preprocessed
+    )
+    return scored
+
+
+def _cached_predict_proba(
+    pipe: t.Any, pipe_version: str, data: pd.DataFrame, timings: t.Dict[str, float]
+) -> np.ndarray:
+    """
+    Run the pipeline on the rows of data which are not in the prediction cache.
+    The whole batch is looked up at once, only the misses reach the pipeline.
+    """
+
+    cache = get_prediction_cache()
+    if cache is None:
+        return _run_pipeline(pipe, data, timings)
+
+    start = time.perf_counter()
+    keys = row_keys(data, pipe_version)
+    found, cached = cache.get_many(keys)
+    timings["cache_lookup"] = time.perf_counter() - start
+    probabilities = np.empty((len(data), len(pipe.classes_)), dtype=np.float64)
+    if found.any():
+        probabilities[found] = cached
+    if not found.all():
+        missed = _run_pipeline(pipe, data[~found], timings)
+        probabilities[~found] = missed
+        cache.put_many(keys[~found], missed.tolist())
+    return probabilities
+
+
+def is_model_loaded() -> bool:
+    return _pipe is not None
+
+
+def serving_version() -> t.Optional[str]:
+    """The registry version of the pipeline this process serves."""
+
+    return _pipe_version
+
+
+def drift_report() -> t.Optional[dict]:
+    """
+    The drift of the rows this process scored with the pipeline it serves from its
+    training rows, see model/drift.compare, without PSI until drift_min_rows rows were
+    counted. None if no pipeline with a drift reference is loaded.
+    """
+
+    with _pipe_lock:
+        pipe, version = _pipe, _pipe_version or _version
+    drift = _drift.get(pipe) if pipe is not None else None
+    if drift is None:
+        return None
+    reference, live = drift
+    min_rows = config.inference_config.drift_min_rows
+    return {"version": version, **compare(reference, live, min_rows=min_rows)}
+
+
+def activate_model(
+    version: str, *, warm_up_inputs: t.Optional[t.Union[pd.DataFrame, dict]] = None
+) -> str:
+    """
+    Activate a registry version and swap it in place of the pipeline being served.
+    The new pipeline is loaded, and warmed up on warm_up_inputs, before the swap,
+    so the requests never wait for it. If loading or the warm-up fails, nothing
+    is changed.
+    """
+
+    global _pipe, _pipe_version
+    from model.registry import get_registry
+
+    pipe, _ = _load_version(version)
+    if warm_up_inputs is not None:
+        validated_data, errors = check_inputs(data=pd.DataFrame(warm_up_inputs))
+        if errors:
+            raise ValueError(f"The warm-up inputs are not valid: {errors}")
+        pipe.predict(X=validated_data[config.model_config.features])
+
+    get_registry().activate(version)
+    with _pipe_lock:
+        _pipe, _pipe_version = pipe, version
+    return version
+
 
-    data = pd.DataFrame(input_data)
-    validated_data, errors = check_inputs(data=data)
-    results = {"predictions": None, "version": _version, "errors": errors}
+def score_isolating_failures(
+    score: t.Callable[[pd.DataFrame], np.ndarray], data: pd.DataFrame
+) -> t.Tuple[np.ndarray, t.Optional[np.ndarray], t.Dict[int, Exception]]:
+    """
+    Score data, and when the pipeline fails on it, score its two halves, recursively,
+    to tell the rows the pipeline fails on (e.g. a missing categorical value, which the
+    validation accepts) from the others. A few bad rows cost a few more calls, every row
+    failing costs two calls per row. Returns the positions of the rows scored, their
+    scores (None if no row could be scored), and the error of the other rows by position.
+    """
 
-    if not errors:
-        predictions = _pipe.predict(
-            X=validated_data[config.model_config.features].reset_index()
+    try:
+        return np.arange(len(data)), score(data), {}
+    except Exception as error:
+        if len(data) == 1:
+            return np.arange(0), None, {0: error}
+
+    middle = len(data) // 2
+    positions, scores, failures = [], [], {}
+    for offset, part in ((0, data.iloc[:middle]), (middle, data.iloc[middle:])):
+        part_positions, part_scores, part_failures = score_isolating_failures(
+            score, part
+        )
+        positions.append(part_positions + offset)
+        if part_scores is not None:
+            scores.append(part_scores)
+        failures.update(
+            {offset + position: error for position, error in part_failures.items()}
         )
-        results = {
-            "predictions": predictions,
-            "version": _version,
-            "errors": errors,
+    return (
+        np.concatenate(positions),
+        np.concatenate(scores) if scores else None,
+        failures,
+    )
+
+
+def _row_error(row: int, error: Exception) -> dict:
+    """The error of a row the pipeline failed on, in the format of the errors of check_inputs."""
+
+    return {
+        "loc": ["inputs", row],
+        "msg": f"The row could not be scored: {error}",
+        "type": "value_error.prediction",
+    }
+
+
+def _predict_many(
+    inputs: t.Sequence[t.Union[pd.DataFrame, dict]],
+    version: t.Optional[str] = None,
+    probabilities: bool = True,
+) -> t.List[t.Union[dict, Exception]]:
+    """
+    Validate several requests and score their valid rows with a single pipeline call.
+    This is the blocking part of make_prediction, it runs in the inference executor.
+    Every request gets its own results, or the exception raised while processing it,
+    so that one bad request does not fail the others. Within a request, the invalid
+    rows, and the rows the pipeline fails on, are left out and reported in "errors",
+    by row: "predictions" and "probabilities"
+    are those of the rows at the positions in "rows", and "version" the registry
+    version which scored them. "timings" are the stages of the request itself,
+    "batch_timings" and "batch_rows" those of the pipeline call shared by the
+    requests scored together, the same in all of them: "first_of_batch" tells the
+    one request of the batch which accounts for them. version is the registry
+    version to score with, see load_model. Without probabilities, only the classes
+    are needed: the forest may stop early (forest_early_exit), and then the
+    "probabilities" are None and the prediction cache is not used.
+    """
+
+    results: t.List[t.Union[dict, Exception]] = []
+    to_score = []
+
+    for input_data in inputs:
+        start = time.perf_counter()
+        try:
+            validated_data, errors = check_inputs(data=pd.DataFrame(input_data))
+        except Exception as error:
+            results.append(error)
+            continue
+
+        rows = np.arange(len(validated_data))
+        if errors:
+            rows = np.setdiff1d(rows, list(errors_by_row(errors)))
+            validated_data = validated_data.iloc[rows]
+
+        # The time spent in the stages of the request, those of the pipeline call are
+        # shared by the requests scored together, see batch_timings.
+        timings = {"check_inputs": time.perf_counter() - start}
+        results.append(
+            {
+                "predictions": None,
+                "probabilities": None,
+                "rows": rows,
+                # The version served now, replaced below by the one which scored the rows.
+                "version": _pipe_version or _version,
+                "errors": errors,
+                "timings": timings,
+            }
+        )
+        if len(rows):
+            to_score.append((len(results) - 1, validated_data))
+
+    if not to_score:
+        return results
+
+    pipe, pipe_version = _current_model(version)
+    features = config.model_config.features
+    early_exit = not probabilities and _can_exit_early(pipe)
+    batch = pd.concat([data for _, data in to_score], ignore_index=True)
+    shared_timings: t.Dict[str, float] = {}
+
+    # Count the rows in the drift sketch of the pipeline, a bounded number of them per batch.
+    inference_config = config.inference_config
+    drift = _drift.get(pipe)
+    if drift is not None and inference_config.drift_enabled:
+        start = time.perf_counter()
+        drift[1].update(batch, inference_config.drift_max_rows_per_batch)
+        shared_timings["drift"] = time.perf_counter() - start
+
+    def score(data: pd.DataFrame) -> np.ndarray:
+        # The classes of the rows with early_exit, their probabilities otherwise.
+        if early_exit:
+            return _run_pipeline(pipe, data[features], shared_timings, early_exit=True)
+        return _cached_predict_proba(pipe, pipe_version, data[features], shared_timings)
+
+    # The rows the pipeline fails on (which the validation let through, e.g. a missing
+    # categorical value) are reported as errors of their row, the others are scored.
+    positions, scored, failures = score_isolating_failures(score, batch)
+    bounds = np.cumsum([0] + [len(data) for _, data in to_score])
+
+    for index, ((position, _), start, end) in enumerate(
+        zip(to_score, bounds[:-1], bounds[1:])
+    ):
+        result = t.cast(dict, results[position])
+        request_failures = {
+            row - start: error for row, error in failures.items() if start <= row < end
         }
+        if request_failures:
+            failed_rows = result["rows"][list(request_failures)]
+            result["errors"] = sorted(
+                (result["errors"] or [])
+                + [
+                    _row_error(int(row), error)
+                    for row, error in zip(failed_rows, request_failures.values())
+                ],
+                key=lambda error: error["loc"][1],
+            )
+            result["rows"] = np.setdiff1d(result["rows"], failed_rows)
+        result["version"] = pipe_version
+        result["batch_timings"] = shared_timings
+        result["batch_rows"] = len(batch)
+        result["first_of_batch"] = index == 0
+        in_request = (positions >= start) & (positions < end)
+        if scored is None or not in_request.any():
+            continue
+        request_scored = scored[in_request]
+        if early_exit:
+            result["predictions"] = request_scored
+        else:
+            # The class of highest probability, as pipe.predict.
+            result["predictions"] = pipe.classes_.take(
+                np.argmax(request_scored, axis=1), axis=0
+            )
+            result["probabilities"] = request_scored
+        result["classes"] = pipe.classes_
+
     return results
+
+
+def _predict(
+    input_data: t.Union[pd.DataFrame, dict],
+    version: t.Optional[str] = None,
+    probabilities: bool = True,
+) -> dict:
+    """Validate the inputs of a single request and run the pipeline."""
+
+    (result,) = _predict_many([input_data], version, probabilities)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def _worker_version() -> t.Optional[str]:
+    """
+    The version the executor workers must score with. Only the workers of a process pool
+    need it, they have their own copy of the pipeline; threads share _pipe, and passing them
+    the version read before a concurrent swap would load the previous version back.
+    """
+
+    return _pipe_version if get_executor().kind == "process" else None
+
+
+async def _run_batch(
+    frames: t.List[pd.DataFrame],
+) -> t.List[t.Union[dict, BaseException]]:
+    return await get_executor().run(_predict_many, frames, _worker_version())
+
+
+async def make_prediction(
+    *,
+    input_data: t.Union[pd.DataFrame, dict],
+    probabilities: bool = True,
+) -> dict:
+    """
+    Make a prediction using a saved model pipeline.
+    The validation and the pipeline run in the inference executor so that the
+    event loop is not blocked while the model is busy. When batching is enabled,
+    concurrent small requests are coalesced into a single pipeline call, which
+    computes the probabilities. Callers which only need the classes pass probabilities=False,
+    see _predict_many.
+    """
+
+    inference_config = config.inference_config
+    if inference_config.batching_enabled:
+        data = pd.DataFrame(input_data)
+        # Large requests are a batch of their own, they are scored directly when only their
+        # classes are needed.
+        if probabilities or len(data) < inference_config.batching_max_batch_size:
+            return await get_batcher(_run_batch).submit(data)
+        input_data = data
+
+    return await get_executor().run(
+        _predict, input_data, _worker_version(), probabilities
+    )
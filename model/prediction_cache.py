@@ -0,0 +1,179 @@
+import hashlib
+import sys
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.config_classes import InferenceConfig  # noqa: E402
+from model.config.core import config  # noqa: E402
+
+# Approximate memory taken by one entry: the OrderedDict node, the int key and the
+# (probabilities, expiry) tuple, the probabilities being a list of two floats.
+# The memory budget is turned into a number of entries with it.
+ENTRY_BYTES = 300
+
+# Odd multipliers combining the hashes of the columns of a row into its key.
+_COLUMN_MULTIPLIERS = np.random.default_rng(0).integers(
+    1, 2**63, size=256, dtype=np.uint64
+) * np.uint64(2) + np.uint64(1)
+
+
+def row_keys(data: pd.DataFrame, version: str) -> np.ndarray:
+    """
+    A 64 bits key per row of validated inputs, for the given model version.
+    The rows are normalized first, so that the same customer sent as 5 or 5.0,
+    None or NaN, gets the same key.
+    """
+
+    # The version is the hash key, so the keys of two versions never collide on purpose.
+    hash_key = hashlib.sha256(version.encode()).hexdigest()[:16]
+    model_config = config.model_config
+
+    # Column by column, selecting several columns of a small frame costs more than hashing it.
+    numerical = np.column_stack(
+        [
+            data[column].to_numpy(dtype=np.float64)
+            for column in model_config.numerical_vars
+        ]
+    )
+    # One zero and one NaN, whatever their sign and payload.
+    numerical = np.where(np.isnan(numerical), np.nan, numerical + 0.0)
+    categorical = np.column_stack(
+        [
+            data[column].to_numpy(dtype=object)
+            for column in model_config.categorical_vars
+        ]
+    )
+
+    # Every value is hashed with a single call per kind of column, None and NaN hash alike.
+    hashes = np.concatenate(
+        [
+            pd.util.hash_array(numerical.ravel(), hash_key=hash_key).reshape(
+                numerical.shape
+            ),
+            pd.util.hash_array(categorical.ravel(), hash_key=hash_key).reshape(
+                categorical.shape
+            ),
+        ],
+        axis=1,
+    )
+    # Combine the values of a row in order, the multiplications wrap around 2**64.
+    return (hashes * _COLUMN_MULTIPLIERS[: hashes.shape[1]]).sum(
+        axis=1, dtype=np.uint64
+    )
+
+
+class PredictionCache:
+    """
+    LRU cache of predictions (the class probabilities of a row) by row key, with a time to live.
+    It is shared by the threads of the inference executor, every operation takes a lock.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max(int(max_bytes // ENTRY_BYTES), 1)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[int, t.Tuple[t.Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_many(self, keys: np.ndarray) -> t.Tuple[np.ndarray, t.List[t.Any]]:
+        """
+        Look a batch of keys up. Returns the mask of the keys found and,
+        in the same order, the predictions of the keys found.
+        """
+
+        found = np.zeros(len(keys), dtype=bool)
+        values = []
+        now = self._clock()
+
+        with self._lock:
+            for position, key in enumerate(keys.tolist()):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[position] = True
+                values.append(entry[0])
+
+            self.hits += len(values)
+            self.misses += len(keys) - len(values)
+
+        return found, values
+
+    def put_many(self, keys: np.ndarray, values: t.Sequence[t.Any]) -> None:
+        """Store the predictions of a batch of keys, evicting the least recently used entries."""
+
+        expires = self._clock() + self.ttl_seconds
+
+        with self._lock:
+            for key, value in zip(keys.tolist(), values):
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def build_prediction_cache(inference_config: InferenceConfig) -> PredictionCache:
+    """Create a prediction cache from the inference section of the configuration."""
+
+    return PredictionCache(
+        max_bytes=int(inference_config.prediction_cache_max_mb * 1024 * 1024),
+        ttl_seconds=inference_config.prediction_cache_ttl_seconds,
+    )
+
+
+_cache: t.Optional[PredictionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache() -> t.Optional[PredictionCache]:
+    """Return the prediction cache of this process, None when it is disabled."""
+
+    global _cache
+    if not config.inference_config.prediction_cache_enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_prediction_cache(config.inference_config)
+    return _cache
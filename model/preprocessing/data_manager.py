@@ -1,21 +1,31 @@
+import json
 import logging
 import os
+import shutil
 import sys
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional, Tuple, Union
 
 # Add the root of your project to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
 import joblib  # noqa: E402
+import numpy as np  # noqa: E402
 import pandas as pd  # noqa: E402
 from sklearn.pipeline import Pipeline  # noqa: E402
 
-from model import __version__ as _version  # noqa: E402
+from model.artifact import FOREST_DIR, load_artifact, save_artifact  # noqa: E402
+from model.compiled_forest import CompiledForest, CompiledPipeline  # noqa: E402
 from model.config.core import DATASET_DIR, TRAINED_MODEL_DIR, config  # noqa: E402
+from model.registry import get_registry  # noqa: E402
+from model.transform_plan import TransformPlan  # noqa: E402
 
 logger = logging.getLogger(__name__)
 
+# The suffixes of the autotune and of the drift reference saved next to a pipeline file, see model_file.
+AUTOTUNE_SUFFIX = ".autotune.json"
+DRIFT_REFERENCE_SUFFIX = ".drift.json"
+
 
 def load_dataset(*, client_file_name: str, price_file_name: str) -> pd.DataFrame:
     # Loading the datasets.
@@ -26,12 +36,28 @@ def load_dataset(*, client_file_name: str, price_file_name: str) -> pd.DataFrame
     dataframe_price = pd.read_csv(price_data_path)
 
     # Converting to datetime.
-    dataframe_client = datetime_conversion_client(df=dataframe_client)
     dataframe_price = datetime_conversion_price(df=dataframe_price)
 
     # Transforming the price data.
     dataframe_price = price_data_trans(df=dataframe_price)
 
+    return engineer_features(
+        dataframe_client=dataframe_client, dataframe_price=dataframe_price
+    )
+
+
+def engineer_features(
+    *, dataframe_client: pd.DataFrame, dataframe_price: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Build the features from the raw client data and the transformed price data
+    (the output of price_data_trans). The rows of the client data are processed
+    independently of each other, so this can be applied to a chunk of clients.
+    """
+
+    # Converting to datetime.
+    dataframe_client = datetime_conversion_client(df=dataframe_client)
+
     # Merging the client and price datasets.
     dataframe = merging_datasets(df=dataframe_client, df_1=dataframe_price)
 
@@ -43,11 +69,11 @@ def load_dataset(*, client_file_name: str, price_file_name: str) -> pd.DataFrame
     dataframe = dataframe.dropna()
 
     # Creating the new categorical features.
-    dataframe["price_change_energy"] = dataframe[
-        "offpeak_diff_dec_january_energy"
-    ].apply(price_change)
-    dataframe["price_change_power"] = dataframe["offpeak_diff_dec_january_power"].apply(
-        price_change
+    dataframe["price_change_energy"] = price_change_series(
+        dataframe["offpeak_diff_dec_january_energy"]
+    )
+    dataframe["price_change_power"] = price_change_series(
+        dataframe["offpeak_diff_dec_january_power"]
     )
 
     # Dropping the first feature.
@@ -60,33 +86,323 @@ def load_dataset(*, client_file_name: str, price_file_name: str) -> pd.DataFrame
     return dataframe
 
 
-def persist_pipeline(*, pipeline: Pipeline) -> None:
+def price_data_trans_chunked(
+    *, price_file_name: str, chunksize: int = 1_000_000
+) -> pd.DataFrame:
+    """
+    Streaming version of price_data_trans.
+    The price CSV is read in chunks and reduced per id in a single pass. For each
+    id and price column only the running sum and count of the earliest and of the
+    latest month with a value are kept, so the memory used is bounded by the
+    number of ids and the chunk size, not by the size of the file. The result is
+    the one of price_data_trans, up to the rounding of the monthly means.
+    """
+
+    price_data_path = os.path.join(DATASET_DIR, price_file_name)
+    columns = ["price_off_peak_var", "price_off_peak_fix"]
+    firsts: dict = {column: None for column in columns}
+    lasts: dict = {column: None for column in columns}
+    ids = pd.Index([])
+
+    for chunk in pd.read_csv(
+        price_data_path, usecols=["id", "price_date"] + columns, chunksize=chunksize
+    ):
+        chunk = datetime_conversion_price(df=chunk)
+        ids = ids.union(chunk["id"].unique())
+
+        for column in columns:
+            monthly = (
+                chunk.dropna(subset=[column])
+                .groupby(["id", "price_date"])[column]
+                .agg(["sum", "count"])
+                .reset_index()
+            )
+            firsts[column] = _reduce_month(firsts[column], monthly, keep="min")
+            lasts[column] = _reduce_month(lasts[column], monthly, keep="max")
+
+    diff = pd.DataFrame({"id": ids})
+    for column, feature in zip(
+        columns, ["offpeak_diff_dec_january_energy", "offpeak_diff_dec_january_power"]
+    ):
+        first = _monthly_mean(firsts[column], ids)
+        last = _monthly_mean(lasts[column], ids)
+        diff[feature] = (last - first).to_numpy()
+
+    return diff
+
+
+def _reduce_month(
+    state: Optional[pd.DataFrame], monthly: pd.DataFrame, keep: str
+) -> pd.DataFrame:
+    # Keep, per id, the sum and count of the earliest ("min") or latest ("max") month seen so far.
+    # A month may be split over several chunks, in which case its sums and counts are added up.
+    both = monthly if state is None else pd.concat([state, monthly], ignore_index=True)
+    target = both.groupby("id")["price_date"].transform(keep)
+    both = both[both["price_date"] == target]
+    return both.groupby(["id", "price_date"], as_index=False)[["sum", "count"]].sum()
+
+
+def _monthly_mean(state: Optional[pd.DataFrame], ids: pd.Index) -> pd.Series:
+    if state is None:
+        return pd.Series(float("nan"), index=ids)
+    mean = state.set_index("id")
+    return (mean["sum"] / mean["count"]).reindex(ids)
+
+
+def iter_dataset_chunks(
+    *,
+    client_file_name: str,
+    price_file_name: str,
+    chunksize: int = 100_000,
+    price_chunksize: int = 1_000_000,
+) -> Iterator[pd.DataFrame]:
+    """
+    Streaming version of load_dataset.
+    The price data is reduced first with price_data_trans_chunked, then the client
+    CSV is read chunk by chunk and every chunk goes through engineer_features.
+    The feature chunks are yielded as they are produced.
+    """
+
+    dataframe_price = price_data_trans_chunked(
+        price_file_name=price_file_name, chunksize=price_chunksize
+    )
+    client_data_path = os.path.join(DATASET_DIR, client_file_name)
+
+    for dataframe_client in pd.read_csv(client_data_path, chunksize=chunksize):
+        yield engineer_features(
+            dataframe_client=dataframe_client, dataframe_price=dataframe_price
+        )
+
+
+def write_dataset_chunks(
+    *,
+    client_file_name: str,
+    price_file_name: str,
+    output_path: str,
+    chunksize: int = 100_000,
+) -> int:
+    """
+    Write the output of iter_dataset_chunks to a CSV file, chunk by chunk.
+    Returns the number of rows written.
+    """
+
+    rows = 0
+    for number, chunk in enumerate(
+        iter_dataset_chunks(
+            client_file_name=client_file_name,
+            price_file_name=price_file_name,
+            chunksize=chunksize,
+        )
+    ):
+        chunk.to_csv(
+            output_path,
+            mode="w" if number == 0 else "a",
+            header=number == 0,
+            index=False,
+        )
+        rows += len(chunk)
+        logger.info("Wrote %s feature rows to %s", rows, output_path)
+
+    return rows
+
+
+def persist_pipeline(
+    *,
+    pipeline: Pipeline,
+    metrics: Optional[dict] = None,
+    training: Optional[dict] = None,
+    tuning: Optional[dict] = None,
+    drift_reference: Optional[dict] = None,
+) -> str:
     """
     Persist the pipeline.
-    This function saves the provided pipeline as a versioned pickle file,
-    overwriting any previously saved models. This ensures that there is
-    only one version of the trained model available at a time, providing
-    clarity on its build process.
+    This function registers the provided pipeline as a new version of the model
+    registry and activates it. The previous versions are kept, up to
+    registry_max_versions, so that serving can switch back to one of them
+    without retraining. The id of the new version is returned. tuning is the
+    autotune of the parallelism of the model, see model/scheduler.py, and
+    drift_reference the sketch of its training rows, see model/drift.py.
     """
 
-    # Prepare versioned save file name
-    save_file_name = f"{config.app_config.pipeline_save_file}{_version}.pkl"
-    save_path = os.path.join(TRAINED_MODEL_DIR, save_file_name)
+    # Remove the pipelines saved before the registry, they are not served anymore
+    clean_up_old_pipelines(retain_files=[config.app_config.registry_dir])
+
+    return get_registry().register(
+        lambda directory, file_name: save_pipeline_files(
+            pipeline=pipeline,
+            directory=directory,
+            file_name=file_name,
+            tuning=tuning,
+            drift_reference=drift_reference,
+        ),
+        metrics=metrics,
+        training=training,
+    )
+
 
-    # Remove old pipelines, keeping only the current one
-    clean_up_old_pipelines(retain_files=[save_file_name])
+def save_pipeline_files(
+    *,
+    pipeline: Pipeline,
+    directory: str,
+    file_name: str,
+    tuning: Optional[dict] = None,
+    drift_reference: Optional[dict] = None,
+) -> None:
+    """
+    Save a pipeline as file_name in directory, with the files of the other model storages,
+    and its autotune and drift reference if there are.
+    """
+
+    preprocessor_file_name, artifact_dir_name = shared_model_files(file_name)
 
     # Save the current pipeline
-    joblib.dump(pipeline, save_path)
+    joblib.dump(pipeline, os.path.join(directory, file_name))
+
+    # Save it a second time in the layouts the "mmap" and "artifact" model storages load:
+    # the small preprocessor pickled on its own, and the pickle-free artifact whose
+    # forest arrays are memory-mapped.
+    joblib.dump(pipeline[:-1], os.path.join(directory, preprocessor_file_name))
+    save_artifact(pipeline, os.path.join(directory, artifact_dir_name))
 
+    if tuning is not None:
+        tuning_path = os.path.join(directory, model_file(file_name, AUTOTUNE_SUFFIX))
+        with open(tuning_path, "w") as tuning_file:
+            json.dump(tuning, tuning_file, indent=2)
 
-def load_pipeline(*, file_name: str) -> Pipeline:
-    """Load a persisted pipeline."""
+    if drift_reference is not None:
+        drift_path = os.path.join(
+            directory, model_file(file_name, DRIFT_REFERENCE_SUFFIX)
+        )
+        with open(drift_path, "w") as drift_file:
+            json.dump(drift_reference, drift_file)
+
+
+def model_file(file_name: str, suffix: str) -> str:
+    """
+    The name of a file saved next to the pipeline file file_name: suffix in place of
+    its .pkl extension. It is in the same directory as file_name, relative if file_name
+    is, absolute if it is (e.g. the pipeline file of a registry version).
+    """
+
+    stem = file_name[: -len(".pkl")] if file_name.endswith(".pkl") else file_name
+    return f"{stem}{suffix}"
+
+
+def shared_model_files(file_name: str) -> Tuple[str, str]:
+    """The preprocessor file and the artifact directory saved next to a pipeline file."""
+
+    preprocessor_file_name = model_file(file_name, ".preprocessor.pkl")
+    return preprocessor_file_name, model_file(file_name, ".artifact")
+
+
+def autotune_file(file_name: str) -> str:
+    """
+    The path of the autotune saved next to a pipeline file, see model/scheduler.py.
+    file_name is relative to the trained models directory, or absolute, as for load_pipeline.
+    """
+
+    return os.path.join(TRAINED_MODEL_DIR, model_file(file_name, AUTOTUNE_SUFFIX))
+
+
+def load_tuning(*, file_name: str) -> Optional[dict]:
+    """The autotune saved next to a pipeline file, None if the model was not tuned."""
+
+    try:
+        with open(autotune_file(file_name)) as tuning_file:
+            return json.load(tuning_file)
+    except FileNotFoundError:
+        return None
+
+
+def drift_reference_file(file_name: str) -> str:
+    """
+    The path of the drift reference saved next to a pipeline file, see model/drift.py.
+    file_name is relative to the trained models directory, or absolute, as for load_pipeline.
+    """
+
+    return os.path.join(
+        TRAINED_MODEL_DIR, model_file(file_name, DRIFT_REFERENCE_SUFFIX)
+    )
+
+
+def load_drift_reference(*, file_name: str) -> Optional[dict]:
+    """The drift reference saved next to a pipeline file, None if there is none."""
+
+    try:
+        with open(drift_reference_file(file_name)) as drift_file:
+            return json.load(drift_file)
+    except FileNotFoundError:
+        return None
+
+
+def load_pipeline(
+    *,
+    file_name: str,
+    engine: Optional[str] = None,
+    preprocessing: Optional[str] = None,
+    storage: Optional[str] = None,
+) -> Union[Pipeline, CompiledPipeline]:
+    """
+    Load a persisted pipeline.
+    file_name is relative to the trained models directory, or an absolute path
+    such as the pipeline file of a registry version.
+    With the "compiled" engine (the inference_engine of the config by default)
+    the forest is compiled into arrays once, here, instead of being evaluated
+    by sklearn on every call. In the same way the "plan" preprocessing (the
+    inference_preprocessing of the config by default) exports the fitted
+    preprocessor into a TransformPlan. With the "mmap" storage the forest
+    arrays saved by persist_pipeline are memory-mapped, so that all the
+    processes serving the model share a single copy of them. The "artifact"
+    storage loads the pickle-free artifact, with the plan and the compiled forest.
+    """
 
     file_path = os.path.join(TRAINED_MODEL_DIR, file_name)
 
+    engine = engine or config.inference_config.inference_engine
+    preprocessing = preprocessing or config.inference_config.inference_preprocessing
+    storage = storage or config.inference_config.model_storage
+    if engine not in ("sklearn", "compiled"):
+        raise ValueError(f"Unknown inference engine {engine!r}")
+    if preprocessing not in ("sklearn", "plan"):
+        raise ValueError(f"Unknown inference preprocessing {preprocessing!r}")
+    if storage not in ("joblib", "mmap", "artifact"):
+        raise ValueError(f"Unknown model storage {storage!r}")
+
+    preprocessor_file_name, artifact_dir_name = shared_model_files(file_name)
+    artifact_dir = os.path.join(TRAINED_MODEL_DIR, artifact_dir_name)
+
+    if storage == "artifact":
+        # Nothing is unpickled, the predictor is rebuilt from the arrays of the artifact.
+        # A registry version keeps the model version it was trained with, older versions
+        # stay loadable after a version bump: only its features are checked.
+        return load_artifact(artifact_dir, mmap_mode="r", model_version=None)
+
+    if storage == "mmap":
+        # Only the small preprocessor is unpickled, the forest arrays are memory-mapped.
+        # The memory-mapped forest is always evaluated by the compiled engine.
+        preprocessor = joblib.load(
+            filename=os.path.join(TRAINED_MODEL_DIR, preprocessor_file_name)
+        )
+        return CompiledPipeline(
+            preprocessor=(
+                TransformPlan.from_preprocessor(preprocessor)
+                if preprocessing == "plan"
+                else preprocessor
+            ),
+            forest=CompiledForest.load(
+                os.path.join(artifact_dir, FOREST_DIR), mmap_mode="r"
+            ),
+        )
+
     pipe = joblib.load(filename=file_path)
 
+    if engine == "compiled" or preprocessing == "plan":
+        return CompiledPipeline.from_pipeline(
+            pipe,
+            compile_forest=engine == "compiled",
+            plan_preprocessing=preprocessing == "plan",
+        )
+
     return pipe
 
 
@@ -100,7 +416,11 @@ def clean_up_old_pipelines(*, retain_files: List[str]) -> None:
     retain_files.append("__init__.py")
     for model_file in os.listdir(TRAINED_MODEL_DIR):
         if model_file not in retain_files:
-            os.remove(os.path.join(TRAINED_MODEL_DIR, model_file))
+            model_path = os.path.join(TRAINED_MODEL_DIR, model_file)
+            if os.path.isdir(model_path):
+                shutil.rmtree(model_path)
+            else:
+                os.remove(model_path)
 
 
 def datetime_conversion_client(df: pd.DataFrame) -> pd.DataFrame:
@@ -122,30 +442,32 @@ def datetime_conversion_price(df: pd.DataFrame) -> pd.DataFrame:
 
 def price_data_trans(df: pd.DataFrame) -> pd.DataFrame:
 
-    # Group off-peak prices by companies and month
-    monthly_price_by_id = (
-        df.groupby(["id", "price_date"])
-        .agg({"price_off_peak_var": "mean", "price_off_peak_fix": "mean"})
-        .reset_index()
-    )
+    columns = ["price_off_peak_var", "price_off_peak_fix"]
+    features = ["offpeak_diff_dec_january_energy", "offpeak_diff_dec_january_power"]
 
-    # Get january and december prices
-    jan_prices = monthly_price_by_id.groupby("id").first().reset_index()
-    dec_prices = monthly_price_by_id.groupby("id").last().reset_index()
+    # Group off-peak prices by companies and month, the groups come out sorted by id and month.
+    monthly_price_by_id = df.groupby(["id", "price_date"])[columns].mean()
 
-    # Calculate the difference
-    diff = pd.merge(
-        dec_prices.rename(
-            columns={"price_off_peak_var": "dec_1", "price_off_peak_fix": "dec_2"}
-        ),
-        jan_prices.drop(columns="price_date"),
-        on="id",
-    )
-    diff["offpeak_diff_dec_january_energy"] = diff["dec_1"] - diff["price_off_peak_var"]
-    diff["offpeak_diff_dec_january_power"] = diff["dec_2"] - diff["price_off_peak_fix"]
-    diff = diff[
-        ["id", "offpeak_diff_dec_january_energy", "offpeak_diff_dec_january_power"]
-    ]
+    # The position of the id of every monthly price in the sorted ids.
+    codes, ids = pd.factorize(monthly_price_by_id.index.get_level_values("id"))
+    diff = pd.DataFrame({"id": ids})
+
+    for column, feature in zip(columns, features):
+        # Get january and december prices: the first and last month with a price of every id.
+        values = monthly_price_by_id[column].to_numpy()
+        valid = ~np.isnan(values)
+        groups, values = codes[valid], values[valid]
+        jan_prices = np.full(len(ids), np.nan)
+        dec_prices = np.full(len(ids), np.nan)
+
+        if len(groups):
+            starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+            ends = np.r_[starts[1:] - 1, len(groups) - 1]
+            jan_prices[groups[starts]] = values[starts]
+            dec_prices[groups[ends]] = values[ends]
+
+        # Calculate the difference
+        diff[feature] = dec_prices - jan_prices
 
     return diff
 
@@ -167,6 +489,25 @@ def price_change(x: float) -> str:
         return "stable"
 
 
+def price_change_series(values: pd.Series, *, as_category: bool = False) -> pd.Series:
+    """
+    Vectorized price_change over a whole column.
+    The labels are built with np.select on the sign of the values. With
+    as_category the column gets a categorical dtype instead of object.
+    """
+
+    labels = np.select(
+        [values > 0, values < 0], ["increase", "decrease"], default="stable"
+    ).astype(object)
+
+    if as_category:
+        return pd.Series(
+            pd.Categorical(labels, categories=["decrease", "increase", "stable"]),
+            index=values.index,
+        )
+    return pd.Series(labels, index=values.index)
+
+
 def time_features(df: pd.DataFrame) -> pd.DataFrame:
     # Getting the activation year
     df["activ_year"] = df["date_activ"].dt.year
@@ -0,0 +1,266 @@
+"""
+On-disk cache of the output of load_dataset.
+
+An entry is keyed on the content of the two CSV files, the source code of the
+feature engineering and the variables of config.yml, so any change to one of
+them gives a new key. Every column of the dataset is stored as a .npy file next
+to a small JSON manifest; numerical columns are memory-mapped when read back.
+The size of the cache is bounded, the least recently used entries are evicted.
+
+    python -m model.preprocessing.feature_cache warm
+    python -m model.preprocessing.feature_cache info
+    python -m model.preprocessing.feature_cache clear
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, List, Optional
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from model import __version__ as _version  # noqa: E402
+from model.config.core import DATASET_DIR, config  # noqa: E402
+from model.preprocessing import data_manager  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _hash_file(path: str, hasher: Any) -> None:
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            hasher.update(block)
+
+
+def dataset_key(*, client_file_name: str, price_file_name: str) -> str:
+    """
+    Key of the dataset built from the two CSV files: a hash of their content,
+    of the feature engineering code and of the variables listed in config.yml.
+    """
+
+    hasher = hashlib.sha256()
+    for file_name in (client_file_name, price_file_name):
+        _hash_file(os.path.join(DATASET_DIR, file_name), hasher)
+    _hash_file(data_manager.__file__, hasher)
+    model_config = config.model_config
+    hasher.update(
+        json.dumps(
+            {
+                "version": _version,
+                "target": model_config.target,
+                "features": list(model_config.features),
+                "numerical_vars": list(model_config.numerical_vars),
+                "categorical_vars": list(model_config.categorical_vars),
+            },
+            sort_keys=True,
+        ).encode()
+    )
+    return hasher.hexdigest()
+
+
+class FeatureCache:
+    """A directory of cached datasets, bounded to max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached dataset, or None if there is no entry for the key."""
+
+        entry = self._entry(key)
+        manifest_path = os.path.join(entry, MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            return None
+
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        columns = {}
+        for position, column in enumerate(manifest["columns"]):
+            values = np.load(
+                os.path.join(entry, f"{position}.npy"),
+                mmap_mode=None if column["kind"] == "object" else "r",
+                allow_pickle=False,
+            )
+            if column["kind"] == "object":
+                values = values.astype(object)
+            columns[column["name"]] = values
+        index = np.load(os.path.join(entry, "index.npy"), allow_pickle=False)
+
+        # Mark the entry as recently used for the eviction.
+        os.utime(manifest_path)
+
+        return pd.DataFrame(columns, index=index)
+
+    def put(self, key: str, dataframe: pd.DataFrame) -> bool:
+        """
+        Store a dataset. Columns which can not be stored without pickle (objects
+        other than strings) make the dataset uncacheable, False is returned then.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key}.", dir=self.directory)
+        columns = []
+
+        try:
+            for position, (name, series) in enumerate(dataframe.items()):
+                if series.dtype == object:
+                    if pd.api.types.infer_dtype(series, skipna=False) != "string":
+                        logger.warning(
+                            "Column %s can not be cached, not caching the dataset", name
+                        )
+                        return False
+                    values, kind = series.to_numpy(dtype=str), "object"
+                else:
+                    values, kind = series.to_numpy(), "array"
+                np.save(
+                    os.path.join(staging, f"{position}.npy"), values, allow_pickle=False
+                )
+                columns.append({"name": name, "kind": kind})
+
+            np.save(
+                os.path.join(staging, "index.npy"),
+                dataframe.index.to_numpy(),
+                allow_pickle=False,
+            )
+            with open(os.path.join(staging, MANIFEST_FILE), "w") as manifest_file:
+                json.dump(
+                    {
+                        "key": key,
+                        "created": time.time(),
+                        "rows": len(dataframe),
+                        "columns": columns,
+                    },
+                    manifest_file,
+                )
+
+            # The entry only appears once it is complete.
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            os.rename(staging, self._entry(key))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict(keep=key)
+        return True
+
+    def entries(self) -> List[dict]:
+        """The cached entries with their size and last access time, least recently used first."""
+
+        entries: List[dict] = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for key in os.listdir(self.directory):
+            manifest_path = os.path.join(self._entry(key), MANIFEST_FILE)
+            if not os.path.isfile(manifest_path):
+                continue
+            size = sum(file.stat().st_size for file in os.scandir(self._entry(key)))
+            entries.append(
+                {
+                    "key": key,
+                    "bytes": size,
+                    "last_used": os.path.getmtime(manifest_path),
+                }
+            )
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+
+        entries = self.entries()
+        total = sum(entry["bytes"] for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry["key"] == keep:
+                continue
+            self.invalidate(entry["key"])
+            total -= entry["bytes"]
+            logger.info("Evicted feature cache entry %s", entry["key"])
+
+    def invalidate(self, key: str) -> None:
+        """Remove one entry."""
+
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def get_feature_cache() -> FeatureCache:
+    """The feature cache configured in config.yml."""
+
+    return FeatureCache(
+        directory=os.path.join(DATASET_DIR, config.app_config.feature_cache_dir),
+        max_bytes=config.app_config.feature_cache_max_mb * 1024 * 1024,
+    )
+
+
+def cached_load_dataset(*, client_file_name: str, price_file_name: str) -> pd.DataFrame:
+    """
+    load_dataset through the feature cache.
+    The dataset is only built from the CSV files when it is not in the cache yet.
+    """
+
+    if not config.app_config.feature_cache_enabled:
+        return data_manager.load_dataset(
+            client_file_name=client_file_name, price_file_name=price_file_name
+        )
+
+    cache = get_feature_cache()
+    key = dataset_key(
+        client_file_name=client_file_name, price_file_name=price_file_name
+    )
+    dataframe = cache.get(key)
+    if dataframe is not None:
+        return dataframe
+
+    dataframe = data_manager.load_dataset(
+        client_file_name=client_file_name, price_file_name=price_file_name
+    )
+    cache.put(key, dataframe)
+    return dataframe
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the feature cache.")
+    parser.add_argument("command", choices=["warm", "info", "clear"])
+    args = parser.parse_args(argv)
+    cache = get_feature_cache()
+
+    if args.command == "warm":
+        start = time.perf_counter()
+        dataframe = cached_load_dataset(
+            client_file_name=config.app_config.client_data_file,
+            price_file_name=config.app_config.price_data_file,
+        )
+        print(f"{len(dataframe)} rows ready in {time.perf_counter() - start:.2f}s")
+    elif args.command == "info":
+        for entry in cache.entries():
+            size = entry["bytes"] / 1024 / 1024
+            print(f"{entry['key']}  {size:8.1f} MB  {time.ctime(entry['last_used'])}")
+    else:
+        cache.clear()
+        print(f"Cleared {cache.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import json
 import sys
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 # Add the root of your project to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
@@ -9,29 +9,170 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 import numpy as np  # noqa: E402
 import pandas as pd  # noqa: E402
 from pydantic import ValidationError  # noqa: E402
+from pydantic.error_wrappers import ErrorWrapper  # noqa: E402
+from pydantic.fields import ModelField  # noqa: E402
 
 from model.config.core import config  # noqa: E402
-from model.preprocessing.validation_classes import MultipleDataInputs  # noqa: E402
+from model.preprocessing.validation_classes import (  # noqa: E402
+    DataInputSchema,
+    MultipleDataInputs,
+)
 
+# The values pandas.api.types.infer_dtype reports for an object column which pydantic is known to accept
+# without looking at the individual values. Pydantic (v1) coerces numbers to str for str fields, and
+# int()/float() anything numeric for the int/float fields.
+_STR_SAFE_KINDS = {
+    "empty",
+    "string",
+    "integer",
+    "floating",
+    "mixed-integer-float",
+    "boolean",
+    "decimal",
+}
+_INT_SAFE_KINDS = {"empty", "integer", "boolean"}
+_FLOAT_SAFE_KINDS = {
+    "empty",
+    "integer",
+    "boolean",
+    "floating",
+    "mixed-integer-float",
+    "decimal",
+}
 
-def check_inputs(*, data: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[dict]]:
+
+def _column_is_valid(series: pd.Series, field: ModelField) -> bool:
+    """
+    Check a whole column against the rules derived from a DataInputSchema field.
+    Only vectorized pandas/numpy operations are used. A False result does not mean
+    the column is invalid, only that it has to be checked value by value by pydantic.
+    """
+
+    if not field.allow_none and series.isna().any():
+        return False
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # The categories are a superset of the values, so checking them is enough.
+        series = pd.Series(series.cat.categories)
+
+    kind = series.dtype.kind
+    field_type = field.type_
+
+    if field_type is str:
+        if kind in "biuf":
+            return True
+        return (
+            kind == "O"
+            and pd.api.types.infer_dtype(series, skipna=True) in _STR_SAFE_KINDS
+        )
+
+    if field_type is int:
+        if kind in "biu":
+            return True
+        if kind == "f":
+            # int(inf) overflows, every other float is truncated by pydantic.
+            return not np.isinf(series.to_numpy()).any()
+        if kind != "O":
+            return False
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        if inferred in _INT_SAFE_KINDS:
+            return True
+        if inferred in ("floating", "mixed-integer-float"):
+            return not np.isinf(pd.to_numeric(series).to_numpy(dtype=float)).any()
+        return False
+
+    if field_type is float:
+        if kind in "biuf":
+            return True
+        return (
+            kind == "O"
+            and pd.api.types.infer_dtype(series, skipna=True) in _FLOAT_SAFE_KINDS
+        )
+
+    return False
+
+
+def _validate_column_per_row(
+    series: pd.Series, field: ModelField
+) -> List[Tuple[int, ErrorWrapper]]:
+    """
+    Fallback for the columns which the vectorized rules could not clear:
+    validate every value with pydantic and collect the errors with their row position.
+    """
+
+    values = series.to_numpy(dtype=object)
+    nulls = pd.isna(series).to_numpy()
+    errors = []
+
+    for row, value in enumerate(values):
+        value = None if nulls[row] else value
+        _, error = field.validate(
+            value, {}, loc=("inputs", row, field.alias), cls=DataInputSchema
+        )
+        if error is None:
+            continue
+        for wrapper in error if isinstance(error, list) else [error]:
+            errors.append((row, wrapper))
+
+    return errors
+
+
+def validate_columns(data: pd.DataFrame) -> Optional[List[Any]]:
+    """
+    Validate the feature columns of a frame against DataInputSchema.
+    Returns None if the data is valid, otherwise the same error payload
+    pydantic produces for MultipleDataInputs (the row index is part of "loc").
+    """
+
+    fields = DataInputSchema.__fields__
+    collected = []
+
+    for position, (name, field) in enumerate(fields.items()):
+        if name not in data.columns:
+            # Every field of the schema is optional, missing columns are not an error.
+            continue
+        series = data[name]
+        if _column_is_valid(series, field):
+            continue
+        for row, wrapper in _validate_column_per_row(series, field):
+            collected.append((row, position, wrapper))
+
+    if not collected:
+        return None
+
+    # Keep the order pydantic uses: row by row, then field by field.
+    collected.sort(key=lambda item: (item[0], item[1]))
+    error = ValidationError(
+        [wrapper for _, _, wrapper in collected], MultipleDataInputs
+    )
+
+    return json.loads(error.json())
+
+
+def errors_by_row(errors: Optional[List[Any]]) -> Dict[int, List[dict]]:
+    """
+    The errors of check_inputs grouped by row position. The "inputs" and row
+    index are removed from "loc", which keeps only the field.
+    """
+
+    by_row: Dict[int, List[dict]] = {}
+    for error in errors or []:
+        _, row, *field = error["loc"]
+        by_row.setdefault(row, []).append(dict(error, loc=field))
+    return by_row
+
+
+def check_inputs(*, data: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[List[Any]]]:
     """
     Validate model inputs.
     This function checks the inputs to the model for any unprocessable values,
     ensuring that the input data is clean and ready for processing.
+    The columns are checked in a vectorized way, only the columns which do not
+    pass are validated row by row with pydantic.
     """
 
     # Copy the data for validation
     validated_data = data[config.model_config.features].copy()
-    errors = None
-
-    try:
-        # Replace numpy NaNs so that Pydantic can validate
-        MultipleDataInputs(
-            inputs=validated_data.replace({np.nan: None}).to_dict(orient="records")
-        )
-    except ValidationError as error:
-        # If validation fails, capture the error
-        errors = json.loads(error.json())
+    errors = validate_columns(validated_data)
 
     return validated_data, errors
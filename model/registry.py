@@ -0,0 +1,172 @@
+"""
+Local registry of trained models.
+
+Every trained pipeline is registered as a new version, in its own directory
+under trained_models/registry, next to a metadata.json describing it:
+
+    registry/
+        active                                  id of the version to serve
+        0.0.1-20240101T120000123456Z/
+            metadata.json
+            customer_churn_prediction_output_v0.0.1.pkl
+            customer_churn_prediction_output_v0.0.1.preprocessor.pkl
+            customer_churn_prediction_output_v0.0.1.artifact/
+            customer_churn_prediction_output_v0.0.1.autotune.json
+
+The last registry_max_versions versions are kept, the active one is never
+removed. Activating a version only rewrites the active file (atomically), the
+servers pick the change up through model.predict.activate_model.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import typing as t
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model import __version__ as _version  # noqa: E402
+from model.config.core import TRAINED_MODEL_DIR, config  # noqa: E402
+
+METADATA_FILE = "metadata.json"
+ACTIVE_FILE = "active"
+
+
+class ModelRegistry:
+    """The versions saved in directory, at most max_versions of them besides the active one."""
+
+    def __init__(self, directory: str, max_versions: int) -> None:
+        self.directory = directory
+        self.max_versions = max_versions
+
+    def _version_dir(self, version_id: str) -> str:
+        return os.path.join(self.directory, version_id)
+
+    def versions(self) -> t.List[dict]:
+        """The metadata of every registered version, oldest first."""
+
+        versions: t.List[dict] = []
+        if not os.path.isdir(self.directory):
+            return versions
+        for version_id in os.listdir(self.directory):
+            metadata_path = os.path.join(self._version_dir(version_id), METADATA_FILE)
+            if os.path.isfile(metadata_path):
+                with open(metadata_path) as metadata_file:
+                    versions.append(json.load(metadata_file))
+        return sorted(versions, key=lambda metadata: metadata["created"])
+
+    def metadata(self, version_id: str) -> dict:
+        metadata_path = os.path.join(self._version_dir(version_id), METADATA_FILE)
+        if not os.path.isfile(metadata_path):
+            raise KeyError(f"Unknown model version {version_id!r}")
+        with open(metadata_path) as metadata_file:
+            return json.load(metadata_file)
+
+    def pipeline_file(self, version_id: str) -> str:
+        """Path of the pipeline file of a version, as load_pipeline expects it."""
+
+        return os.path.join(
+            self._version_dir(version_id), self.metadata(version_id)["file_name"]
+        )
+
+    def active_pipeline_file(self) -> str:
+        """
+        The pipeline file of the active version, or the file of a pipeline saved
+        before the registry when no version was activated.
+        """
+
+        active = self.active_version()
+        if active is None:
+            return f"{config.app_config.pipeline_save_file}{_version}.pkl"
+        return self.pipeline_file(active)
+
+    def register(
+        self,
+        save: t.Callable[[str, str], None],
+        *,
+        metrics: t.Optional[dict] = None,
+        training: t.Optional[dict] = None,
+        activate: bool = True,
+    ) -> str:
+        """
+        Register a new version and return its id. save(directory, file_name) writes
+        the model files, the version only appears in the registry once it is complete.
+        training describes how the model was trained (parameters, search, timings).
+        """
+
+        created = datetime.now(timezone.utc)
+        version_id = f"{_version}-{created.strftime('%Y%m%dT%H%M%S%fZ')}"
+        file_name = f"{config.app_config.pipeline_save_file}{_version}.pkl"
+
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{version_id}.", dir=self.directory)
+        try:
+            save(staging, file_name)
+            with open(os.path.join(staging, METADATA_FILE), "w") as metadata_file:
+                json.dump(
+                    {
+                        "version_id": version_id,
+                        "model_version": _version,
+                        "created": created.isoformat(),
+                        "file_name": file_name,
+                        "features": list(config.model_config.features),
+                        "metrics": metrics or {},
+                        "training": training or {},
+                    },
+                    metadata_file,
+                    indent=2,
+                )
+            os.rename(staging, self._version_dir(version_id))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        if activate:
+            self.activate(version_id)
+        self.prune()
+        return version_id
+
+    def active_version(self) -> t.Optional[str]:
+        """The id of the version to serve, None if no version was activated yet."""
+
+        try:
+            with open(os.path.join(self.directory, ACTIVE_FILE)) as active_file:
+                return active_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def activate(self, version_id: str) -> None:
+        """Make version_id the version to serve."""
+
+        self.metadata(version_id)
+        # Write then rename, so that a reader never sees a half written file.
+        active_path = os.path.join(self.directory, ACTIVE_FILE)
+        with open(f"{active_path}.tmp", "w") as active_file:
+            active_file.write(version_id)
+        os.replace(f"{active_path}.tmp", active_path)
+
+    def prune(self) -> None:
+        """Remove the oldest versions beyond max_versions, never the active one."""
+
+        active = self.active_version()
+        versions = [
+            metadata["version_id"]
+            for metadata in self.versions()
+            if metadata["version_id"] != active
+        ]
+        keep = max(self.max_versions - (active is not None), 0)
+        for version_id in versions[: max(len(versions) - keep, 0)]:
+            shutil.rmtree(self._version_dir(version_id), ignore_errors=True)
+
+
+def get_registry() -> ModelRegistry:
+    """The registry configured in config.yml."""
+
+    return ModelRegistry(
+        directory=os.path.join(TRAINED_MODEL_DIR, config.app_config.registry_dir),
+        max_versions=config.app_config.registry_max_versions,
+    )
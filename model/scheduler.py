@@ -0,0 +1,382 @@
+"""
+Parallelism of the forest predictions.
+
+A small batch is scored fastest on the calling thread, splitting it only adds the
+cost of handing the parts to other threads. A big batch is split, either by rows
+(every thread pushes its rows down all the trees) or by trees (every thread pushes
+all the rows down its trees, and the sums of the class probabilities are added up).
+The threads only run at the same time while they are outside the GIL: the sklearn
+trees release it while they traverse, the compiled forest only inside each of its
+numpy calls, its Python loops between them hold it. Whether a split pays off at all,
+which one, and from which batch size, depends on the engine, the forest and the
+machine: autotune times the wall time of every split for every batch size, once for
+a model, and the rules it derives are saved next to the model
+(autotune.json) and followed by the InferenceScheduler of every server process.
+
+    python -m model.scheduler --version 0.0.1-20240101T120000123456Z
+
+re-tunes a version of the registry on the machine which serves it.
+
+The forest threads of a process are bounded by its share of the cores, see
+process_cores: with several server workers (WEB_CONCURRENCY) or a process executor,
+each process only uses its part of them. Within a process, the thread running a
+prediction takes one of its cores, and a prediction is only split over the cores
+the concurrent predictions leave idle: however many predictions the thread executor
+runs at once, the splits never add threads beyond the cores of the process.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.config_classes import InferenceConfig  # noqa: E402
+from model.config.core import config  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# A parallel split is only kept by autotune if it is at least this much faster than one thread.
+_MIN_GAIN = 0.1
+
+
+def pipeline_steps(pipe: t.Any) -> t.Tuple[t.Any, t.Any]:
+    """The preprocessing steps and the forest of a pipeline."""
+
+    # A CompiledPipeline (not imported here, it would import scikit-learn) or a sklearn Pipeline.
+    if hasattr(pipe, "forest"):
+        return pipe.preprocessor, pipe.forest
+    return pipe[:-1], pipe[-1]
+
+
+def _forest_kind(forest: t.Any) -> str:
+    return type(forest).__name__
+
+
+def _n_trees(forest: t.Any) -> int:
+    return forest.n_trees if hasattr(forest, "n_trees") else len(forest.estimators_)
+
+
+def _sum_tree_proba(forest: t.Any, X: np.ndarray, trees: slice) -> np.ndarray:
+    """The sum of the class probabilities of the trees of forest in the trees slice."""
+
+    if hasattr(forest, "sum_tree_proba"):
+        return forest.sum_tree_proba(X, trees)
+    # A RandomForestClassifier: its trees expect float32 inputs, as predict_proba gives them.
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    proba = np.zeros((len(X), len(forest.classes_)), dtype=np.float64)
+    for tree in forest.estimators_[trees]:
+        proba += tree.predict_proba(X, check_input=False)
+    return proba
+
+
+def _splits(n_items: int, n_parts: int) -> t.List[slice]:
+    """n_parts contiguous slices of about the same size covering n_items."""
+
+    bounds = np.linspace(0, n_items, n_parts + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def process_cores(inference_config: InferenceConfig) -> int:
+    """
+    The cores the forest predictions of this process may use: inference_cores if
+    set, otherwise the cores available to the process divided by the number of
+    server workers (WEB_CONCURRENCY) and, with a process executor, by its workers.
+    """
+
+    if inference_config.inference_cores:
+        return inference_config.inference_cores
+
+    if hasattr(os, "sched_getaffinity"):
+        available = len(os.sched_getaffinity(0))
+    else:
+        available = os.cpu_count() or 1
+    processes = max(1, int(os.environ.get("WEB_CONCURRENCY", "1") or 1))
+    if inference_config.inference_executor == "process":
+        processes *= inference_config.inference_max_workers or available
+    return max(1, available // processes)
+
+
+def plan(tuning: t.Optional[dict], n_rows: int) -> t.Tuple[str, int]:
+    """
+    The split ("serial", "rows" or "trees") and the number of threads autotune found
+    the fastest for a batch of n_rows rows. Without tuning every batch is serial.
+    """
+
+    choice: t.Tuple[str, int] = ("serial", 1)
+    for rule in (tuning or {}).get("rules", []):
+        if n_rows >= rule["min_rows"]:
+            choice = (rule["strategy"], rule["degree"])
+    return choice
+
+
+class InferenceScheduler:
+    """
+    Splits the forest predictions of this process over up to cores threads: the
+    calling thread and cores - 1 helper threads, shared by the concurrent predictions.
+    Every running prediction holds a core for its calling thread, and gets helpers
+    for the cores idle when it starts, possibly fewer than its plan asks for, and
+    none if the other predictions keep them all busy.
+    """
+
+    def __init__(self, cores: int) -> None:
+        self.cores = max(1, cores)
+        # The cores not running a prediction, negative when more predictions run at once.
+        self._idle_cores = self.cores
+        self._lock = threading.Lock()
+        self._pool: t.Optional[ThreadPoolExecutor] = None
+        if self.cores > 1:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.cores - 1, thread_name_prefix="forest"
+            )
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def _acquire(self, wanted: int) -> int:
+        """Take a core for the calling thread, and up to wanted idle ones for helpers."""
+
+        with self._lock:
+            self._idle_cores -= 1
+            granted = max(0, min(wanted, self._idle_cores))
+            self._idle_cores -= granted
+            return granted
+
+    def _release(self, helpers: int) -> None:
+        with self._lock:
+            self._idle_cores += helpers + 1
+
+    def _map(
+        self, func: t.Callable[[slice], t.Any], parts: t.List[slice]
+    ) -> t.List[t.Any]:
+        # The first part runs on the calling thread, the others on the helpers.
+        assert self._pool is not None
+        futures = [self._pool.submit(func, part) for part in parts[1:]]
+        return [func(parts[0])] + [future.result() for future in futures]
+
+    def _run(
+        self,
+        forest: t.Any,
+        X: np.ndarray,
+        tuning: t.Optional[dict],
+        *,
+        serial: t.Callable[[np.ndarray], t.Any],
+        allow_trees: bool = True,
+    ) -> t.Tuple[str, t.Any]:
+        """The split used and the result of serial, or the results of its parts."""
+
+        strategy, degree = plan(tuning, len(X))
+        if strategy == "trees" and not allow_trees:
+            strategy = "rows"
+        helpers = self._acquire(degree - 1 if strategy != "serial" else 0)
+        try:
+            if not helpers:
+                return "serial", serial(X)
+            if strategy == "rows":
+                parts = _splits(len(X), helpers + 1)
+                return "rows", self._map(lambda rows: serial(X[rows]), parts)
+            parts = _splits(_n_trees(forest), helpers + 1)
+            return "trees", self._map(
+                lambda trees: _sum_tree_proba(forest, X, trees), parts
+            )
+        finally:
+            self._release(helpers)
+
+    def predict_proba(
+        self, forest: t.Any, X: np.ndarray, tuning: t.Optional[dict]
+    ) -> np.ndarray:
+        """forest.predict_proba, split as planned by tuning for the size of X."""
+
+        strategy, result = self._run(forest, X, tuning, serial=forest.predict_proba)
+        if strategy == "rows":
+            return np.concatenate(result)
+        if strategy == "trees":
+            # The sums are added in another order than one thread would, the probabilities
+            # may differ in their last bits.
+            return np.sum(result, axis=0) / _n_trees(forest)
+        return result
+
+    def predict_early_exit(
+        self, forest: t.Any, X: np.ndarray, tuning: t.Optional[dict], **kwargs: t.Any
+    ) -> t.Tuple[np.ndarray, np.ndarray]:
+        """
+        forest.predict_early_exit split by rows as planned by tuning, the rows of a
+        split by trees, which would not know when the vote of a row is settled.
+        """
+
+        strategy, result = self._run(
+            forest,
+            X,
+            tuning,
+            serial=lambda rows: forest.predict_early_exit(rows, **kwargs),
+            allow_trees=False,
+        )
+        if strategy == "rows":
+            predictions, trees = zip(*result)
+            return np.concatenate(predictions), np.concatenate(trees)
+        return result
+
+
+def autotune(
+    pipe: t.Any,
+    X: pd.DataFrame,
+    *,
+    cores: int,
+    batch_sizes: t.Sequence[int],
+    repeat: int = 3,
+) -> dict:
+    """
+    Time the forest of pipe on batches of the rows of X (drawn with replacement) for
+    every batch size: on one thread, and split by rows and by trees over 2, 4, ...
+    up to cores threads. The fastest split of every batch size is kept if it is
+    at least 10% faster than one thread. Returns the tuning: the rules followed
+    by plan, with the timings they come from.
+    """
+
+    preprocessor, forest = pipeline_steps(pipe)
+    rows = X.sample(n=max(batch_sizes), replace=True, random_state=0)
+    transformed = np.asarray(preprocessor.transform(rows))
+    # 2, 4, 8... threads, and all the cores.
+    degrees = sorted({2**power for power in range(1, cores.bit_length())} | {cores})
+    degrees = [degree for degree in degrees if 1 < degree <= cores]
+    scheduler = InferenceScheduler(cores)
+
+    def best_of(func: t.Callable[[], t.Any]) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    timings: t.Dict[str, t.Dict[str, float]] = {}
+    rules: t.List[dict] = []
+    for batch_size in sorted(batch_sizes):
+        batch = transformed[:batch_size]
+        candidates = {"serial": best_of(lambda: forest.predict_proba(batch))}
+        for strategy in ("rows", "trees"):
+            for degree in degrees:
+                if strategy == "rows" and degree > batch_size:
+                    continue
+                tuning = {
+                    "rules": [{"min_rows": 0, "strategy": strategy, "degree": degree}]
+                }
+                candidates[f"{strategy}-{degree}"] = best_of(
+                    lambda: scheduler.predict_proba(forest, batch, tuning)
+                )
+        timings[str(batch_size)] = candidates
+
+        best = min(candidates, key=candidates.__getitem__)
+        if candidates[best] > (1 - _MIN_GAIN) * candidates["serial"]:
+            best = "serial"
+        strategy, _, degree = best.partition("-")
+        choice = (strategy, int(degree or 1))
+        if choice != plan({"rules": rules}, batch_size):
+            rules.append(
+                {"min_rows": batch_size, "strategy": choice[0], "degree": choice[1]}
+            )
+        logger.info(
+            "Autotune: %s rows, %s (%.2f ms, %.2f ms on one thread)",
+            batch_size,
+            best,
+            candidates[best] * 1000,
+            candidates["serial"] * 1000,
+        )
+
+    scheduler.close()
+    return {
+        "forest": _forest_kind(forest),
+        "cores": cores,
+        "batch_sizes": sorted(batch_sizes),
+        "rules": rules,
+        "timings": timings,
+    }
+
+
+def tuning_for(pipe: t.Any, tuning: t.Optional[dict]) -> t.Optional[dict]:
+    """The tuning if it was measured on the forest engine of pipe, None otherwise."""
+
+    if tuning is None:
+        return None
+    _, forest = pipeline_steps(pipe)
+    if tuning.get("forest") != _forest_kind(forest):
+        logger.warning(
+            "The autotune of the model was measured with %s, not %s: not used",
+            tuning.get("forest"),
+            _forest_kind(forest),
+        )
+        return None
+    return tuning
+
+
+_scheduler: t.Optional[InferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> InferenceScheduler:
+    """Return the scheduler of this process, creating it on first use."""
+
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                cores = 1
+                if config.inference_config.inference_parallelism:
+                    cores = process_cores(config.inference_config)
+                _scheduler = InferenceScheduler(cores)
+    return _scheduler
+
+
+if __name__ == "__main__":
+    from model.preprocessing.data_manager import (
+        autotune_file,
+        load_dataset,
+        load_pipeline,
+    )
+    from model.registry import get_registry
+    from model.synthetic_data import write_synthetic_dataset
+
+    parser = argparse.ArgumentParser(
+        description="Autotune the parallelism of a model version on this machine."
+    )
+    parser.add_argument("--version", help="Registry version, the active one by default")
+    parser.add_argument(
+        "--clients", type=int, default=20_000, help="Synthetic clients to time with"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    registry = get_registry()
+    version = args.version or registry.active_version()
+    if version is None:
+        parser.error("No version given and no active version in the registry")
+    file_name = registry.pipeline_file(version)
+
+    with tempfile.TemporaryDirectory() as directory:
+        client_path, price_path = write_synthetic_dataset(
+            n_clients=args.clients, output_dir=directory
+        )
+        data = load_dataset(client_file_name=client_path, price_file_name=price_path)
+
+    tuning = autotune(
+        load_pipeline(file_name=file_name),
+        data[config.model_config.features],
+        cores=process_cores(config.inference_config),
+        batch_sizes=config.training_config.autotune_batch_sizes,
+    )
+    with open(autotune_file(file_name), "w") as tuning_file:
+        json.dump(tuning, tuning_file, indent=2)
+    logger.info("Saved the autotune of version %s: %s", version, tuning["rules"])
@@ -0,0 +1,193 @@
+"""
+Successive halving search of the forest parameters.
+
+Every round scores the remaining candidates by cross-validation on a sample of
+the training rows, and keeps the best 1/factor of them for the next round, which
+gets factor times more rows. The last round uses all the rows. The candidates
+only differ by the parameters of the forest, so the preprocessing step is fitted
+once per fold of a round and its output is shared by all the candidates; the
+(candidate, fold) fits of a round run in parallel on n_jobs processes.
+"""
+
+import logging
+import math
+import sys
+import time
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.config_classes import TrainingConfig  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def _fit_and_score(
+    estimator: t.Any,
+    params: dict,
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    scoring: str,
+) -> float:
+    estimator = clone(estimator).set_params(**params, n_jobs=1)
+    estimator.fit(X_train, y_train)
+    return float(get_scorer(scoring)(estimator, X_test, y_test))
+
+
+def candidates(
+    space: t.Dict[str, list], *, method: str, n_candidates: int, random_state: int
+) -> t.List[dict]:
+    """The parameter sets to try: all of them ("grid") or n_candidates drawn at random ("random")."""
+
+    if method == "grid":
+        return list(ParameterGrid(space))
+    if method == "random":
+        n_candidates = min(n_candidates, len(ParameterGrid(space)))
+        return list(
+            ParameterSampler(space, n_iter=n_candidates, random_state=random_state)
+        )
+    raise ValueError(f"Unknown search method {method!r}")
+
+
+def search_forest(
+    pipeline: Pipeline,
+    X: pd.DataFrame,
+    y: pd.Series,
+    space: t.Dict[str, list],
+    training_config: TrainingConfig,
+    *,
+    random_state: int = 0,
+) -> dict:
+    """
+    Search the parameters of the last step of pipeline in space. Returns the best
+    parameters, their cross-validation score, and a summary of every round. The
+    search stops before a round which would end after training_budget_seconds,
+    estimating its duration from the previous round.
+    """
+
+    start = time.perf_counter()
+    budget = training_config.training_budget_seconds
+    factor = training_config.search_halving_factor
+    preprocessor, estimator = pipeline[:-1], pipeline[-1]
+    scoring = training_config.search_scoring
+
+    remaining = candidates(
+        space,
+        method=training_config.search_method,
+        n_candidates=training_config.search_candidates,
+        random_state=random_state,
+    )
+    n_rounds = max(1, math.ceil(math.log(len(remaining), factor)))
+    order = np.random.default_rng(random_state).permutation(len(X))
+    rounds: t.List[dict] = []
+    stopped_by_budget = False
+
+    with Parallel(n_jobs=training_config.training_n_jobs) as parallel:
+        for round_number in range(n_rounds):
+            n_rows = len(X) // factor ** (n_rounds - 1 - round_number)
+            n_rows = min(max(n_rows, training_config.search_min_rows), len(X))
+
+            if rounds and budget:
+                previous = rounds[-1]
+                # The cost of a round grows with its rows and candidates.
+                estimate = (
+                    previous["seconds"]
+                    * n_rows
+                    / previous["rows"]
+                    * len(remaining)
+                    / previous["candidates"]
+                )
+                if time.perf_counter() - start + estimate > budget:
+                    stopped_by_budget = True
+                    logger.info(
+                        "Search stopped by the training budget after %s rounds",
+                        len(rounds),
+                    )
+                    break
+
+            round_start = time.perf_counter()
+            rows = np.sort(order[:n_rows])
+            X_round, y_round = X.iloc[rows], y.iloc[rows]
+
+            # The preprocessing is fitted once per fold, for all the candidates.
+            folds = []
+            splitter = StratifiedKFold(
+                n_splits=training_config.search_cv_folds,
+                shuffle=True,
+                random_state=random_state,
+            )
+            preprocessing_start = time.perf_counter()
+            for train, test in splitter.split(X_round, y_round):
+                fold_preprocessor = clone(preprocessor).fit(
+                    X_round.iloc[train], y_round.iloc[train]
+                )
+                folds.append(
+                    (
+                        fold_preprocessor.transform(X_round.iloc[train]),
+                        y_round.iloc[train].to_numpy(),
+                        fold_preprocessor.transform(X_round.iloc[test]),
+                        y_round.iloc[test].to_numpy(),
+                    )
+                )
+            preprocessing_seconds = time.perf_counter() - preprocessing_start
+
+            fold_scores = np.array(
+                parallel(
+                    delayed(_fit_and_score)(estimator, params, *fold, scoring)
+                    for params in remaining
+                    for fold in folds
+                )
+            ).reshape(len(remaining), len(folds))
+            scores = fold_scores.mean(axis=1)
+            score_std = fold_scores.std(axis=1)
+
+            ranking = np.argsort(-scores, kind="stable")
+            rounds.append(
+                {
+                    "rows": n_rows,
+                    "candidates": len(remaining),
+                    "best_score": float(scores[ranking[0]]),
+                    "preprocessing_seconds": preprocessing_seconds,
+                    "seconds": time.perf_counter() - round_start,
+                }
+            )
+            logger.info(
+                "Search round %s/%s: %s candidates on %s rows, best %s %.4f",
+                round_number + 1,
+                n_rounds,
+                len(remaining),
+                n_rows,
+                scoring,
+                scores[ranking[0]],
+            )
+
+            best = ranking[0]
+            best_params, best_score, best_std = (
+                remaining[best],
+                float(scores[best]),
+                float(score_std[best]),
+            )
+            keep = ranking[: max(1, math.ceil(len(remaining) / factor))]
+            remaining = [remaining[position] for position in keep]
+
+    return {
+        "best_params": best_params,
+        "cv_score": best_score,
+        "cv_score_std": best_std,
+        "scoring": scoring,
+        "rounds": rounds,
+        "stopped_by_budget": stopped_by_budget,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,176 @@
+"""
+Synthetic client and price data.
+
+Writes a client CSV and a price CSV with the columns load_dataset expects, at any
+scale, so that the pipeline can be trained, tested and benchmarked without the
+real datasets. The values follow plausible ranges and churn depends on a few of
+the features, so a trained model scores well above chance.
+
+    python -m model.synthetic_data --clients 100000 --output-dir model/datasets
+"""
+
+import argparse
+import os
+import sys
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model.config.core import DATASET_DIR, config  # noqa: E402
+
+ORIGINS = [
+    "lxidpiddsbxsbosboudacockeimpuepw",
+    "kamkkxfxxuwbdslkwifmmcsiusiuosws",
+    "ldkssxwpmemidmecebumciepifcamkci",
+    "usapbepcfoloekilkwsdiboslwaxobdp",
+]
+
+
+def _dates(start: pd.Series, days: np.ndarray) -> pd.Series:
+    return (start + pd.to_timedelta(days, unit="D")).dt.strftime("%Y-%m-%d")
+
+
+def synthetic_clients(n_clients: int, seed: int = 0) -> pd.DataFrame:
+    """The client data, as read from the client CSV."""
+
+    rng = np.random.default_rng(seed)
+    ids = pd.Series(np.arange(n_clients)).map("{:032x}".format)
+
+    date_activ = pd.Series(
+        pd.Timestamp("2003-01-01")
+        + pd.to_timedelta(rng.integers(0, 4700, n_clients), unit="D")
+    )
+    contract_days = rng.integers(366, 3650, n_clients)
+    cons_12m = rng.lognormal(9.5, 1.5, n_clients).astype(np.int64) + 1
+    cons_last_month = (cons_12m / 12 * rng.uniform(0, 2, n_clients)).astype(np.int64)
+    has_gas = rng.random(n_clients) < 0.18
+    margin = rng.gamma(2.0, 12.0, n_clients)
+    net_margin = rng.gamma(2.0, 90.0, n_clients)
+    price_off_peak_var = rng.normal(0.14, 0.02, n_clients)
+    price_off_peak_fix = rng.normal(43.0, 4.0, n_clients)
+
+    clients = pd.DataFrame(
+        {
+            "Unnamed: 0": np.arange(n_clients),
+            "id": ids,
+            "cons_12m": cons_12m,
+            "cons_gas_12m": np.where(
+                has_gas, rng.lognormal(9, 1.5, n_clients), 0
+            ).astype(np.int64),
+            "cons_last_month": cons_last_month,
+            "date_activ": date_activ.dt.strftime("%Y-%m-%d"),
+            "date_end": _dates(date_activ, contract_days),
+            "date_modif_prod": _dates(
+                date_activ, (contract_days * rng.uniform(0, 0.8, n_clients)).astype(int)
+            ),
+            "date_renewal": _dates(
+                date_activ, contract_days - rng.integers(1, 365, n_clients)
+            ),
+            "forecast_cons_12m": cons_12m * rng.uniform(0, 0.3, n_clients),
+            "forecast_discount_energy": np.where(
+                rng.random(n_clients) < 0.03, 30.0, 0.0
+            ),
+            "forecast_meter_rent_12m": rng.gamma(1.5, 40.0, n_clients),
+            "has_gas": np.where(has_gas, "t", "f"),
+            "imp_cons": rng.gamma(0.5, 40.0, n_clients),
+            "margin_gross_pow_ele": margin,
+            "nb_prod_act": rng.choice(
+                [1, 2, 3, 4], n_clients, p=[0.78, 0.15, 0.05, 0.02]
+            ),
+            "net_margin": net_margin,
+            "origin_up": rng.choice(ORIGINS, n_clients, p=[0.48, 0.29, 0.21, 0.02]),
+            "pow_max": rng.gamma(4.0, 4.5, n_clients),
+            "price_off_peak_var": price_off_peak_var,
+            "price_off_peak_fix": price_off_peak_fix,
+            "previous_price": price_off_peak_var
+            + price_off_peak_fix
+            + rng.normal(0, 0.5, n_clients),
+            "price_sens": rng.uniform(0, 1, n_clients),
+        }
+    )
+
+    # About 10% of churners, more likely with high margins, short contracts and price sensitivity.
+    score = (
+        0.02 * (margin - 24)
+        + 0.004 * (net_margin - 180)
+        - 0.0005 * (contract_days - 2000)
+        + 2.0 * (clients["price_sens"] - 0.5)
+        + rng.normal(0, 1.0, n_clients)
+    )
+    clients[config.model_config.target] = (score > np.quantile(score, 0.9)).astype(int)
+    return clients
+
+
+def synthetic_prices(clients: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Monthly off-peak prices of 2015 for every client, as read from the price CSV."""
+
+    rng = np.random.default_rng(seed + 1)
+    n_clients = len(clients)
+    months = pd.date_range("2015-01-01", periods=12, freq="MS").strftime("%Y-%m-%d")
+
+    # A yearly trend per client, so that the december-january differences vary in sign.
+    trend = rng.normal(0, 0.004, n_clients)[:, np.newaxis] * np.arange(12)
+    energy = clients["price_off_peak_var"].to_numpy()[:, np.newaxis] + trend
+    power = clients["price_off_peak_fix"].to_numpy()[:, np.newaxis] + 100 * trend
+    prices = pd.DataFrame(
+        {
+            "id": np.repeat(clients["id"].to_numpy(), 12),
+            "price_date": np.tile(months, n_clients),
+            "price_off_peak_var": energy.ravel(),
+            "price_off_peak_fix": power.ravel(),
+        }
+    )
+
+    # A few missing prices, as in the real data.
+    prices.loc[rng.random(len(prices)) < 0.005, "price_off_peak_var"] = np.nan
+    return prices
+
+
+def write_synthetic_dataset(
+    *,
+    n_clients: int,
+    output_dir: str = DATASET_DIR,
+    client_file_name: t.Optional[str] = None,
+    price_file_name: t.Optional[str] = None,
+    seed: int = 0,
+) -> t.Tuple[str, str]:
+    """
+    Write the two CSV files, named as in config.yml by default, and return their paths.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    client_path = os.path.join(
+        output_dir, client_file_name or config.app_config.client_data_file
+    )
+    price_path = os.path.join(
+        output_dir, price_file_name or config.app_config.price_data_file
+    )
+
+    clients = synthetic_clients(n_clients, seed=seed)
+    clients.to_csv(client_path, index=False)
+    synthetic_prices(clients, seed=seed).to_csv(price_path, index=False)
+    return client_path, price_path
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write synthetic client and price CSV files."
+    )
+    parser.add_argument("--clients", type=int, default=14_606)
+    parser.add_argument("--output-dir", default=DATASET_DIR)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    client_path, price_path = write_synthetic_dataset(
+        n_clients=args.clients, output_dir=args.output_dir, seed=args.seed
+    )
+    print(f"Wrote {client_path} and {price_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,66 @@
+import argparse
+import contextlib
+import logging
 import sys
+import time
+import typing as t
 from pathlib import Path
 
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
 from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
 
 # Add the root of your project to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from model.compiled_forest import CompiledPipeline  # noqa: E402
 from model.config.core import config  # noqa: E402
-from model.pipeline import pipe  # noqa: E402
-from model.preprocessing.data_manager import load_dataset  # noqa: E402
+from model.drift import reference_sketch  # noqa: E402
+from model.pipeline import params, pipe, search_space  # noqa: E402
 from model.preprocessing.data_manager import persist_pipeline  # noqa: E402
+from model.preprocessing.feature_cache import cached_load_dataset  # noqa: E402
+from model.scheduler import autotune, process_cores  # noqa: E402
+from model.search import search_forest  # noqa: E402
 
+logger = logging.getLogger(__name__)
 
-def run_training() -> None:
+
+@contextlib.contextmanager
+def _stage(timings: t.Dict[str, float], name: str) -> t.Iterator[None]:
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def run_training(
+    *,
+    client_file_name: t.Optional[str] = None,
+    price_file_name: t.Optional[str] = None,
+    mode: t.Optional[str] = None,
+    persist: bool = True,
+) -> Pipeline:
     """
     Train the model.
+    The data files are those of config.yml unless given, e.g. the synthetic
+    datasets of the benchmarks. mode is the training_mode of config.yml unless
+    given: "fit" fits the pipeline with the params of model/pipeline.py, "search"
+    searches the forest parameters first, see model/search.py. Without persist
+    the fitted pipeline is only returned, not registered.
     """
 
+    training_config = config.training_config
+    mode = mode or training_config.training_mode
+    if mode not in ("fit", "search"):
+        raise ValueError(f"Unknown training mode {mode!r}")
+    timings: t.Dict[str, float] = {}
+
     # read training data
-    data = load_dataset(
-        client_file_name=config.app_config.client_data_file,
-        price_file_name=config.app_config.price_data_file,
-    )
+    with _stage(timings, "load_dataset"):
+        data = cached_load_dataset(
+            client_file_name=client_file_name or config.app_config.client_data_file,
+            price_file_name=price_file_name or config.app_config.price_data_file,
+        )
 
     # divide train and test
     X_train, X_test, y_train, y_test = train_test_split(
@@ -33,12 +72,100 @@ def run_training() -> None:
         random_state=config.model_config.random_state,
     )
 
-    # fit model
-    pipe.fit(X_train, y_train)
+    # A fresh copy of the pipeline, so that the parameters of a search do not stick to it
+    pipeline = clone(pipe)
+    model_params = dict(params)
+    training: t.Dict[str, t.Any] = {"mode": mode}
+    metrics: t.Dict[str, float] = {}
+
+    if mode == "search":
+        with _stage(timings, "search"):
+            search = search_forest(
+                pipeline,
+                X_train,
+                y_train,
+                search_space,
+                training_config,
+                random_state=config.model_config.random_state,
+            )
+        model_params = search["best_params"]
+        metrics[f"cv_{search['scoring']}"] = search["cv_score"]
+        metrics[f"cv_{search['scoring']}_std"] = search["cv_score_std"]
+        training["search"] = {
+            key: search[key] for key in ("rounds", "stopped_by_budget")
+        }
+
+    # fit model, the trees are fitted in parallel
+    pipeline.set_params(
+        **{f"model__{name}": value for name, value in model_params.items()},
+        model__n_jobs=training_config.training_n_jobs,
+    )
+    with _stage(timings, "fit"):
+        pipeline.fit(X_train, y_train)
+    # The server decides how to parallelize the predictions, not the pickled forest.
+    pipeline.set_params(model__n_jobs=None)
 
-    # persist trained model
-    persist_pipeline(pipeline=pipe)
+    with _stage(timings, "evaluate"):
+        metrics["test_accuracy"] = float(pipeline.score(X_test, y_test))
+        if mode == "search":
+            scorer = get_scorer(training_config.search_scoring)
+            metrics[f"test_{training_config.search_scoring}"] = float(
+                scorer(pipeline, X_test, y_test)
+            )
+
+    training["params"] = model_params
+    training["timings"] = timings
+
+    # measure the parallelism of the predictions with the forest engine the server will use
+    tuning = None
+    if persist and training_config.autotune_inference:
+        inference_config = config.inference_config
+        served = pipeline
+        if (
+            inference_config.inference_engine == "compiled"
+            or inference_config.model_storage != "joblib"
+        ):
+            served = CompiledPipeline.from_pipeline(pipeline)
+        with _stage(timings, "autotune"):
+            tuning = autotune(
+                served,
+                X_test,
+                cores=process_cores(inference_config),
+                batch_sizes=training_config.autotune_batch_sizes,
+            )
+
+    # persist trained model, as a new version of the model registry, with the sketch of its
+    # training rows that the drift of the served inputs is measured against
+    if persist:
+        with _stage(timings, "drift_reference"):
+            drift_reference = reference_sketch(X_train).to_dict()
+        with _stage(timings, "persist"):
+            persist_pipeline(
+                pipeline=pipeline,
+                metrics=metrics,
+                training=training,
+                tuning=tuning,
+                drift_reference=drift_reference,
+            )
+
+    logger.info(
+        "Trained the model (%s) with %s: %s",
+        mode,
+        model_params,
+        ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()),
+    )
+    return pipeline
 
 
 if __name__ == "__main__":
-    run_training()
+    parser = argparse.ArgumentParser(description="Train the model.")
+    parser.add_argument("--mode", choices=["fit", "search"])
+    parser.add_argument(
+        "--budget", type=float, help="Seconds the search may take, 0 for no limit"
+    )
+    args = parser.parse_args()
+    if args.budget is not None:
+        config.training_config.training_budget_seconds = args.budget
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_training(mode=args.mode)
@@ -0,0 +1,246 @@
+import json
+import os
+import sys
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+
+# Add the root of your project to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_META_FILE = "plan.json"
+
+
+class CategoryLookup:
+    """
+    The fitted CountFrequencyEncoder of one variable as a hashed array lookup.
+    The categories are kept in a pandas Index (a hash table), their encodings in
+    an array with one extra slot at the end for unseen categories.
+    """
+
+    def __init__(
+        self, *, categories: pd.Index, encodings: np.ndarray, unseen: str
+    ) -> None:
+        self.categories = categories
+        self.unseen = unseen
+        unseen_value = 0.0 if unseen == "encode" else np.nan
+        self.encodings = np.append(encodings.astype(np.float64), unseen_value)
+
+    def encode(self, values: np.ndarray, name: str) -> np.ndarray:
+        positions = self.categories.get_indexer(values)
+        if self.unseen == "raise" and (positions == -1).any():
+            raise ValueError(f"{name} contains categories unseen during fit")
+        # -1 (unseen) picks the last slot of the encodings.
+        return self.encodings[positions]
+
+
+class TransformPlan:
+    """
+    The fitted preprocessor of the pipeline exported as a precomputed plan.
+    The categorical variables are encoded with array lookups and the numerical
+    variables are scaled with one fused multiply/add, written straight into the
+    output array in the column order of the ColumnTransformer. The output is
+    bit-identical to preprocessor.transform.
+    """
+
+    def __init__(
+        self,
+        *,
+        categorical: t.Dict[str, CategoryLookup],
+        numerical: t.Sequence[str],
+        scale: np.ndarray,
+        offset: np.ndarray,
+        output_columns: t.Sequence[str],
+        check_missing: t.Sequence[str] = (),
+    ) -> None:
+        self.categorical = categorical
+        self.numerical = list(numerical)
+        self.scale = scale
+        self.offset = offset
+        self.output_columns = list(output_columns)
+        self.check_missing = list(check_missing)
+        self._categorical_positions = [
+            self.output_columns.index(name) for name in categorical
+        ]
+        self._numerical_positions = np.array(
+            [self.output_columns.index(name) for name in self.numerical], dtype=np.int64
+        )
+
+    @classmethod
+    def from_preprocessor(
+        cls, preprocessor: t.Union[ColumnTransformer, Pipeline]
+    ) -> "TransformPlan":
+        """
+        Export a fitted ColumnTransformer made of CountFrequencyEncoder and
+        MinMaxScaler steps. Raises ValueError for any other kind of step.
+        """
+
+        if isinstance(preprocessor, Pipeline):
+            if len(preprocessor.steps) != 1:
+                raise ValueError("Only a single preprocessing step can be planned")
+            preprocessor = preprocessor.steps[0][1]
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise ValueError("Only a ColumnTransformer can be planned")
+
+        categorical: t.Dict[str, CategoryLookup] = {}
+        check_missing: t.List[str] = []
+        numerical: t.List[str] = []
+        scales: t.List[np.ndarray] = []
+        offsets: t.List[np.ndarray] = []
+        output_columns: t.List[str] = []
+
+        for name, transformer, columns in preprocessor.transformers_:
+            if (isinstance(transformer, str) and transformer == "drop") or len(
+                columns
+            ) == 0:
+                continue
+            steps = (
+                transformer.steps
+                if isinstance(transformer, Pipeline)
+                else [(name, transformer)]
+            )
+            if len(steps) != 1:
+                raise ValueError(f"Transformer {name!r} has more than one step")
+            step = steps[0][1]
+            columns = list(columns)
+
+            if hasattr(step, "encoder_dict_"):
+                for column in columns:
+                    mapping = step.encoder_dict_[column]
+                    categorical[column] = CategoryLookup(
+                        categories=pd.Index(list(mapping.keys()), dtype=object),
+                        encodings=np.array(list(mapping.values())),
+                        unseen=getattr(step, "unseen", "ignore"),
+                    )
+                if getattr(step, "missing_values", "raise") == "raise":
+                    check_missing.extend(columns)
+            elif hasattr(step, "scale_") and hasattr(step, "min_"):
+                if getattr(step, "clip", False):
+                    raise ValueError(f"Transformer {name!r} clips its output")
+                numerical.extend(columns)
+                scales.append(np.asarray(step.scale_, dtype=np.float64))
+                offsets.append(np.asarray(step.min_, dtype=np.float64))
+            else:
+                raise ValueError(f"Transformer {name!r} cannot be planned")
+
+            output_columns.extend(columns)
+
+        return cls(
+            categorical=categorical,
+            numerical=numerical,
+            scale=np.concatenate(scales) if scales else np.empty(0),
+            offset=np.concatenate(offsets) if offsets else np.empty(0),
+            output_columns=output_columns,
+            check_missing=check_missing,
+        )
+
+    def save(self, directory: str) -> None:
+        """
+        Save the plan as .npy arrays and a JSON description, without pickle.
+        Only string categories can be saved this way.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        categorical = []
+        for position, (name, lookup) in enumerate(self.categorical.items()):
+            if pd.api.types.infer_dtype(lookup.categories, skipna=False) != "string":
+                raise ValueError(f"The categories of {name} are not all strings")
+            np.save(
+                os.path.join(directory, f"categories_{position}.npy"),
+                lookup.categories.to_numpy(dtype=str),
+                allow_pickle=False,
+            )
+            np.save(
+                os.path.join(directory, f"encodings_{position}.npy"),
+                lookup.encodings[:-1],
+                allow_pickle=False,
+            )
+            categorical.append({"name": name, "unseen": lookup.unseen})
+
+        np.save(os.path.join(directory, "scale.npy"), self.scale, allow_pickle=False)
+        np.save(os.path.join(directory, "offset.npy"), self.offset, allow_pickle=False)
+        with open(os.path.join(directory, _META_FILE), "w") as meta_file:
+            json.dump(
+                {
+                    "categorical": categorical,
+                    "numerical": self.numerical,
+                    "output_columns": self.output_columns,
+                    "check_missing": self.check_missing,
+                },
+                meta_file,
+            )
+
+    @classmethod
+    def load(cls, directory: str) -> "TransformPlan":
+        """Load a plan saved by save."""
+
+        with open(os.path.join(directory, _META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+
+        categorical = {}
+        for position, variable in enumerate(meta["categorical"]):
+            categories = np.load(
+                os.path.join(directory, f"categories_{position}.npy"),
+                allow_pickle=False,
+            )
+            categorical[variable["name"]] = CategoryLookup(
+                categories=pd.Index(categories.astype(object), dtype=object),
+                encodings=np.load(
+                    os.path.join(directory, f"encodings_{position}.npy"),
+                    allow_pickle=False,
+                ),
+                unseen=variable["unseen"],
+            )
+
+        return cls(
+            categorical=categorical,
+            numerical=meta["numerical"],
+            scale=np.load(os.path.join(directory, "scale.npy"), allow_pickle=False),
+            offset=np.load(os.path.join(directory, "offset.npy"), allow_pickle=False),
+            output_columns=meta["output_columns"],
+            check_missing=meta["check_missing"],
+        )
+
+    def transform(
+        self,
+        X: t.Union[np.ndarray, pd.DataFrame],
+        columns: t.Optional[t.Sequence[str]] = None,
+    ) -> np.ndarray:
+        """
+        Turn raw inputs into the model input.
+        X is either a DataFrame or a 2D array whose columns are named by columns.
+        """
+
+        if isinstance(X, pd.DataFrame):
+            data = {name: X[name].to_numpy() for name in self.output_columns}
+        else:
+            if columns is None:
+                raise ValueError("The columns of a raw array have to be given")
+            positions = {name: position for position, name in enumerate(columns)}
+            data = {name: X[:, positions[name]] for name in self.output_columns}
+
+        output = np.empty((len(X), len(self.output_columns)), dtype=np.float64)
+
+        for name in self.check_missing:
+            if pd.isna(data[name]).any():
+                raise ValueError(f"{name} contains NaN")
+
+        for position, (name, lookup) in zip(
+            self._categorical_positions, self.categorical.items()
+        ):
+            output[:, position] = lookup.encode(data[name], name)
+
+        if self.numerical:
+            numbers = np.empty((len(X), len(self.numerical)), dtype=np.float64)
+            for index, name in enumerate(self.numerical):
+                numbers[:, index] = data[name]
+            # Same operations, in the same order, as MinMaxScaler.transform.
+            numbers *= self.scale
+            numbers += self.offset
+            output[:, self._numerical_positions] = numbers
+
+        return output
@@ -1 +1,4 @@
-uvicorn app.main:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+# WEB_CONCURRENCY sets the number of uvicorn worker processes. With the "mmap" model_storage
+# of model/config.yml the workers share the memory-mapped forest arrays through the page cache.
+# Each worker splits its forest predictions over its share of the cores only, see model/scheduler.py.
+uvicorn app.main:app --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-1}
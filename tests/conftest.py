@@ -1,7 +1,10 @@
 import logging
 import sys
 from pathlib import Path
+from typing import Callable
 
+import numpy as np
+import pandas as pd
 import pytest
 from sklearn.model_selection import train_test_split
 
@@ -9,14 +12,14 @@ from sklearn.model_selection import train_test_split
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from model.config.core import config  # noqa: E402
-from model.preprocessing.data_manager import load_dataset  # noqa: E402
+from model.preprocessing.feature_cache import cached_load_dataset  # noqa: E402
 
 logger = logging.getLogger(__name__)
 
 
 @pytest.fixture
 def sample_input_data():
-    data = load_dataset(
+    data = cached_load_dataset(
         client_file_name=config.app_config.client_data_file,
         price_file_name=config.app_config.price_data_file,
     )
@@ -33,3 +36,25 @@ def sample_input_data():
     test_data = (X_test, y_test)
 
     return test_data
+
+
+@pytest.fixture
+def synthetic_inputs() -> Callable[[int, int], pd.DataFrame]:
+    """Build random model inputs, with the features of config.yml, without the datasets."""
+
+    def build(n_rows: int, seed: int = 0) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        data = pd.DataFrame(
+            rng.normal(
+                scale=100, size=(n_rows, len(config.model_config.numerical_vars))
+            ),
+            columns=config.model_config.numerical_vars,
+        )
+        data["has_gas"] = rng.choice(["t", "f"], size=n_rows)
+        data["origin_up"] = rng.choice(["a", "b", "c", "d"], size=n_rows)
+        data["price_change_energy"] = rng.choice(
+            ["increase", "decrease", "stable"], size=n_rows
+        )
+        return data[config.model_config.features]
+
+    return build
@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+
+from model.artifact import MANIFEST_FILE, load_artifact, read_manifest, save_artifact
+from model.pipeline import pipe
+
+
+def test_artifact_round_trip(tmp_path, synthetic_inputs):
+    # Given
+    X = synthetic_inputs(500, seed=0)
+    y = (X["cons_12m"] > 0).astype(int)
+    fitted = clone(pipe).set_params(model__n_estimators=10).fit(X, y)
+    data = synthetic_inputs(100, seed=1)
+
+    # When
+    save_artifact(fitted, str(tmp_path))
+    loaded = load_artifact(str(tmp_path))
+
+    # Then
+    assert np.array_equal(loaded.predict_proba(data), fitted.predict_proba(data))
+    assert np.array_equal(loaded.predict(data), fitted.predict(data))
+
+
+def test_artifact_detects_corrupted_files(tmp_path, synthetic_inputs):
+    # Given
+    X = synthetic_inputs(200, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=5)
+        .fit(X, (X["pow_max"] > 0).astype(int))
+    )
+    save_artifact(fitted, str(tmp_path))
+
+    # When
+    np.save(tmp_path / "plan" / "scale.npy", np.ones(len(X.columns) - 3))
+
+    # Then
+    with pytest.raises(ValueError):
+        load_artifact(str(tmp_path))
+
+
+def test_artifact_checks_the_features_and_the_model_version(tmp_path, synthetic_inputs):
+    # Given
+    X = synthetic_inputs(200, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=5)
+        .fit(X, (X["pow_max"] > 0).astype(int))
+    )
+    save_artifact(fitted, str(tmp_path))
+
+    # Then
+    with pytest.raises(ValueError, match="model version"):
+        load_artifact(str(tmp_path), model_version="0.0.0")
+
+    # When the features are saved in another order
+    manifest = read_manifest(str(tmp_path))
+    manifest["features"] = manifest["features"][::-1]
+    (tmp_path / MANIFEST_FILE).write_text(json.dumps(manifest))
+
+    # Then
+    with pytest.raises(ValueError, match="features"):
+        load_artifact(str(tmp_path))
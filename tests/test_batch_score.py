@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+
+from model.batch_score import batch_score
+from model.config.core import config
+from model.preprocessing.data_manager import load_pipeline, save_pipeline_files
+
+
+@pytest.fixture
+def pipeline_file(tmp_path, synthetic_inputs) -> str:
+    """A small pipeline saved in tmp_path, fit on synthetic inputs."""
+
+    from model.pipeline import pipe
+
+    X = synthetic_inputs(300, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=5)
+        .fit(X, (X["cons_12m"] > 0).astype(int))
+    )
+    save_pipeline_files(
+        pipeline=fitted, directory=str(tmp_path), file_name="pipeline.pkl"
+    )
+    return str(tmp_path / "pipeline.pkl")
+
+
+def _customers(synthetic_inputs, n_rows: int) -> pd.DataFrame:
+    data = synthetic_inputs(n_rows, seed=1)
+    data.insert(0, "id", [f"customer_{i}" for i in range(n_rows)])
+    return data
+
+
+def test_batch_score_csv_round_trip(tmp_path, synthetic_inputs, pipeline_file):
+    # Given
+    customers = _customers(synthetic_inputs, 50)
+    customers.to_csv(tmp_path / "customers.csv", index=False)
+
+    # When
+    rows = batch_score(
+        input_path=str(tmp_path / "customers.csv"),
+        output_path=str(tmp_path / "scores.csv"),
+        chunksize=20,
+        workers=1,
+        pipeline_file_name=pipeline_file,
+    )
+
+    # Then
+    scores = pd.read_csv(tmp_path / "scores.csv")
+    assert rows == 50
+    assert scores.columns.tolist() == ["id", "prediction", "probability"]
+    assert scores["id"].tolist() == customers["id"].tolist()
+    pipe = load_pipeline(file_name=pipeline_file)
+    expected = pipe.predict_proba(customers[config.model_config.features])[:, -1]
+    np.testing.assert_allclose(scores["probability"], expected)
+
+
+def test_batch_score_keeps_the_input_order_with_several_workers(
+    tmp_path, synthetic_inputs, pipeline_file
+):
+    # Given many small chunks for two workers
+    customers = _customers(synthetic_inputs, 200)
+    customers.to_csv(tmp_path / "customers.csv", index=False)
+
+    # When
+    batch_score(
+        input_path=str(tmp_path / "customers.csv"),
+        output_path=str(tmp_path / "scores.csv"),
+        chunksize=7,
+        workers=2,
+        pipeline_file_name=pipeline_file,
+    )
+
+    # Then
+    scores = pd.read_csv(tmp_path / "scores.csv")
+    assert scores["id"].tolist() == customers["id"].tolist()
+    assert scores["prediction"].notna().all()
+
+
+def test_batch_score_gives_no_prediction_to_the_invalid_rows(
+    tmp_path, synthetic_inputs, pipeline_file
+):
+    # Given a row which does not pass the validation, and one the pipeline fails on:
+    # has_gas is optional but the preprocessing needs it
+    customers = _customers(synthetic_inputs, 10).astype({"net_margin": object})
+    customers.loc[3, "net_margin"] = "not a number"
+    customers.loc[6, "has_gas"] = None
+    customers.to_csv(tmp_path / "customers.csv", index=False)
+
+    # When
+    rows = batch_score(
+        input_path=str(tmp_path / "customers.csv"),
+        output_path=str(tmp_path / "scores.csv"),
+        workers=1,
+        pipeline_file_name=pipeline_file,
+    )
+
+    # Then the other rows of the chunk are scored
+    scores = pd.read_csv(tmp_path / "scores.csv")
+    assert rows == 10
+    assert scores.index[scores["prediction"].isna()].tolist() == [3, 6]
+    assert scores.index[scores["probability"].isna()].tolist() == [3, 6]
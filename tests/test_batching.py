@@ -0,0 +1,50 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from model.batching import PredictionBatcher
+
+
+def test_batcher_coalesces_and_isolates_requests():
+    # Given
+    calls = []
+
+    async def run_batch(frames):
+        calls.append(len(frames))
+        return [
+            ValueError("bad request")
+            if frame["x"].iloc[0] < 0
+            else {"predictions": list(frame["x"])}
+            for frame in frames
+        ]
+
+    batcher = PredictionBatcher(run_batch=run_batch, max_wait_ms=20, max_batch_size=100)
+
+    async def submit_all():
+        requests = [pd.DataFrame({"x": [value]}) for value in (1, 2, -1, 3)]
+        return await asyncio.gather(
+            *(batcher.submit(request) for request in requests), return_exceptions=True
+        )
+
+    # When
+    results = asyncio.run(submit_all())
+
+    # Then
+    assert calls == [4]
+    assert [
+        result["predictions"] for result in results if isinstance(result, dict)
+    ] == [[1], [2], [3]]
+    assert isinstance(results[2], ValueError)
+
+
+def test_batcher_sends_large_requests_directly():
+    # Given
+    async def run_batch(frames):
+        return [ValueError("failed") for _ in frames]
+
+    batcher = PredictionBatcher(run_batch=run_batch, max_wait_ms=1000, max_batch_size=2)
+
+    # When / Then
+    with pytest.raises(ValueError):
+        asyncio.run(batcher.submit(pd.DataFrame({"x": [1, 2, 3]})))
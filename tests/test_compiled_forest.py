@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler
+
+from model.compiled_forest import CompiledForest, CompiledPipeline
+
+
+def _fitted_pipeline(n_rows: int = 2000, n_features: int = 8) -> Pipeline:
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(
+        rng.normal(size=(n_rows, n_features)),
+        columns=[f"x{i}" for i in range(n_features)],
+    )
+    y = (X["x0"] + rng.normal(scale=0.5, size=n_rows) > 0).astype(int)
+    pipe = Pipeline(
+        steps=[
+            ("scaler", MinMaxScaler()),
+            (
+                "model",
+                RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0),
+            ),
+        ]
+    )
+    return pipe.fit(X, y)
+
+
+def test_compiled_forest_matches_sklearn():
+    # Given
+    pipe = _fitted_pipeline()
+    compiled = CompiledPipeline.from_pipeline(pipe)
+    rng = np.random.default_rng(1)
+
+    for batch_size in (1, 7, 1000):
+        X = pd.DataFrame(
+            rng.normal(size=(batch_size, 8)), columns=[f"x{i}" for i in range(8)]
+        )
+
+        # When
+        proba = compiled.predict_proba(X)
+        predictions = compiled.predict(X)
+
+        # Then
+        assert np.array_equal(proba, pipe.predict_proba(X))
+        assert np.array_equal(predictions, pipe.predict(X))
+
+
+def test_compiled_forest_apply_matches_sklearn():
+    # Given
+    pipe = _fitted_pipeline()
+    forest = CompiledForest.from_estimator(pipe[-1])
+    raw = np.random.default_rng(2).normal(size=(50, 8))
+    X = pipe[:-1].transform(pd.DataFrame(raw, columns=[f"x{i}" for i in range(8)]))
+
+    # When
+    leaves = forest.apply(X) - forest.roots
+
+    # Then
+    assert np.array_equal(leaves, pipe[-1].apply(X))
+
+
+def test_compiled_forest_save_and_memory_map(tmp_path):
+    # Given
+    pipe = _fitted_pipeline()
+    forest = CompiledForest.from_estimator(pipe[-1])
+    X = np.random.default_rng(3).random((100, 8))
+
+    # When
+    forest.save(str(tmp_path))
+    loaded = CompiledForest.load(str(tmp_path), mmap_mode="r")
+
+    # Then
+    assert isinstance(loaded.threshold, np.memmap)
+    assert np.array_equal(loaded.predict_proba(X), forest.predict_proba(X))
+
+
+def test_early_exit_predicts_the_classes_of_the_whole_forest():
+    # Given
+    pipe = _fitted_pipeline()
+    forest = CompiledForest.from_estimator(pipe[-1])
+    raw = np.random.default_rng(3).normal(size=(2000, 8))
+    X = pipe[:-1].transform(pd.DataFrame(raw, columns=[f"x{i}" for i in range(8)]))
+
+    # When
+    predictions, trees = forest.predict_early_exit(X, batch_trees=5)
+    _, approximate_trees = forest.predict_early_exit(X, batch_trees=5, confidence=0.9)
+
+    # Then the classes are exact and the settled rows stopped early
+    assert np.array_equal(predictions, pipe[-1].predict(X))
+    assert trees.min() >= 5 and trees.max() == forest.n_trees
+    assert trees.mean() < forest.n_trees
+    assert (approximate_trees <= trees).all()
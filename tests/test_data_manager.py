@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+
+from model.pipeline import pipe
+from model.preprocessing.data_manager import (
+    datetime_conversion_price,
+    load_drift_reference,
+    load_tuning,
+    model_file,
+    price_change,
+    price_change_series,
+    price_data_trans,
+    price_data_trans_chunked,
+    save_pipeline_files,
+)
+
+
+def _price_data_trans_reference(df: pd.DataFrame) -> pd.DataFrame:
+    # The groupby/first/last/merge implementation price_data_trans replaced.
+    monthly_price_by_id = (
+        df.groupby(["id", "price_date"])
+        .agg({"price_off_peak_var": "mean", "price_off_peak_fix": "mean"})
+        .reset_index()
+    )
+    jan_prices = monthly_price_by_id.groupby("id").first().reset_index()
+    dec_prices = monthly_price_by_id.groupby("id").last().reset_index()
+    diff = pd.merge(
+        dec_prices.rename(
+            columns={"price_off_peak_var": "dec_1", "price_off_peak_fix": "dec_2"}
+        ),
+        jan_prices.drop(columns="price_date"),
+        on="id",
+    )
+    diff["offpeak_diff_dec_january_energy"] = diff["dec_1"] - diff["price_off_peak_var"]
+    diff["offpeak_diff_dec_january_power"] = diff["dec_2"] - diff["price_off_peak_fix"]
+    return diff[
+        ["id", "offpeak_diff_dec_january_energy", "offpeak_diff_dec_january_power"]
+    ]
+
+
+def _price_data(n_ids: int = 50, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    months = pd.date_range("2015-01-01", periods=12, freq="MS").strftime("%Y-%m-%d")
+    data = pd.DataFrame(
+        {
+            "id": np.repeat([f"id_{i}" for i in range(n_ids)], 12),
+            "price_date": np.tile(months, n_ids),
+            "price_off_peak_var": rng.random(n_ids * 12),
+            "price_off_peak_fix": rng.random(n_ids * 12) * 40,
+        }
+    )
+    # Missing values, including whole missing months at the start and the end of the year.
+    data.loc[rng.random(len(data)) < 0.1, "price_off_peak_var"] = np.nan
+    data.loc[data["price_date"] == months[0], "price_off_peak_fix"] = np.nan
+    return data.sample(frac=1, random_state=seed)
+
+
+def test_price_data_trans_chunked_matches_in_memory(tmp_path):
+    # Given
+    data = _price_data()
+    price_file = tmp_path / "price_data.csv"
+    data.to_csv(price_file, index=False)
+
+    # When
+    # An absolute file name takes precedence over the dataset directory.
+    chunked = price_data_trans_chunked(price_file_name=str(price_file), chunksize=37)
+
+    # Then
+    expected = price_data_trans(
+        df=datetime_conversion_price(df=pd.read_csv(price_file))
+    )
+    assert list(chunked.columns) == list(expected.columns)
+    assert list(chunked["id"]) == list(expected["id"])
+    for column in ["offpeak_diff_dec_january_energy", "offpeak_diff_dec_january_power"]:
+        np.testing.assert_allclose(chunked[column], expected[column], rtol=1e-12)
+
+
+def test_price_data_trans_matches_reference():
+    # Given
+    data = datetime_conversion_price(df=_price_data())
+
+    # When
+    diff = price_data_trans(df=data.copy())
+
+    # Then
+    pd.testing.assert_frame_equal(diff, _price_data_trans_reference(data.copy()))
+
+
+def test_price_change_series_matches_price_change():
+    # Given
+    values = pd.Series([1.5, -0.2, 0.0, np.nan, -0.0, 3], index=[5, 4, 3, 2, 1, 0])
+
+    # When
+    labels = price_change_series(values)
+    categories = price_change_series(values, as_category=True)
+
+    # Then
+    pd.testing.assert_series_equal(labels, values.apply(price_change))
+    assert list(categories) == list(labels)
+    assert categories.dtype == "category"
+
+
+def test_model_file_is_next_to_the_pipeline_file():
+    assert model_file("pipe0.0.1.pkl", ".artifact") == "pipe0.0.1.artifact"
+    assert (
+        model_file("/registry/0.0.1-x/pipe0.0.1.pkl", ".autotune.json")
+        == "/registry/0.0.1-x/pipe0.0.1.autotune.json"
+    )
+
+
+@pytest.mark.parametrize("registry", [True, False])
+def test_the_files_saved_next_to_a_pipeline_are_loaded_back(
+    tmp_path, monkeypatch, synthetic_inputs, registry
+):
+    # Given a pipeline saved in a registry version directory, or in the trained models
+    # directory under a plain file name
+    X = synthetic_inputs(100, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=2)
+        .fit(X, (X["cons_12m"] > 0).astype(int))
+    )
+    trained_model_dir = tmp_path / "trained_models"
+    directory = tmp_path / "registry" / "0.0.1-x" if registry else trained_model_dir
+    directory.mkdir(parents=True)
+    monkeypatch.setattr(
+        "model.preprocessing.data_manager.TRAINED_MODEL_DIR", trained_model_dir
+    )
+
+    # When
+    save_pipeline_files(
+        pipeline=fitted,
+        directory=str(directory),
+        file_name="pipe.pkl",
+        tuning={"rules": []},
+        drift_reference={"rows": 100},
+    )
+
+    # Then
+    file_name = str(directory / "pipe.pkl") if registry else "pipe.pkl"
+    assert load_tuning(file_name=file_name) == {"rules": []}
+    assert load_drift_reference(file_name=file_name) == {"rows": 100}
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.drift import DriftSketch, compare, psi
+
+
+def _data(n_rows: int, shift: float = 0.0, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "amount": rng.normal(loc=shift, size=n_rows),
+            "channel": rng.choice(["web", "phone", "mail"], size=n_rows),
+        }
+    )
+
+
+def _reference() -> DriftSketch:
+    return DriftSketch.from_reference(
+        _data(5000), numerical=["amount"], categorical=["channel"], bins=10
+    )
+
+
+def test_psi_is_zero_for_the_same_distribution() -> None:
+    # Given
+    counts = np.array([10, 20, 30, 40])
+
+    # Then
+    assert psi(counts, counts * 3) == pytest.approx(0.0)
+    assert psi(counts, counts[::-1]) > 0.25
+
+
+def test_the_rows_of_the_training_distribution_are_stable() -> None:
+    # Given
+    reference = _reference()
+    live = reference.empty()
+
+    # When
+    live.update(_data(2000, seed=1))
+
+    # Then
+    report = compare(reference, live)
+    assert report["rows"] == 2000
+    assert report["reference_rows"] == 5000
+    assert [feature["status"] for feature in report["features"]] == [
+        "stable",
+        "stable",
+    ]
+
+
+def test_a_shifted_feature_drifts() -> None:
+    # Given
+    reference = _reference()
+    live = reference.empty()
+
+    # When
+    live.update(_data(2000, shift=1.0, seed=1))
+
+    # Then
+    amount, channel = compare(reference, live)["features"]
+    assert amount["name"] == "amount"
+    assert amount["status"] == "significant"
+    assert channel["status"] == "stable"
+
+
+def test_no_psi_is_computed_below_min_rows() -> None:
+    # Given a live sketch of a few shifted rows
+    reference = _reference()
+    live = reference.empty()
+    live.update(_data(50, shift=1.0, seed=1))
+
+    # When
+    report = compare(reference, live, min_rows=100)
+
+    # Then
+    assert report["rows"] == 50
+    assert [feature["psi"] for feature in report["features"]] == [None, None]
+    assert [feature["status"] for feature in report["features"]] == [None, None]
+    assert compare(reference, live, min_rows=50)["features"][0]["psi"] is not None
+
+
+def test_unseen_and_missing_values_have_their_own_bins() -> None:
+    # Given
+    reference = _reference()
+    live = reference.empty()
+    data = pd.DataFrame(
+        {
+            "amount": [0.0, np.nan, None, 1.0],
+            "channel": ["web", "fax", None, "fax"],
+        }
+    )
+
+    # When
+    live.update(data)
+
+    # Then
+    amount, channel = compare(reference, live)["features"]
+    assert amount["missing_share"] == 0.5
+    assert amount["unseen_share"] is None
+    assert channel["missing_share"] == 0.25
+    assert channel["unseen_share"] == 0.5
+
+
+def test_update_counts_at_most_max_rows() -> None:
+    # Given
+    live = _reference().empty()
+
+    # When
+    live.update(_data(10_000), max_rows=100)
+
+    # Then
+    assert live.rows == 100
+    assert all(counts.sum() == 100 for counts in live.counts.values())
+
+
+def test_a_sketch_is_saved_and_loaded() -> None:
+    # Given
+    reference = _reference()
+
+    # When
+    loaded = DriftSketch.from_dict(reference.to_dict())
+
+    # Then
+    assert loaded.rows == reference.rows
+    assert loaded.categories == reference.categories
+    for name, counts in reference.counts.items():
+        np.testing.assert_array_equal(loaded.counts[name], counts)
+    assert compare(reference, loaded)["features"][0]["psi"] == pytest.approx(0.0)
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from model.executor import InferenceExecutor
+
+
+def test_executor_bounds_in_flight_predictions():
+    # Given
+    executor = InferenceExecutor(max_workers=4, max_in_flight=2, timeout=5)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work() -> int:
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return 1
+
+    async def submit_all():
+        return await asyncio.gather(*(executor.run(work) for _ in range(6)))
+
+    # When
+    results = asyncio.run(submit_all())
+    executor.shutdown()
+
+    # Then
+    assert results == [1] * 6
+    assert max(peak) <= 2
+
+
+def test_executor_times_out():
+    # Given
+    executor = InferenceExecutor(max_workers=1, max_in_flight=1, timeout=0.01)
+
+    # When / Then
+    with pytest.raises(TimeoutError):
+        asyncio.run(executor.run(time.sleep, 0.2))
+    executor.shutdown()
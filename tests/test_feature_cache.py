@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from model.preprocessing.feature_cache import FeatureCache
+
+
+def _dataset(n_rows: int = 100) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "id": [f"id_{i}" for i in range(n_rows)],
+            "date_activ": pd.date_range("2010-01-01", periods=n_rows, freq="D"),
+            "cons_12m": rng.integers(0, 10_000, size=n_rows),
+            "net_margin": rng.random(n_rows),
+            "has_gas": rng.choice(["t", "f"], size=n_rows),
+        },
+        index=np.arange(0, 2 * n_rows, 2),
+    )
+    return data
+
+
+def test_feature_cache_round_trip(tmp_path):
+    # Given
+    cache = FeatureCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    data = _dataset()
+
+    # When
+    assert cache.get("key") is None
+    assert cache.put("key", data)
+    cached = cache.get("key")
+
+    # Then
+    pd.testing.assert_frame_equal(cached, data)
+
+
+def test_feature_cache_evicts_least_recently_used(tmp_path):
+    # Given
+    cache = FeatureCache(directory=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    cache.put("old", _dataset())
+    cache.put("recent", _dataset())
+    cache.put("new", _dataset())
+    os.utime(tmp_path / "old" / "manifest.json", (0, 0))
+    # The manifests hold the key and the creation time, the sizes of the entries differ
+    # by a few bytes: the budget fits "recent" and "new" but not the three of them.
+    sizes = {entry["key"]: entry["bytes"] for entry in cache.entries()}
+
+    # When
+    cache.max_bytes = sizes["recent"] + sizes["new"]
+    cache.evict(keep="new")
+
+    # Then
+    assert [entry["key"] for entry in cache.entries()] == ["recent", "new"]
@@ -2,6 +2,7 @@
 Note: These tests will fail if you have not first trained the model.
 """
 
+import asyncio
 import sys
 from pathlib import Path
 
@@ -14,12 +15,12 @@ from model.predict import make_prediction
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 
-async def test_make_prediction(sample_input_data):
+def test_make_prediction(sample_input_data):
     # Given
     expected_no_predictions = len(sample_input_data[0])
 
     # When
-    result = await make_prediction(input_data=sample_input_data[0])
+    result = asyncio.run(make_prediction(input_data=sample_input_data[0]))
 
     # Then
     predictions = result.get("predictions")
@@ -31,3 +32,84 @@ async def test_make_prediction(sample_input_data):
     y_true = sample_input_data[1]
     accuracy = accuracy_score(_predictions, y_true)
     assert accuracy > 0.7
+
+
+def test_make_prediction_scores_the_valid_rows(sample_input_data):
+    # Given five rows, two of them invalid
+    data = sample_input_data[0].head(5).reset_index(drop=True)
+    data["cons_12m"] = data["cons_12m"].astype(object)
+    data.loc[1, "cons_12m"] = "not a number"
+    data.loc[3, "cons_12m"] = "not a number"
+
+    # When
+    result = asyncio.run(make_prediction(input_data=data))
+
+    # Then the other rows are scored, in a single call
+    assert result["rows"].tolist() == [0, 2, 4]
+    assert len(result["predictions"]) == 3
+    assert result["probabilities"].shape == (3, 2)
+    assert [error["loc"][1] for error in result["errors"]] == [1, 3]
+    full = asyncio.run(make_prediction(input_data=data.drop(index=[1, 3])))
+    assert np.array_equal(result["predictions"], full["predictions"])
+
+
+def test_requests_scored_together_share_the_timings_of_the_pipeline_call(
+    sample_input_data,
+):
+    # Given
+    from model.predict import _predict_many
+
+    data = sample_input_data[0].head(4).reset_index(drop=True)
+
+    # When two requests are scored together
+    first, second = _predict_many([data.head(2), data.tail(2)])
+
+    # Then each has its own check_inputs, and only the first accounts for the call
+    assert set(first["timings"]) == set(second["timings"]) == {"check_inputs"}
+    assert first["batch_timings"]
+    assert first["batch_timings"] == second["batch_timings"]
+    assert first["batch_rows"] == second["batch_rows"] == 4
+    assert [first["first_of_batch"], second["first_of_batch"]] == [True, False]
+
+
+def test_predictions_report_the_registry_version_which_scored_them(
+    monkeypatch, synthetic_inputs
+):
+    # Given a pipeline served as a registry version
+    from sklearn.base import clone
+
+    from model import predict
+    from model.pipeline import pipe
+
+    X = synthetic_inputs(200, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=5)
+        .fit(X, (X["cons_12m"] > 0).astype(int))
+    )
+    monkeypatch.setattr(predict, "_pipe", fitted)
+    monkeypatch.setattr(predict, "_pipe_version", "0.0.1-20260101T000000000000Z")
+    monkeypatch.setattr(predict, "get_prediction_cache", lambda: None)
+
+    # When
+    (result,) = predict._predict_many([synthetic_inputs(5, seed=1)])
+
+    # Then
+    assert result["version"] == "0.0.1-20260101T000000000000Z"
+
+
+def test_make_prediction_reports_the_rows_the_pipeline_fails_on(sample_input_data):
+    # Given five valid rows, the pipeline can not score a missing categorical value
+    data = sample_input_data[0].head(5).reset_index(drop=True)
+    data["has_gas"] = data["has_gas"].astype(object)
+    data.loc[2, "has_gas"] = None
+
+    # When
+    result = asyncio.run(make_prediction(input_data=data))
+
+    # Then the row is reported with its index, the others are scored
+    assert result["rows"].tolist() == [0, 1, 3, 4]
+    assert len(result["predictions"]) == 4
+    assert [error["loc"] for error in result["errors"]] == [["inputs", 2]]
+    full = asyncio.run(make_prediction(input_data=data.drop(index=[2])))
+    assert np.array_equal(result["probabilities"], full["probabilities"])
@@ -0,0 +1,99 @@
+import numpy as np
+
+from model.config.core import config
+from model.prediction_cache import ENTRY_BYTES, PredictionCache, row_keys
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_row_keys_normalize_the_rows(synthetic_inputs):
+    # Given
+    data = synthetic_inputs(20, seed=0)
+    data["nb_prod_act"] = np.arange(20)
+    same = data.copy()
+    same["nb_prod_act"] = same["nb_prod_act"].astype(float)
+    same.loc[3, "pow_max"] = data.loc[3, "pow_max"] = np.nan
+    same = same.astype({"pow_max": object})
+    same.loc[3, "pow_max"] = None
+
+    # When
+    keys = row_keys(data, "1")
+
+    # Then
+    assert len(np.unique(keys)) == len(data)
+    assert np.array_equal(row_keys(same, "1"), keys)
+    assert not np.intersect1d(row_keys(data, "2"), keys).size
+
+
+def test_cache_lru_eviction():
+    # Given
+    cache = PredictionCache(max_bytes=3 * ENTRY_BYTES, ttl_seconds=60)
+    cache.put_many(np.array([1, 2, 3], dtype=np.uint64), [0, 1, 0])
+    cache.get_many(np.array([1], dtype=np.uint64))
+
+    # When
+    cache.put_many(np.array([4], dtype=np.uint64), [1])
+    found, values = cache.get_many(np.array([1, 2, 3, 4], dtype=np.uint64))
+
+    # Then
+    assert found.tolist() == [True, False, True, True]
+    assert values == [0, 0, 1]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_ttl_expiration():
+    # Given
+    clock = FakeClock()
+    cache = PredictionCache(max_bytes=1 << 20, ttl_seconds=10, clock=clock)
+    cache.put_many(np.array([1, 2], dtype=np.uint64), [0, 1])
+
+    # When
+    clock.now = 11
+    found, values = cache.get_many(np.array([1, 2], dtype=np.uint64))
+
+    # Then
+    assert not found.any()
+    stats = cache.stats()
+    assert stats["expirations"] == 2
+    assert stats["hits"] == 0 and stats["misses"] == 2 and stats["entries"] == 0
+
+
+def test_cached_predictions_match_the_pipeline(monkeypatch, synthetic_inputs):
+    # Given a pipeline counting the rows it scores
+    from sklearn.base import clone
+
+    from model import predict
+    from model.pipeline import pipe
+
+    X = synthetic_inputs(300, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=5)
+        .fit(X, (X["cons_12m"] > 0).astype(int))
+    )
+    scored = []
+    forest_predict_proba = fitted[-1].predict_proba
+    monkeypatch.setattr(
+        fitted[-1],
+        "predict_proba",
+        lambda X: scored.append(len(X)) or forest_predict_proba(X),
+    )
+    cache = PredictionCache(max_bytes=1 << 20, ttl_seconds=60)
+    monkeypatch.setattr(predict, "get_prediction_cache", lambda: cache)
+    data = synthetic_inputs(50, seed=1)[config.model_config.features]
+
+    # When
+    first = predict._cached_predict_proba(fitted, "1", data.iloc[:30], {})
+    second = predict._cached_predict_proba(fitted, "1", data, {})
+
+    # Then
+    assert scored == [30, 20]
+    assert np.array_equal(np.r_[first, second[30:]], fitted.predict_proba(data))
+    assert np.array_equal(second, fitted.predict_proba(data))
+    assert cache.stats()["hits"] == 30
@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+
+from model import predict
+from model.config.core import config
+from model.pipeline import pipe
+from model.preprocessing.data_manager import load_pipeline, save_pipeline_files
+from model.registry import ModelRegistry
+
+
+def _write_marker(directory, file_name):
+    with open(f"{directory}/{file_name}", "w") as marker:
+        json.dump({"file_name": file_name}, marker)
+
+
+def test_register_keeps_the_latest_versions_and_the_active_one(tmp_path):
+    # Given
+    registry = ModelRegistry(directory=str(tmp_path), max_versions=2)
+    first = registry.register(_write_marker)
+
+    # When
+    later = [registry.register(_write_marker, activate=False) for _ in range(3)]
+
+    # Then
+    assert registry.active_version() == first
+    assert [metadata["version_id"] for metadata in registry.versions()] == [
+        first
+    ] + later[-1:]
+    assert json.load(open(registry.pipeline_file(first)))["file_name"].endswith(".pkl")
+
+
+def test_activate_unknown_version(tmp_path):
+    # Given
+    registry = ModelRegistry(directory=str(tmp_path), max_versions=2)
+    version = registry.register(_write_marker)
+
+    # When
+    with pytest.raises(KeyError):
+        registry.activate("0.0.0-unknown")
+
+    # Then
+    assert registry.active_version() == version
+
+
+def test_activate_model_swaps_the_served_pipeline(
+    tmp_path, monkeypatch, synthetic_inputs
+):
+    # Given two versions predicting opposite classes
+    X = synthetic_inputs(300, seed=0)
+    registry = ModelRegistry(directory=str(tmp_path), max_versions=5)
+    versions = []
+    for target in ((X["cons_12m"] > 0).astype(int), (X["cons_12m"] <= 0).astype(int)):
+        fitted = clone(pipe).set_params(model__n_estimators=5).fit(X, target)
+        versions.append(
+            registry.register(
+                lambda directory, file_name: save_pipeline_files(
+                    pipeline=fitted, directory=directory, file_name=file_name
+                ),
+                activate=False,
+            )
+        )
+    monkeypatch.setattr("model.registry.get_registry", lambda: registry)
+    monkeypatch.setattr(predict, "_pipe", None)
+    monkeypatch.setattr(predict, "_pipe_version", None)
+    data = synthetic_inputs(50, seed=1)
+
+    # When
+    predict.activate_model(versions[0], warm_up_inputs=data)
+    served_first = predict.load_model()
+    first_predictions = served_first.predict(data[config.model_config.features])
+    predict.activate_model(versions[1], warm_up_inputs=data)
+
+    # Then
+    assert registry.active_version() == versions[1]
+    assert predict.serving_version() == versions[1]
+    assert predict.load_model() is not served_first
+    assert not np.array_equal(
+        predict.load_model().predict(data[config.model_config.features]),
+        first_predictions,
+    )
+
+
+def test_a_version_saved_by_an_older_package_version_loads(tmp_path, synthetic_inputs):
+    # Given a version registered before the package version was bumped
+    X = synthetic_inputs(300, seed=0)
+    fitted = (
+        clone(pipe)
+        .set_params(model__n_estimators=5)
+        .fit(X, (X["cons_12m"] > 0).astype(int))
+    )
+    registry = ModelRegistry(directory=str(tmp_path), max_versions=5)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr("model.artifact._version", "0.0.0")
+        patch.setattr("model.registry._version", "0.0.0")
+        version = registry.register(
+            lambda directory, file_name: save_pipeline_files(
+                pipeline=fitted, directory=directory, file_name=file_name
+            )
+        )
+    data = synthetic_inputs(50, seed=1)
+
+    # When
+    loaded = load_pipeline(
+        file_name=registry.pipeline_file(version), storage="artifact"
+    )
+
+    # Then
+    assert registry.metadata(version)["model_version"] == "0.0.0"
+    assert np.array_equal(loaded.predict_proba(data), fitted.predict_proba(data))
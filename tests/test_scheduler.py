@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler
+
+from model.compiled_forest import CompiledForest
+from model.config.config_classes import InferenceConfig
+from model.scheduler import InferenceScheduler, autotune, plan, process_cores
+
+
+def _forest(n_rows: int = 1000) -> RandomForestClassifier:
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_rows, 6))
+    y = (X[:, 0] + rng.normal(scale=0.5, size=n_rows) > 0).astype(int)
+    return RandomForestClassifier(n_estimators=12, max_depth=6, random_state=0).fit(
+        X, y
+    )
+
+
+def test_process_cores_are_shared_by_the_server_workers(monkeypatch):
+    # Given 8 cores and 4 server workers
+    monkeypatch.setattr("os.sched_getaffinity", lambda _: set(range(8)), raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+
+    # Then
+    assert process_cores(InferenceConfig()) == 2
+    assert process_cores(InferenceConfig(inference_executor="process")) == 1
+    assert process_cores(InferenceConfig(inference_cores=3)) == 3
+
+
+def test_plan_follows_the_rules_of_the_batch_size():
+    # Given
+    tuning = {
+        "rules": [
+            {"min_rows": 100, "strategy": "trees", "degree": 2},
+            {"min_rows": 1000, "strategy": "rows", "degree": 4},
+        ]
+    }
+
+    # Then
+    assert plan(tuning, 10) == ("serial", 1)
+    assert plan(tuning, 500) == ("trees", 2)
+    assert plan(tuning, 5000) == ("rows", 4)
+    assert plan(None, 5000) == ("serial", 1)
+
+
+def test_split_predictions_match_one_thread():
+    # Given
+    forest = _forest()
+    compiled = CompiledForest.from_estimator(forest)
+    X = np.random.default_rng(1).normal(size=(301, 6))
+    scheduler = InferenceScheduler(cores=3)
+
+    for strategy in ("rows", "trees"):
+        tuning = {"rules": [{"min_rows": 1, "strategy": strategy, "degree": 3}]}
+        for engine in (forest, compiled):
+            # When
+            proba = scheduler.predict_proba(engine, X, tuning)
+
+            # Then
+            assert np.allclose(proba, engine.predict_proba(X), rtol=0, atol=1e-12)
+
+    # And the early exit is split by rows
+    predictions, trees = scheduler.predict_early_exit(compiled, X, tuning)
+    assert np.array_equal(predictions, forest.predict(X))
+    assert len(trees) == len(X)
+    scheduler.close()
+
+
+def test_concurrent_predictions_share_the_cores():
+    # Given 4 cores, and two predictions already running on them
+    scheduler = InferenceScheduler(cores=4)
+    running = [scheduler._acquire(0), scheduler._acquire(0)]
+
+    # When a third one plans a split over 4 threads
+    helpers = scheduler._acquire(3)
+
+    # Then it only gets the core left idle, and none once all are busy
+    assert running == [0, 0] and helpers == 1
+    assert scheduler._acquire(3) == 0
+
+    # And once the last two are done, two cores are idle again
+    scheduler._release(0)
+    scheduler._release(helpers)
+    assert scheduler._acquire(3) == 1
+    scheduler.close()
+
+
+def test_autotune_measures_every_batch_size():
+    # Given
+    X = pd.DataFrame(np.random.default_rng(2).normal(size=(50, 6)))
+    pipe = Pipeline(steps=[("scaler", MinMaxScaler().fit(X)), ("model", _forest())])
+
+    # When
+    tuning = autotune(pipe, X, cores=2, batch_sizes=[1, 200], repeat=1)
+
+    # Then
+    assert tuning["forest"] == "RandomForestClassifier"
+    assert set(tuning["timings"]) == {"1", "200"}
+    assert {"serial", "rows-2", "trees-2"} <= set(tuning["timings"]["200"])
+    for rule in tuning["rules"]:
+        assert rule["strategy"] in ("rows", "trees") and rule["degree"] == 2
@@ -0,0 +1,58 @@
+import pytest
+from sklearn.base import clone
+
+from model.config.config_classes import TrainingConfig
+from model.pipeline import pipe
+from model.search import candidates, search_forest
+
+SPACE = {"n_estimators": [5, 10], "max_depth": [2, 4, None], "min_samples_leaf": [1]}
+
+
+@pytest.fixture
+def training_data(synthetic_inputs):
+    X = synthetic_inputs(600)
+    y = (X["cons_12m"] + X["net_margin"] > 0).astype(int)
+    return X, y
+
+
+def test_successive_halving_keeps_the_best_candidates(training_data):
+    # Given
+    X, y = training_data
+    training_config = TrainingConfig(
+        search_method="grid", search_halving_factor=2, search_min_rows=100
+    )
+
+    # When
+    search = search_forest(clone(pipe), X, y, SPACE, training_config)
+
+    # Then
+    rounds = search["rounds"]
+    assert [round_["candidates"] for round_ in rounds] == [6, 3, 2]
+    assert [round_["rows"] for round_ in rounds] == [150, 300, 600]
+    assert search["best_params"] in candidates(
+        SPACE, method="grid", n_candidates=0, random_state=0
+    )
+    assert 0.5 < search["cv_score"] <= 1.0
+    assert not search["stopped_by_budget"]
+
+
+def test_search_stops_at_the_budget(training_data):
+    # Given a budget already spent once the first round is done
+    X, y = training_data
+    training_config = TrainingConfig(
+        search_method="random",
+        search_candidates=4,
+        search_halving_factor=2,
+        search_min_rows=100,
+        training_budget_seconds=1e-6,
+    )
+
+    # When
+    search = search_forest(clone(pipe), X, y, SPACE, training_config)
+
+    # Then the best candidate of the first round is kept
+    assert len(search["rounds"]) == 1
+    assert search["stopped_by_budget"]
+    assert search["best_params"] in candidates(
+        SPACE, method="random", n_candidates=4, random_state=0
+    )
@@ -0,0 +1,22 @@
+from model.config.core import config
+from model.preprocessing.data_manager import load_dataset
+from model.preprocessing.validation import check_inputs
+from model.synthetic_data import write_synthetic_dataset
+
+
+def test_synthetic_dataset_loads_and_validates(tmp_path):
+    # Given
+    client_path, price_path = write_synthetic_dataset(
+        n_clients=500, output_dir=str(tmp_path), seed=3
+    )
+
+    # When
+    data = load_dataset(client_file_name=client_path, price_file_name=price_path)
+    validated_data, errors = check_inputs(data=data)
+
+    # Then
+    assert len(data) == 500
+    assert errors is None
+    assert list(validated_data.columns) == list(config.model_config.features)
+    assert 0 < data[config.model_config.target].mean() < 0.5
+    assert set(data["price_change_energy"]) <= {"increase", "decrease", "stable"}
@@ -0,0 +1,25 @@
+import numpy as np
+from sklearn.base import clone
+
+from model.config.core import config
+from model.pipeline import preprocessor
+from model.transform_plan import TransformPlan
+
+
+def test_transform_plan_is_bit_identical(synthetic_inputs):
+    # Given
+    fitted = clone(preprocessor).fit(synthetic_inputs(500, seed=0))
+    plan = TransformPlan.from_preprocessor(fitted)
+    data = synthetic_inputs(200, seed=1)
+
+    # When
+    from_frame = plan.transform(data)
+    from_array = plan.transform(
+        data.to_numpy(dtype=object), columns=config.model_config.features
+    )
+
+    # Then
+    expected = fitted.transform(data)
+    assert np.array_equal(from_frame, expected)
+    assert np.array_equal(from_array, expected)
+    assert from_frame.tobytes() == np.asarray(expected, dtype=np.float64).tobytes()
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pandas as pd
+from pydantic import ValidationError
+
+from model.config.core import config
+from model.preprocessing.validation import check_inputs
+from model.preprocessing.validation_classes import MultipleDataInputs
+
+
+def _row() -> dict:
+    row = {feature: 1.0 for feature in config.model_config.numerical_vars}
+    row.update({"has_gas": "t", "origin_up": "abc", "price_change_energy": "stable"})
+    return row
+
+
+def _pydantic_errors(data: pd.DataFrame):
+    try:
+        MultipleDataInputs(
+            inputs=data.replace({np.nan: None}).to_dict(orient="records")
+        )
+    except ValidationError as error:
+        return json.loads(error.json())
+    return None
+
+
+def test_check_inputs_valid_data():
+    # Given
+    data = pd.DataFrame([_row() for _ in range(5)])
+    data.loc[2, "cons_12m"] = np.nan
+    data.loc[3, "origin_up"] = None
+
+    # When
+    validated_data, errors = check_inputs(data=data)
+
+    # Then
+    assert errors is None
+    assert list(validated_data.columns) == list(config.model_config.features)
+
+
+def test_check_inputs_matches_pydantic_errors():
+    # Given
+    data = pd.DataFrame([_row() for _ in range(5)])
+    data["cons_12m"] = data["cons_12m"].astype(object)
+    data.loc[1, "cons_12m"] = "not a number"
+    data.loc[3, "nb_prod_act"] = np.inf
+    data["has_gas"] = data["has_gas"].astype(object)
+    data.at[4, "has_gas"] = {"t": 1}
+
+    # When
+    _, errors = check_inputs(data=data)
+
+    # Then
+    assert errors == _pydantic_errors(data[config.model_config.features])
+    assert [error["loc"][1] for error in errors] == [1, 3, 4]